@@ -17,6 +17,7 @@ declare
   V_MIN_AVG_ABS_REV_PER_MONTH number;
   V_MIN_HISTORY_MONTHS number;
   V_MIN_MONTHS_PRESENT number;
+  V_REG variant;
 begin
 
   -- Resolve as-of fiscal month (default = latest closed fiscal month)
@@ -59,10 +60,10 @@ begin
   with
   rev_pc_mth as (
     select
-      v.roll_up_shop::string as roll_up_shop,
-      (try_to_number(v."Year")*100 + try_to_number(v."Period")) as fiscal_yyyymm,
-      sum(coalesce(v.revenue,0)) as rev_mth
-    from DB_BI_P_SANDBOX.SANDBOX.RNA_RCT_TMT_CCCI_PL_RO_REVENUE_5YEARS v
+      a.roll_up_shop,
+      a.fiscal_yyyymm,
+      sum(a.total_revenue) as rev_mth
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH a   -- see 15__proc__refresh_revenue_agg_mth.sql
     group by 1,2
   ),
   rev_pc_mth_seq as (
@@ -201,13 +202,18 @@ begin
          evaluated_at
   from DB_BI_P_SANDBOX.SANDBOX.TMP_PC_ELIG;
 
+  -- Integer ids for any new series / customer group (21__setup__series_registry.sql)
+  call DB_BI_P_SANDBOX.SANDBOX.SP_REGISTER_SERIES(:P_RUN_ID);
+  select $1 into :V_REG from table(result_scan(last_query_id()));
+
   return object_construct(
     'status','OK',
     'run_id', P_RUN_ID,
     'asof_fiscal_yyyymm', V_ASOF_YYYYMM,
     'asof_month_end', V_ASOF_MONTH_END,
     'eligible_count', (select count_if(pass_months_present and pass_history_12m and pass_nonzero and pass_avg_abs_rev and pass_manual) from DB_BI_P_SANDBOX.SANDBOX.TMP_PC_ELIG),
-    'total_pc_count', (select count(*) from DB_BI_P_SANDBOX.SANDBOX.TMP_PC_ELIG)
+    'total_pc_count', (select count(*) from DB_BI_P_SANDBOX.SANDBOX.TMP_PC_ELIG),
+    'series_registry', V_REG
   );
 end;
 $$;
@@ -28,14 +28,27 @@ declare
   V_ASOF_YYYYMM number;
   V_ASOF_END date;
 
+  V_AGG  variant;
   V_ELIG variant;
   V_ACT  variant;
   V_MIX  variant;
   V_BUD  variant;
   V_DS   variant;
+  V_TRACK variant;
 
   V_ERR string;
+  V_STARTED_AT timestamp_ltz;
+
+  -- A stage returned a non-OK result (SP_RUN_STAGE returns ERROR instead of raising)
+  E_STAGE exception (-20002, 'Pipeline stage failed.');
+  V_FAILED_STAGE string;
+  V_FAILED_RESULT variant;
+
+  -- Side marts that do not invalidate the run's outputs: a failure is a warning
+  V_WARNINGS array default array_construct();
 begin
+  V_STARTED_AT := current_timestamp();
+
   select fiscal_yyyymm, month_end_date
     into :V_ASOF_YYYYMM, :V_ASOF_END
   from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ASOF_FISCAL_MONTH;
@@ -60,59 +73,192 @@ begin
     to_variant(object_construct('note','run started')),
     current_timestamp();
 
-  call DB_BI_P_SANDBOX.SANDBOX.SP_EVALUATE_PC_ELIGIBILITY(:V_RUN_ID, :V_ASOF_YYYYMM);
-  select $1 into :V_ELIG from table(result_scan(last_query_id()));
+  -- Shared monthly aggregate first: every step below reads it instead of the raw source
+  call DB_BI_P_SANDBOX.SANDBOX.SP_REFRESH_REVENUE_AGG_MTH();
+  select $1 into :V_AGG from table(result_scan(last_query_id()));
+
+  if (V_AGG:"status"::string <> 'OK') then
+    V_ERR := 'Revenue aggregate refresh failed: ' || coalesce(V_AGG:"message"::string, '');
+    update DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUNS
+    set status = 'FAILED',
+        status_message = :V_ERR,
+        config_snapshot = to_variant(object_construct('revenue_agg_mth', :V_AGG)),
+        updated_at = current_timestamp()
+    where run_id = :V_RUN_ID;
+    return object_construct('status','FAILED','run_id',:V_RUN_ID,'error',:V_ERR);
+  end if;
+
+  -- Stage DAG (each stage starts as soon as its inputs are done):
+  --
+  --   revenue_agg_mth --+--> eligibility --+--> cust_mix
+  --                     |                  |
+  --                     |                  +--> actuals ----+--> model_dataset
+  --                     |                                   |
+  --                     +--> budget ------------------------+--> tracking_actuals (after actuals)
+  --
+  -- Independent stages run as async child jobs of this procedure. Each stage's
+  -- temp tables have distinct names, so they can share the session. Actuals waits for
+  -- eligibility, which registers new series ids (SP_REGISTER_SERIES).
+  --
+  -- Each stage goes through SP_RUN_STAGE (22__proc__stage_reuse.sql): when its input
+  -- fingerprint matches the latest successful build, that output is reused (rerun of a
+  -- closed month) instead of recomputed. SP_RUN_STAGE returns a stage error as an
+  -- ERROR object, so every result is checked: the first non-OK stage fails the run
+  -- (E_STAGE) and any async stage still in flight is cancelled with the procedure.
+  let rs_elig resultset := async (call DB_BI_P_SANDBOX.SANDBOX.SP_RUN_STAGE('eligibility', :V_RUN_ID, :V_ASOF_YYYYMM));
+  let rs_bud  resultset := async (call DB_BI_P_SANDBOX.SANDBOX.SP_RUN_STAGE('budget_pc_reason_mth', :V_RUN_ID, :V_ASOF_YYYYMM, 72));
+
+  -- cust_mix and actuals need eligibility
+  await rs_elig;
+  let c_elig cursor for rs_elig;
+  open c_elig;
+  fetch c_elig into V_ELIG;
+  close c_elig;
+
+  if (coalesce(V_ELIG:"status"::string, '') <> 'OK') then
+    V_FAILED_STAGE := 'eligibility';
+    V_FAILED_RESULT := V_ELIG;
+    raise E_STAGE;
+  end if;
+
+  let rs_mix resultset := async (call DB_BI_P_SANDBOX.SANDBOX.SP_RUN_STAGE('cust_mix_pc_reason', :V_RUN_ID, :V_ASOF_YYYYMM));
+  let rs_act resultset := async (call DB_BI_P_SANDBOX.SANDBOX.SP_RUN_STAGE('actuals_pc_reason_mth', :V_RUN_ID, :V_ASOF_YYYYMM, 72));
+
+  -- model dataset needs eligibility + actuals + budget (not cust_mix)
+  await rs_act;
+  let c_act cursor for rs_act;
+  open c_act;
+  fetch c_act into V_ACT;
+  close c_act;
+
+  if (coalesce(V_ACT:"status"::string, '') <> 'OK') then
+    V_FAILED_STAGE := 'actuals_pc_reason_mth';
+    V_FAILED_RESULT := V_ACT;
+    raise E_STAGE;
+  end if;
+
+  await rs_bud;
+  let c_bud cursor for rs_bud;
+  open c_bud;
+  fetch c_bud into V_BUD;
+  close c_bud;
+
+  if (coalesce(V_BUD:"status"::string, '') <> 'OK') then
+    V_FAILED_STAGE := 'budget_pc_reason_mth';
+    V_FAILED_RESULT := V_BUD;
+    raise E_STAGE;
+  end if;
+
+  let rs_ds resultset := async (call DB_BI_P_SANDBOX.SANDBOX.SP_RUN_STAGE('model_dataset_pc_reason_h', :V_RUN_ID, :V_ASOF_YYYYMM, 12));
 
-  call DB_BI_P_SANDBOX.SANDBOX.SP_BUILD_ACTUALS_PC_REASON_MTH(:V_RUN_ID, :V_ASOF_YYYYMM, 72);
-  select $1 into :V_ACT from table(result_scan(last_query_id()));
+  -- The as-of month just closed: score published forecasts that target it (23__proc__...)
+  call DB_BI_P_SANDBOX.SANDBOX.SP_FILL_TRACKING_ACTUALS(:V_ASOF_YYYYMM);
+  select $1 into :V_TRACK from table(result_scan(last_query_id()));
 
-  call DB_BI_P_SANDBOX.SANDBOX.SP_BUILD_CUST_MIX_PC_REASON(:V_RUN_ID, :V_ASOF_YYYYMM);
-  select $1 into :V_MIX from table(result_scan(last_query_id()));
+  if (coalesce(V_TRACK:"status"::string, '') <> 'OK') then
+    V_WARNINGS := array_append(:V_WARNINGS,
+      'Tracking actuals fill failed: ' || coalesce(V_TRACK:"message"::string, ''));
+  end if;
 
-  call DB_BI_P_SANDBOX.SANDBOX.SP_BUILD_BUDGET_PC_REASON_MTH(:V_RUN_ID, :V_ASOF_YYYYMM, 72);
-  select $1 into :V_BUD from table(result_scan(last_query_id()));
+  await rs_mix;
+  let c_mix cursor for rs_mix;
+  open c_mix;
+  fetch c_mix into V_MIX;
+  close c_mix;
 
-  call DB_BI_P_SANDBOX.SANDBOX.SP_BUILD_MODEL_DATASET_PC_REASON_H(:V_RUN_ID, :V_ASOF_YYYYMM, 12);
-  select $1 into :V_DS from table(result_scan(last_query_id()));
+  if (coalesce(V_MIX:"status"::string, '') <> 'OK') then
+    V_FAILED_STAGE := 'cust_mix_pc_reason';
+    V_FAILED_RESULT := V_MIX;
+    raise E_STAGE;
+  end if;
+
+  await rs_ds;
+  let c_ds cursor for rs_ds;
+  open c_ds;
+  fetch c_ds into V_DS;
+  close c_ds;
+
+  if (coalesce(V_DS:"status"::string, '') <> 'OK') then
+    V_FAILED_STAGE := 'model_dataset_pc_reason_h';
+    V_FAILED_RESULT := V_DS;
+    raise E_STAGE;
+  end if;
+
+  -- Stage telemetry (timings come from the CALL statements, so async stages are exact;
+  -- a reused stage has no stage CALL and is logged without a window)
+  call DB_BI_P_SANDBOX.SANDBOX.SP_LOG_RUN_STAGES(:V_RUN_ID, :V_STARTED_AT, array_construct(
+    object_construct('stage_name','revenue_agg_mth','proc_name','SP_REFRESH_REVENUE_AGG_MTH','result',:V_AGG),
+    object_construct('stage_name','eligibility','proc_name','SP_EVALUATE_PC_ELIGIBILITY','result',:V_ELIG),
+    object_construct('stage_name','actuals_pc_reason_mth','proc_name','SP_BUILD_ACTUALS_PC_REASON_MTH','result',:V_ACT),
+    object_construct('stage_name','cust_mix_pc_reason','proc_name','SP_BUILD_CUST_MIX_PC_REASON','result',:V_MIX),
+    object_construct('stage_name','budget_pc_reason_mth','proc_name','SP_BUILD_BUDGET_PC_REASON_MTH','result',:V_BUD),
+    object_construct('stage_name','model_dataset_pc_reason_h','proc_name','SP_BUILD_MODEL_DATASET_PC_REASON_H','result',:V_DS),
+    object_construct('stage_name','tracking_actuals','proc_name','SP_FILL_TRACKING_ACTUALS','result',:V_TRACK)
+  ));
 
   update DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUNS
   set status = 'SUCCEEDED',
-      status_message = 'Eligibility + Actuals + CustMix + Budget + ModelDataset built',
+      status_message = 'Eligibility + Actuals + CustMix + Budget + ModelDataset built'
+                       || iff(array_size(:V_WARNINGS) = 0, '', ' (' || array_to_string(:V_WARNINGS, '; ') || ')'),
       config_snapshot = to_variant(object_construct(
+        'revenue_agg_mth', :V_AGG,
         'eligibility', :V_ELIG,
         'actuals_pc_reason_mth', :V_ACT,
         'cust_mix_pc_reason', :V_MIX,
         'budget_pc_reason_mth', :V_BUD,
-        'model_dataset_pc_reason_h', :V_DS
+        'model_dataset_pc_reason_h', :V_DS,
+        'tracking_actuals', :V_TRACK,
+        'warnings', :V_WARNINGS,
+        'reused_stages', object_construct(     -- stage -> run whose output was reused
+          'eligibility',               get(:V_ELIG, 'reused_from_run_id'),
+          'actuals_pc_reason_mth',     get(:V_ACT, 'reused_from_run_id'),
+          'cust_mix_pc_reason',        get(:V_MIX, 'reused_from_run_id'),
+          'budget_pc_reason_mth',      get(:V_BUD, 'reused_from_run_id'),
+          'model_dataset_pc_reason_h', get(:V_DS, 'reused_from_run_id')
+        )
       )),
       updated_at = current_timestamp()
   where run_id = :V_RUN_ID;
 
   return object_construct(
-    'status','OK',
+    'status', iff(array_size(:V_WARNINGS) = 0, 'OK', 'PARTIAL'),
     'run_id', :V_RUN_ID,
     'asof_fiscal_yyyymm', :V_ASOF_YYYYMM,
     'asof_month_end', :V_ASOF_END,
+    'revenue_agg_mth', :V_AGG,
     'eligibility', :V_ELIG,
     'actuals_pc_reason_mth', :V_ACT,
     'cust_mix_pc_reason', :V_MIX,
     'budget_pc_reason_mth', :V_BUD,
-    'model_dataset_pc_reason_h', :V_DS
+    'model_dataset_pc_reason_h', :V_DS,
+    'tracking_actuals', :V_TRACK,
+    'warnings', :V_WARNINGS
   );
 
 exception
   when other then
-    V_ERR := SQLERRM;
+    V_ERR := iff(SQLCODE = -20002,
+                 'Stage ' || V_FAILED_STAGE || ' failed: ' || coalesce(V_FAILED_RESULT:"message"::string, ''),
+                 SQLERRM);
 
     if (V_RUN_ID is not null) then
       update DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUNS
       set status = 'FAILED',
           status_message = :V_ERR,
+          config_snapshot = to_variant(object_construct(
+            'failed_stage', :V_FAILED_STAGE,
+            'revenue_agg_mth', :V_AGG,
+            'eligibility', :V_ELIG,
+            'actuals_pc_reason_mth', :V_ACT,
+            'cust_mix_pc_reason', :V_MIX,
+            'budget_pc_reason_mth', :V_BUD,
+            'model_dataset_pc_reason_h', :V_DS
+          )),
           updated_at = current_timestamp()
       where run_id = :V_RUN_ID;
     end if;
 
-    return object_construct('status','FAILED','run_id',:V_RUN_ID,'error',:V_ERR);
+    return object_construct('status','FAILED','run_id',:V_RUN_ID,'failed_stage',:V_FAILED_STAGE,'error',:V_ERR);
 end;
 $$;
 
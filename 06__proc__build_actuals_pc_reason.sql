@@ -10,6 +10,7 @@ create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH (
 
   roll_up_shop         string,
   reason_group         string,
+  series_id            number,              -- FORECAST_SERIES_REGISTRY
 
   total_revenue        number(18,2),
 
@@ -20,26 +21,8 @@ create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH (
   primary key (fiscal_yyyymm, roll_up_shop, reason_group)
 );
 
-create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP (
-  run_id               string,
-  asof_fiscal_yyyymm    number,
-
-  fiscal_yyyymm        number,
-  fiscal_year          number,
-  fiscal_month         number,
-  month_seq            number,
-  month_start_date     date,
-  month_end_date       date,
-
-  roll_up_shop         string,
-  reason_group         string,
-
-  total_revenue        number(18,2),
-
-  source_object        string,
-  snapshotted_at       timestamp_ntz,
-  row_hash             string
-);
+-- FORECAST_ACTUALS_PC_REASON_MTH_SNAP is a view over delta-encoded versions
+-- (one row per changed value, not per run): see 18__proc__write_pc_reason_mth_snapshot.sql
 
 create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_BUILD_ACTUALS_PC_REASON_MTH(
     P_RUN_ID string,
@@ -58,8 +41,9 @@ declare
 
   V_START_SEQ number;
   V_SRC string;
+  V_SNAP variant;
 begin
-  V_SRC := 'DB_BI_P_SANDBOX.SANDBOX.RNA_RCT_TMT_CCCI_PL_RO_REVENUE_5YEARS';
+  V_SRC := 'DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH';
 
   -- Resolve as-of fiscal month
   if (P_ASOF_FISCAL_YYYYMM is null) then
@@ -83,11 +67,11 @@ begin
   create or replace temporary table TMP_ACT_PC_REASON as
   with base as (
     select
-      (try_to_number(v."Year")*100 + try_to_number(v."Period")) as fiscal_yyyymm,
-      v.roll_up_shop::string as roll_up_shop,
-      v."Reason Code Group"::string as reason_group,
-      sum(coalesce(v.revenue,0)) as total_revenue
-    from DB_BI_P_SANDBOX.SANDBOX.RNA_RCT_TMT_CCCI_PL_RO_REVENUE_5YEARS v
+      a.fiscal_yyyymm,
+      a.roll_up_shop,
+      a.reason_group,
+      sum(a.total_revenue) as total_revenue
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH a
     group by 1,2,3
   ),
   joined as (
@@ -100,10 +84,14 @@ begin
       d.month_end_date,
       b.roll_up_shop,
       b.reason_group,
+      r.series_id,
       b.total_revenue
     from base b
     join DB_BI_P_SANDBOX.SANDBOX.FORECAST_FISCAL_MONTH_DIM d
       on d.fiscal_yyyymm = b.fiscal_yyyymm
+    left join DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY r
+      on r.roll_up_shop = b.roll_up_shop
+     and equal_null(r.reason_group, b.reason_group)
     where d.month_seq between :V_START_SEQ and :V_ASOF_SEQ
   )
   select
@@ -123,51 +111,51 @@ begin
   using TMP_ACT_PC_REASON s
   on  t.fiscal_yyyymm = s.fiscal_yyyymm
   and t.roll_up_shop  = s.roll_up_shop
-  and t.reason_group  = s.reason_group
-  when matched and (t.row_hash <> s.row_hash) then update set
+  and equal_null(t.reason_group, s.reason_group)
+  when matched and (t.row_hash <> s.row_hash or not equal_null(t.series_id, s.series_id)) then update set
       fiscal_year      = s.fiscal_year,
       fiscal_month     = s.fiscal_month,
       month_seq        = s.month_seq,
       month_start_date = s.month_start_date,
       month_end_date   = s.month_end_date,
+      series_id        = s.series_id,
       total_revenue    = s.total_revenue,
       source_object    = s.source_object,
       loaded_at        = s.loaded_at,
       row_hash         = s.row_hash
   when not matched then insert (
       fiscal_yyyymm, fiscal_year, fiscal_month, month_seq, month_start_date, month_end_date,
-      roll_up_shop, reason_group, total_revenue,
+      roll_up_shop, reason_group, series_id, total_revenue,
       source_object, loaded_at, row_hash
   ) values (
       s.fiscal_yyyymm, s.fiscal_year, s.fiscal_month, s.month_seq, s.month_start_date, s.month_end_date,
-      s.roll_up_shop, s.reason_group, s.total_revenue,
+      s.roll_up_shop, s.reason_group, s.series_id, s.total_revenue,
       s.source_object, s.loaded_at, s.row_hash
   );
 
-  -- Snapshot table: overwrite-by-run semantics (safe reruns)
-  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP
-  where run_id = :P_RUN_ID
-    and asof_fiscal_yyyymm = :V_ASOF_YYYYMM;
-
-  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP
-  (run_id, asof_fiscal_yyyymm,
-   fiscal_yyyymm, fiscal_year, fiscal_month, month_seq, month_start_date, month_end_date,
-   roll_up_shop, reason_group, total_revenue,
-   source_object, snapshotted_at, row_hash)
+  -- Snapshot: only the delta vs. the previous run is stored (rerun-safe)
+  create or replace temporary table TMP_ACT_PC_REASON_SNAP as
   select
-    :P_RUN_ID, :V_ASOF_YYYYMM,
     fiscal_yyyymm, fiscal_year, fiscal_month, month_seq, month_start_date, month_end_date,
-    roll_up_shop, reason_group, total_revenue,
-    source_object, current_timestamp(), row_hash
+    roll_up_shop, reason_group, total_revenue as value,
+    source_object, row_hash
   from TMP_ACT_PC_REASON;
 
+  call DB_BI_P_SANDBOX.SANDBOX.SP_WRITE_PC_REASON_MTH_SNAPSHOT('ACTUALS_PC_REASON_MTH', :P_RUN_ID, :V_ASOF_YYYYMM, 'TMP_ACT_PC_REASON_SNAP', :V_START_SEQ, :V_ASOF_SEQ);
+  select $1 into :V_SNAP from table(result_scan(last_query_id()));
+
+  if (V_SNAP:"status"::string <> 'OK') then
+    return object_construct('status','ERROR','message','Snapshot write failed: ' || coalesce(V_SNAP:"message"::string, ''));
+  end if;
+
   return object_construct(
     'status','OK',
     'run_id', :P_RUN_ID,
     'asof_fiscal_yyyymm', :V_ASOF_YYYYMM,
     'month_seq_start', :V_START_SEQ,
     'month_seq_end', :V_ASOF_SEQ,
-    'rows_staged', (select count(*) from TMP_ACT_PC_REASON)
+    'rows_staged', (select count(*) from TMP_ACT_PC_REASON),
+    'snapshot', :V_SNAP
   );
 end;
 $$;
@@ -1,4 +1,14 @@
 -- 07__proc__build_cust_mix_pc_reason.sql
+--
+-- Customer-mix shares over the trailing MIX_LOOKBACK_MONTHS window are kept incrementally:
+--   FORECAST_CUST_MIX_MTH     per-month numerators (abs revenue by PC x reason x cust_grp),
+--                             re-read from FORECAST_REVENUE_AGG_MTH only for months whose
+--                             aggregate fingerprint changed
+--   FORECAST_CUST_MIX_WINDOW  window numerators; when the as-of moves by one month the new
+--                             month is added and the month that ages out is subtracted
+-- Months restated inside the window (or a lookback / as-of jump) fall back to summing the
+-- window from FORECAST_CUST_MIX_MTH. Denominators and month counts come from the window's
+-- per-month totals. Results are identical to a full recompute.
 
 create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_PC_REASON (
   asof_fiscal_yyyymm     number,
@@ -45,6 +55,47 @@ create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_PC_REASON_SNAP
   source_object          string,
   snapshotted_at         timestamp_ntz,
   row_hash               string
+)
+cluster by (run_id);
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_MTH (
+  month_seq              number,
+  fiscal_yyyymm          number(6,0),
+
+  roll_up_shop           string,
+  reason_group           string,          -- coalesced to 'UNKNOWN'
+  cust_grp               string,          -- coalesced to 'UNKNOWN'
+
+  abs_rev_mth            number(38,6),
+
+  loaded_at              timestamp_ntz
+)
+cluster by (month_seq);
+
+-- Aggregate fingerprint each FORECAST_CUST_MIX_MTH month was loaded from
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_MTH_FINGERPRINT (
+  fiscal_yyyymm          number(6,0),
+  fingerprint            number,
+  source_rows            number,
+  synced_at              timestamp_ntz,
+
+  primary key (fiscal_yyyymm)
+);
+
+-- Window numerators per lookback (all PCs; eligibility is applied when reading)
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_WINDOW (
+  lookback_months        number,
+  window_start_seq       number,
+  window_end_seq         number,
+
+  roll_up_shop           string,
+  reason_group           string,
+  cust_grp               string,
+
+  num_abs_rev            number(38,6),
+
+  source_fingerprint     number,          -- hash of the month fingerprints the window was built from
+  updated_at             timestamp_ntz
 );
 
 create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_BUILD_CUST_MIX_PC_REASON(
@@ -66,8 +117,16 @@ declare
   V_START_SEQ number;
   V_SRC string;
 
+  V_MONTHS_SYNCED number;
+  V_STATE_START number;
+  V_STATE_END number;
+  V_STATE_FP number;
+  V_STATE_SOURCE_FP number;
+  V_WINDOW_FP number;
+  V_WINDOW_MODE string;
+
 begin
-  V_SRC := 'DB_BI_P_SANDBOX.SANDBOX.RNA_RCT_TMT_CCCI_PL_RO_REVENUE_5YEARS';
+  V_SRC := 'DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH';
 
   -- Resolve as-of fiscal month
   if (P_ASOF_FISCAL_YYYYMM is null) then
@@ -114,27 +173,152 @@ begin
   select column1::string as cust_grp
   from values ('CAPX'),('CCCI'),('EXT'),('TRANS'),('UNKNOWN');
 
-  -- Base monthly abs revenue by PC x Reason x CustGrp
-  create or replace temporary table TMP_BASE_MTH as
-  with base as (
+  -- 1) Sync per-month numerators for months whose aggregate changed since the last build
+  create or replace temporary table TMP_MIX_CHANGED_MONTHS as
+  select coalesce(f.fiscal_yyyymm, m.fiscal_yyyymm) as fiscal_yyyymm,
+         d.month_seq,
+         f.fingerprint,
+         f.source_rows
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH_FINGERPRINT f
+  full outer join DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_MTH_FINGERPRINT m
+    on m.fiscal_yyyymm = f.fiscal_yyyymm
+  left join DB_BI_P_SANDBOX.SANDBOX.FORECAST_FISCAL_MONTH_DIM d
+    on d.fiscal_yyyymm = coalesce(f.fiscal_yyyymm, m.fiscal_yyyymm)
+  where f.fiscal_yyyymm is null
+     or m.fiscal_yyyymm is null
+     or f.fingerprint <> m.fingerprint
+     or f.source_rows <> m.source_rows;
+
+  select count(*) into :V_MONTHS_SYNCED from TMP_MIX_CHANGED_MONTHS;
+
+  if (V_MONTHS_SYNCED > 0) then
+    begin transaction;
+
+    delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_MTH
+    where fiscal_yyyymm in (select fiscal_yyyymm from TMP_MIX_CHANGED_MONTHS);
+
+    insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_MTH
+    (month_seq, fiscal_yyyymm, roll_up_shop, reason_group, cust_grp, abs_rev_mth, loaded_at)
     select
-      (try_to_number(v."Year")*100 + try_to_number(v."Period")) as fiscal_yyyymm,
-      v.roll_up_shop::string as roll_up_shop,
-      coalesce(v."Reason Code Group"::string, 'UNKNOWN') as reason_group,
-     coalesce(v.CUST_GRP::string, 'UNKNOWN') as cust_grp,
-      sum(abs(coalesce(v.revenue,0))) as abs_rev_mth
-    from DB_BI_P_SANDBOX.SANDBOX.RNA_RCT_TMT_CCCI_PL_RO_REVENUE_5YEARS v
-    join TMP_ELIG_PCS e on e.roll_up_shop = v.roll_up_shop::string
-    group by 1,2,3,4
-  )
-  select
-    b.*,
-    d.month_seq
-  from base b
+      d.month_seq,
+      a.fiscal_yyyymm,
+      a.roll_up_shop,
+      coalesce(a.reason_group, 'UNKNOWN'),
+      coalesce(a.cust_grp, 'UNKNOWN'),
+      sum(a.abs_revenue)::number(38,6),
+      current_timestamp()
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH a
+    join DB_BI_P_SANDBOX.SANDBOX.FORECAST_FISCAL_MONTH_DIM d
+      on d.fiscal_yyyymm = a.fiscal_yyyymm
+    where a.fiscal_yyyymm in (select fiscal_yyyymm from TMP_MIX_CHANGED_MONTHS where fingerprint is not null)
+    group by 1,2,3,4,5
+    order by 1;
+
+    delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_MTH_FINGERPRINT
+    where fiscal_yyyymm in (select fiscal_yyyymm from TMP_MIX_CHANGED_MONTHS);
+
+    insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_MTH_FINGERPRINT
+    (fiscal_yyyymm, fingerprint, source_rows, synced_at)
+    select fiscal_yyyymm, fingerprint, source_rows, current_timestamp()
+    from TMP_MIX_CHANGED_MONTHS
+    where fingerprint is not null;
+
+    commit;
+  end if;
+
+  -- 2) Window numerators: reuse, slide by one month, or rebuild
+  -- The stored window is only valid while the months it covers still carry the same
+  -- fingerprints (a restated month, or a sync made by a run with another lookback,
+  -- changes the hash).
+  select max(window_start_seq), max(window_end_seq), max(source_fingerprint)
+    into :V_STATE_START, :V_STATE_END, :V_STATE_FP
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_WINDOW
+  where lookback_months = :V_LOOKBACK_MONTHS;
+
+  select hash_agg(f.fiscal_yyyymm, f.fingerprint, f.source_rows) into :V_STATE_SOURCE_FP
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_MTH_FINGERPRINT f
   join DB_BI_P_SANDBOX.SANDBOX.FORECAST_FISCAL_MONTH_DIM d
-    on d.fiscal_yyyymm = b.fiscal_yyyymm
+    on d.fiscal_yyyymm = f.fiscal_yyyymm
+  where d.month_seq between :V_STATE_START and :V_STATE_END;
+
+  select hash_agg(f.fiscal_yyyymm, f.fingerprint, f.source_rows) into :V_WINDOW_FP
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_MTH_FINGERPRINT f
+  join DB_BI_P_SANDBOX.SANDBOX.FORECAST_FISCAL_MONTH_DIM d
+    on d.fiscal_yyyymm = f.fiscal_yyyymm
   where d.month_seq between :V_START_SEQ and :V_ASOF_SEQ;
 
+  if (V_STATE_END is null or not equal_null(V_STATE_FP, V_STATE_SOURCE_FP)) then
+    V_WINDOW_MODE := 'REBUILD';
+  elseif (V_STATE_START = V_START_SEQ and V_STATE_END = V_ASOF_SEQ) then
+    V_WINDOW_MODE := 'REUSE';
+  elseif (V_STATE_START = V_START_SEQ - 1 and V_STATE_END = V_ASOF_SEQ - 1) then
+    V_WINDOW_MODE := 'SLIDE';
+  else
+    V_WINDOW_MODE := 'REBUILD';
+  end if;
+
+  -- Zero numerators are dropped on every path: a combo whose revenue aged out and one that
+  -- never had any both read as coalesce(num, 0).
+  if (V_WINDOW_MODE = 'REUSE') then
+    create or replace temporary table TMP_MIX_WINDOW as
+    select roll_up_shop, reason_group, cust_grp, num_abs_rev
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_WINDOW
+    where lookback_months = :V_LOOKBACK_MONTHS;
+  elseif (V_WINDOW_MODE = 'SLIDE') then
+    create or replace temporary table TMP_MIX_WINDOW as
+    select roll_up_shop, reason_group, cust_grp, sum(delta)::number(38,6) as num_abs_rev
+    from (
+      select roll_up_shop, reason_group, cust_grp, num_abs_rev as delta
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_WINDOW
+      where lookback_months = :V_LOOKBACK_MONTHS
+      union all
+      select roll_up_shop, reason_group, cust_grp, abs_rev_mth
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_MTH
+      where month_seq = :V_ASOF_SEQ                -- month entering the window
+      union all
+      select roll_up_shop, reason_group, cust_grp, -abs_rev_mth
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_MTH
+      where month_seq = :V_STATE_START             -- month ageing out
+    )
+    group by 1,2,3
+    having sum(delta) <> 0;
+  else
+    create or replace temporary table TMP_MIX_WINDOW as
+    select roll_up_shop, reason_group, cust_grp, sum(abs_rev_mth)::number(38,6) as num_abs_rev
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_MTH
+    where month_seq between :V_START_SEQ and :V_ASOF_SEQ
+    group by 1,2,3
+    having sum(abs_rev_mth) <> 0;
+  end if;
+
+  if (V_WINDOW_MODE <> 'REUSE') then
+    begin transaction;
+
+    delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_WINDOW
+    where lookback_months = :V_LOOKBACK_MONTHS;
+
+    insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_WINDOW
+    (lookback_months, window_start_seq, window_end_seq,
+     roll_up_shop, reason_group, cust_grp, num_abs_rev, source_fingerprint, updated_at)
+    select :V_LOOKBACK_MONTHS, :V_START_SEQ, :V_ASOF_SEQ,
+           roll_up_shop, reason_group, cust_grp, num_abs_rev, :V_WINDOW_FP, current_timestamp()
+    from TMP_MIX_WINDOW;
+
+    commit;
+  end if;
+
+  -- 3) Per-month totals of the window for eligible PCs (denominators and month counts)
+  create or replace temporary table TMP_BASE_MTH as
+  select
+    m.roll_up_shop,
+    m.reason_group,
+    m.month_seq,
+    sum(m.abs_rev_mth) as abs_rev_mth
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_MTH m
+  join TMP_ELIG_PCS e on e.roll_up_shop = m.roll_up_shop
+  where m.month_seq between :V_START_SEQ and :V_ASOF_SEQ
+  group by 1,2,3;
+
   -- Stats tables (PC_REASON, PC, REASON, GLOBAL)
   create or replace temporary table TMP_STATS_PC_REASON as
   with m as (
@@ -230,31 +414,36 @@ begin
   left join TMP_STATS_REASON rs
     on rs.reason_group = pr.reason_group;
 
-  -- Numerators for each level
-  create or replace temporary table TMP_NUM_PC_REASON as
-  select roll_up_shop, reason_group, cust_grp, sum(abs_rev_mth) as num_abs_rev
-  from TMP_BASE_MTH
-  group by 1,2,3;
-
-  create or replace temporary table TMP_NUM_PC as
-  select roll_up_shop, cust_grp, sum(abs_rev_mth) as num_abs_rev
-  from TMP_BASE_MTH
-  group by 1,2;
-
-  create or replace temporary table TMP_NUM_REASON as
-  select reason_group, cust_grp, sum(abs_rev_mth) as num_abs_rev
-  from TMP_BASE_MTH
-  group by 1,2;
-
-  create or replace temporary table TMP_NUM_GLOBAL as
-  select cust_grp, sum(abs_rev_mth) as num_abs_rev
-  from TMP_BASE_MTH
-  group by 1;
+  -- Hierarchical numerators: one row per (level, level key, cust_grp) in a single pass.
+  -- Keys a level does not use are '__ALL__', so the chosen level resolves by equi-join.
+  create or replace temporary table TMP_NUM_HIER as
+  select
+    case grouping_id(w.roll_up_shop, w.reason_group)
+      when 0 then 'PC_REASON'
+      when 1 then 'PC'
+      when 2 then 'REASON'
+      else 'GLOBAL'
+    end as allocation_level,
+    iff(grouping(w.roll_up_shop) = 0, w.roll_up_shop, '__ALL__') as lvl_roll_up_shop,
+    iff(grouping(w.reason_group) = 0, w.reason_group, '__ALL__') as lvl_reason_group,
+    w.cust_grp,
+    sum(w.num_abs_rev) as num_abs_rev
+  from TMP_MIX_WINDOW w
+  join TMP_ELIG_PCS e on e.roll_up_shop = w.roll_up_shop
+  group by grouping sets (
+    (w.roll_up_shop, w.reason_group, w.cust_grp),
+    (w.roll_up_shop, w.cust_grp),
+    (w.reason_group, w.cust_grp),
+    (w.cust_grp)
+  );
 
   -- Final mix rows (always emit all cust grps)
   create or replace temporary table TMP_MIX_OUT as
   with base_keys as (
-    select lc.roll_up_shop, lc.reason_group, lc.allocation_level, lc.months_present, lc.nonzero_months, lc.denom_abs_rev
+    select
+      lc.roll_up_shop, lc.reason_group, lc.allocation_level, lc.months_present, lc.nonzero_months, lc.denom_abs_rev,
+      iff(lc.allocation_level in ('PC_REASON', 'PC'), lc.roll_up_shop, '__ALL__') as lvl_roll_up_shop,
+      iff(lc.allocation_level in ('PC_REASON', 'REASON'), lc.reason_group, '__ALL__') as lvl_reason_group
     from TMP_LEVEL_CHOICE lc
   )
   select
@@ -290,34 +479,11 @@ begin
     ) as row_hash
   from base_keys k
   cross join TMP_CUST_GRPS cg
-  left join (
-    select * from TMP_NUM_PC_REASON
-    union all select null, null, null, null where false
-  ) dummy on 1=0
-  left join (
-    -- pick the correct numerator table by allocation_level
-    select
-      'PC_REASON' as lvl, roll_up_shop, reason_group, cust_grp, num_abs_rev
-    from TMP_NUM_PC_REASON
-    union all
-    select
-      'PC' as lvl, roll_up_shop, null as reason_group, cust_grp, num_abs_rev
-    from TMP_NUM_PC
-    union all
-    select
-      'REASON' as lvl, null as roll_up_shop, reason_group, cust_grp, num_abs_rev
-    from TMP_NUM_REASON
-    union all
-    select
-      'GLOBAL' as lvl, null as roll_up_shop, null as reason_group, cust_grp, num_abs_rev
-    from TMP_NUM_GLOBAL
-  ) n
-    on n.lvl = k.allocation_level
-   and n.cust_grp = cg.cust_grp
-   and ( (k.allocation_level='PC_REASON' and n.roll_up_shop = k.roll_up_shop and n.reason_group = k.reason_group)
-      or (k.allocation_level='PC'        and n.roll_up_shop = k.roll_up_shop)
-      or (k.allocation_level='REASON'    and n.reason_group = k.reason_group)
-      or (k.allocation_level='GLOBAL') );
+  left join TMP_NUM_HIER n
+    on  n.allocation_level = k.allocation_level
+    and n.lvl_roll_up_shop = k.lvl_roll_up_shop
+    and n.lvl_reason_group = k.lvl_reason_group
+    and n.cust_grp         = cg.cust_grp;
 
   -- Upsert as-of table
   merge into DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_PC_REASON t
@@ -370,11 +536,21 @@ begin
     'asof_fiscal_yyyymm', :V_ASOF_YYYYMM,
     'eligible_pc_reason_pairs', (select count(*) from TMP_LEVEL_CHOICE),
     'rows_out', (select count(*) from TMP_MIX_OUT),
+    'months_synced', :V_MONTHS_SYNCED,
+    'window_mode', :V_WINDOW_MODE,
     'level_counts', (
       select object_agg(allocation_level, cnt)
       from (select allocation_level, count(*) cnt from TMP_LEVEL_CHOICE group by 1)
     )
   );
+
+exception
+  when other then
+    rollback;
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
 end;
 $$;
 
@@ -20,26 +20,8 @@ create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH (
   primary key (fiscal_yyyymm, roll_up_shop, reason_group)
 );
 
-create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP (
-  run_id               string,
-  asof_fiscal_yyyymm    number,
-
-  fiscal_yyyymm        number,
-  fiscal_year          number,
-  fiscal_month         number,
-  month_seq            number,
-  month_start_date     date,
-  month_end_date       date,
-
-  roll_up_shop         string,
-  reason_group         string,
-
-  total_budget         number(18,2),
-
-  source_object        string,
-  snapshotted_at       timestamp_ntz,
-  row_hash             string
-);
+-- FORECAST_BUDGET_PC_REASON_MTH_SNAP is a view over delta-encoded versions
+-- (one row per changed value, not per run): see 18__proc__write_pc_reason_mth_snapshot.sql
 
 create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_BUILD_BUDGET_PC_REASON_MTH(
     P_RUN_ID string,
@@ -58,8 +40,9 @@ declare
 
   V_START_SEQ number;
   V_SRC string;
+  V_SNAP variant;
 begin
-  V_SRC := 'DB_BI_P_SANDBOX.SANDBOX.RNA_RCT_TMT_CCCI_PL_RO_REVENUE_5YEARS';
+  V_SRC := 'DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH';
 
   -- Resolve as-of fiscal month
   if (P_ASOF_FISCAL_YYYYMM is null) then
@@ -83,11 +66,11 @@ begin
   create or replace temporary table TMP_BUD_PC_REASON as
   with base as (
     select
-      (try_to_number(v."Year")*100 + try_to_number(v."Period")) as fiscal_yyyymm,
-      v.roll_up_shop::string as roll_up_shop,
-      coalesce(v."Reason Code Group"::string, 'UNKNOWN') as reason_group,
-      sum(coalesce(v.budget,0)) as total_budget
-    from DB_BI_P_SANDBOX.SANDBOX.RNA_RCT_TMT_CCCI_PL_RO_REVENUE_5YEARS v
+      a.fiscal_yyyymm,
+      a.roll_up_shop,
+      coalesce(a.reason_group, 'UNKNOWN') as reason_group,
+      sum(a.total_budget) as total_budget
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH a
     group by 1,2,3
   ),
   joined as (
@@ -123,7 +106,7 @@ begin
   using TMP_BUD_PC_REASON s
   on  t.fiscal_yyyymm = s.fiscal_yyyymm
   and t.roll_up_shop  = s.roll_up_shop
-  and t.reason_group  = s.reason_group
+  and equal_null(t.reason_group, s.reason_group)
   when matched and (t.row_hash <> s.row_hash) then update set
       fiscal_year      = s.fiscal_year,
       fiscal_month     = s.fiscal_month,
@@ -144,30 +127,29 @@ begin
       s.source_object, s.loaded_at, s.row_hash
   );
 
-  -- Snapshot table: overwrite-by-run semantics
-  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP
-  where run_id = :P_RUN_ID
-    and asof_fiscal_yyyymm = :V_ASOF_YYYYMM;
-
-  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP
-  (run_id, asof_fiscal_yyyymm,
-   fiscal_yyyymm, fiscal_year, fiscal_month, month_seq, month_start_date, month_end_date,
-   roll_up_shop, reason_group, total_budget,
-   source_object, snapshotted_at, row_hash)
+  -- Snapshot: only the delta vs. the previous run is stored (rerun-safe)
+  create or replace temporary table TMP_BUD_PC_REASON_SNAP as
   select
-    :P_RUN_ID, :V_ASOF_YYYYMM,
     fiscal_yyyymm, fiscal_year, fiscal_month, month_seq, month_start_date, month_end_date,
-    roll_up_shop, reason_group, total_budget,
-    source_object, current_timestamp(), row_hash
+    roll_up_shop, reason_group, total_budget as value,
+    source_object, row_hash
   from TMP_BUD_PC_REASON;
 
+  call DB_BI_P_SANDBOX.SANDBOX.SP_WRITE_PC_REASON_MTH_SNAPSHOT('BUDGET_PC_REASON_MTH', :P_RUN_ID, :V_ASOF_YYYYMM, 'TMP_BUD_PC_REASON_SNAP', :V_START_SEQ, :V_ASOF_SEQ);
+  select $1 into :V_SNAP from table(result_scan(last_query_id()));
+
+  if (V_SNAP:"status"::string <> 'OK') then
+    return object_construct('status','ERROR','message','Snapshot write failed: ' || coalesce(V_SNAP:"message"::string, ''));
+  end if;
+
   return object_construct(
     'status','OK',
     'run_id', :P_RUN_ID,
     'asof_fiscal_yyyymm', :V_ASOF_YYYYMM,
     'month_seq_start', :V_START_SEQ,
     'month_seq_end', :V_ASOF_SEQ,
-    'rows_staged', (select count(*) from TMP_BUD_PC_REASON)
+    'rows_staged', (select count(*) from TMP_BUD_PC_REASON),
+    'snapshot', :V_SNAP
   );
 end;
 $$;
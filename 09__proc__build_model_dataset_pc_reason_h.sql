@@ -1,4 +1,28 @@
 -- 09__proc__build_model_dataset_pc_reason_h.sql
+--
+-- Incremental mode (P_INCREMENTAL, default on): series-months whose actuals or budget
+-- differ from the previous succeeded run are found by comparing the two runs' snapshots.
+-- Only anchors whose features or targets can see such a month are recomputed:
+--   anchor_month_seq >= changed month - P_MAX_HORIZON      (targets, budget_target)
+--   up to the 12th series row after the changed month      (lags, rolling windows,
+--                                                          budget_lag_12)
+-- Every other anchor x horizon row is carried forward from the previous run's dataset
+-- snapshot without recomputing features. Series missing from that snapshot are built in
+-- full. Without a usable previous run the build is FULL, as before.
+--
+-- The dataset snapshot is delta-encoded like the actuals / budget snapshots
+-- (18__proc__write_pc_reason_mth_snapshot.sql): FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_VERSIONS
+-- holds each row version once with its snap_seq validity range, FORECAST_SNAPSHOT_REGISTRY
+-- (snapshot_kind MODEL_DATASET_PC_REASON_H, month_seq_start / _end = anchor range) points
+-- each run at its state, and FORECAST_MODEL_DATASET_PC_REASON_H_SNAP is the view that
+-- rebuilds it. A carried row is therefore a reference to the version the previous run
+-- already stored, not a copy.
+--
+-- FORECAST_MODEL_DATASET_PC_REASON_H holds the latest build: one row per series x anchor x
+-- horizon, with run_id / asof_fiscal_yyyymm of the build that last changed it. row_hash
+-- covers the row's content only (no run_id, as-of or built_at), so a row the previous
+-- run already had hashes the same. rows_changed / rows_unchanged compare with the
+-- previous run's snapshot, and only rows whose content changed are written.
 
 create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H (
   asof_fiscal_yyyymm    number,
@@ -6,6 +30,7 @@ create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON
 
   roll_up_shop          string,
   reason_group          string,
+  series_id             number,          -- FORECAST_SERIES_REGISTRY
 
   anchor_fiscal_yyyymm  number,
   anchor_month_seq      number,
@@ -42,15 +67,13 @@ create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON
   built_at              timestamp_ntz,
   row_hash              string,
 
-  primary key (asof_fiscal_yyyymm, run_id, roll_up_shop, reason_group, anchor_fiscal_yyyymm, horizon)
+  primary key (roll_up_shop, reason_group, anchor_fiscal_yyyymm, horizon)
 );
 
-create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP (
-  run_id                string,
-  asof_fiscal_yyyymm     number,
-
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_VERSIONS (
   roll_up_shop          string,
   reason_group          string,
+  series_id             number,          -- FORECAST_SERIES_REGISTRY
 
   anchor_fiscal_yyyymm  number,
   anchor_month_seq      number,
@@ -85,13 +108,201 @@ create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON
   budget_lag_12         number(18,2),
 
   built_at              timestamp_ntz,
-  row_hash              string
-);
+  row_hash              string,
+
+  valid_from_seq        number,
+  valid_to_seq          number           -- null = still current
+)
+cluster by (anchor_month_seq);
+
+---------------------------------------------------------------
+-- Full dataset snapshot per run (former _SNAP table)
+---------------------------------------------------------------
+create or replace view DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP as
+select
+  r.run_id,
+  r.asof_fiscal_yyyymm,
+
+  v.roll_up_shop, v.reason_group, v.series_id,
+  v.anchor_fiscal_yyyymm, v.anchor_month_seq, v.anchor_fiscal_year, v.anchor_fiscal_month,
+  v.horizon, v.target_fiscal_yyyymm, v.target_month_seq,
+  v.y_revenue, v.budget_target,
+  v.fiscal_month_sin, v.fiscal_month_cos,
+  v.lag_1, v.lag_2, v.lag_3, v.lag_6, v.lag_12,
+  v.roll_mean_3, v.roll_mean_6, v.roll_mean_12, v.roll_std_12,
+  v.yoy_diff_12, v.yoy_pct_12,
+  v.budget_anchor, v.budget_lag_12,
+  v.built_at, v.row_hash
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY r
+join DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_VERSIONS v
+  on v.anchor_month_seq between r.month_seq_start and r.month_seq_end
+ and v.valid_from_seq <= r.snap_seq
+ and (v.valid_to_seq is null or v.valid_to_seq > r.snap_seq)
+where r.snapshot_kind = 'MODEL_DATASET_PC_REASON_H';
+
+---------------------------------------------------------------
+-- SP_WRITE_MODEL_DATASET_SNAPSHOT
+--
+-- P_STAGE_TABLE: (temp) table with the run's full dataset, columns as the snapshot view
+-- (TMP_DS of SP_BUILD_MODEL_DATASET_PC_REASON_H). Diffed against the open versions for
+-- anchors P_ANCHOR_SEQ_START..P_ANCHOR_SEQ_END; only the delta is written, as in
+-- SP_WRITE_PC_REASON_MTH_SNAPSHOT.
+---------------------------------------------------------------
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_WRITE_MODEL_DATASET_SNAPSHOT(
+    P_RUN_ID string,
+    P_ASOF_FISCAL_YYYYMM number,
+    P_STAGE_TABLE string,
+    P_ANCHOR_SEQ_START number,
+    P_ANCHOR_SEQ_END number
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_SEQ number;
+
+  V_ROWS_FULL number;
+  V_ROWS_INSERTED number;
+  V_ROWS_UPDATED number;
+  V_ROWS_DELETED number;
+begin
+  select DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_SEQ.nextval into :V_SEQ;
+
+  -- Stage vs. current versions inside the run's anchor range
+  create or replace temporary table TMP_DS_SNAP_DIFF as
+  with cur as (
+    select *
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_VERSIONS
+    where valid_to_seq is null
+      and anchor_month_seq between :P_ANCHOR_SEQ_START and :P_ANCHOR_SEQ_END
+  )
+  select
+    coalesce(s.roll_up_shop, c.roll_up_shop)                 as key_roll_up_shop,
+    coalesce(s.reason_group, c.reason_group)                 as key_reason_group,
+    coalesce(s.anchor_fiscal_yyyymm, c.anchor_fiscal_yyyymm) as key_anchor_fiscal_yyyymm,
+    coalesce(s.horizon, c.horizon)                           as key_horizon,
+    s.roll_up_shop, s.reason_group, s.series_id,
+    s.anchor_fiscal_yyyymm, s.anchor_month_seq, s.anchor_fiscal_year, s.anchor_fiscal_month,
+    s.horizon, s.target_fiscal_yyyymm, s.target_month_seq,
+    s.y_revenue, s.budget_target,
+    s.fiscal_month_sin, s.fiscal_month_cos,
+    s.lag_1, s.lag_2, s.lag_3, s.lag_6, s.lag_12,
+    s.roll_mean_3, s.roll_mean_6, s.roll_mean_12, s.roll_std_12,
+    s.yoy_diff_12, s.yoy_pct_12,
+    s.budget_anchor, s.budget_lag_12,
+    s.built_at, s.row_hash,
+    case
+      when c.row_hash is null then 'INSERT'
+      when s.row_hash is null then 'DELETE'
+      else 'UPDATE'
+    end as change_type
+  from identifier(:P_STAGE_TABLE) s
+  full outer join cur c
+    on  c.roll_up_shop         = s.roll_up_shop
+    and equal_null(c.reason_group, s.reason_group)
+    and c.anchor_fiscal_yyyymm = s.anchor_fiscal_yyyymm
+    and c.horizon              = s.horizon
+  where c.row_hash is null
+     or s.row_hash is null
+     or c.row_hash <> s.row_hash;
+
+  select count(*) into :V_ROWS_FULL from identifier(:P_STAGE_TABLE);
+
+  select count_if(change_type = 'INSERT'), count_if(change_type = 'UPDATE'), count_if(change_type = 'DELETE')
+    into :V_ROWS_INSERTED, :V_ROWS_UPDATED, :V_ROWS_DELETED
+  from TMP_DS_SNAP_DIFF;
+
+  begin transaction;
+
+  -- Close replaced / vanished versions
+  update DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_VERSIONS v
+  set valid_to_seq = :V_SEQ
+  from TMP_DS_SNAP_DIFF d
+  where d.change_type in ('UPDATE', 'DELETE')
+    and v.valid_to_seq is null
+    and v.roll_up_shop = d.key_roll_up_shop
+    and equal_null(v.reason_group, d.key_reason_group)
+    and v.anchor_fiscal_yyyymm = d.key_anchor_fiscal_yyyymm
+    and v.horizon = d.key_horizon;
+
+  -- Open new versions
+  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_VERSIONS
+  (roll_up_shop, reason_group, series_id,
+   anchor_fiscal_yyyymm, anchor_month_seq, anchor_fiscal_year, anchor_fiscal_month,
+   horizon, target_fiscal_yyyymm, target_month_seq,
+   y_revenue, budget_target,
+   fiscal_month_sin, fiscal_month_cos,
+   lag_1, lag_2, lag_3, lag_6, lag_12,
+   roll_mean_3, roll_mean_6, roll_mean_12, roll_std_12,
+   yoy_diff_12, yoy_pct_12,
+   budget_anchor, budget_lag_12,
+   built_at, row_hash,
+   valid_from_seq, valid_to_seq)
+  select
+    roll_up_shop, reason_group, series_id,
+    anchor_fiscal_yyyymm, anchor_month_seq, anchor_fiscal_year, anchor_fiscal_month,
+    horizon, target_fiscal_yyyymm, target_month_seq,
+    y_revenue, budget_target,
+    fiscal_month_sin, fiscal_month_cos,
+    lag_1, lag_2, lag_3, lag_6, lag_12,
+    roll_mean_3, roll_mean_6, roll_mean_12, roll_std_12,
+    yoy_diff_12, yoy_pct_12,
+    budget_anchor, budget_lag_12,
+    built_at, row_hash,
+    :V_SEQ, null
+  from TMP_DS_SNAP_DIFF
+  where change_type in ('INSERT', 'UPDATE');
+
+  -- Point the run at this state (a rerun simply moves to the new seq)
+  merge into DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY t
+  using (select 'MODEL_DATASET_PC_REASON_H' as snapshot_kind, :P_RUN_ID as run_id) s
+  on  t.snapshot_kind = s.snapshot_kind
+  and t.run_id        = s.run_id
+  when matched then update set
+    asof_fiscal_yyyymm = :P_ASOF_FISCAL_YYYYMM,
+    snap_seq           = :V_SEQ,
+    month_seq_start    = :P_ANCHOR_SEQ_START,
+    month_seq_end      = :P_ANCHOR_SEQ_END,
+    rows_full          = :V_ROWS_FULL,
+    rows_delta         = :V_ROWS_INSERTED + :V_ROWS_UPDATED + :V_ROWS_DELETED,
+    snapshotted_at     = current_timestamp()
+  when not matched then insert (
+    snapshot_kind, run_id, asof_fiscal_yyyymm, snap_seq, month_seq_start, month_seq_end,
+    rows_full, rows_delta, snapshotted_at
+  ) values (
+    s.snapshot_kind, s.run_id, :P_ASOF_FISCAL_YYYYMM, :V_SEQ, :P_ANCHOR_SEQ_START, :P_ANCHOR_SEQ_END,
+    :V_ROWS_FULL, :V_ROWS_INSERTED + :V_ROWS_UPDATED + :V_ROWS_DELETED, current_timestamp()
+  );
+
+  commit;
+
+  return object_construct(
+    'status','OK',
+    'run_id', :P_RUN_ID,
+    'snap_seq', :V_SEQ,
+    'rows_full', :V_ROWS_FULL,
+    'rows_inserted', :V_ROWS_INSERTED,
+    'rows_updated', :V_ROWS_UPDATED,
+    'rows_deleted', :V_ROWS_DELETED
+  );
+
+exception
+  when other then
+    rollback;
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
+end;
+$$;
 
 create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_BUILD_MODEL_DATASET_PC_REASON_H(
     P_RUN_ID string,
     P_ASOF_FISCAL_YYYYMM number default null,
-    P_MAX_HORIZON number default 12
+    P_MAX_HORIZON number default 12,
+    P_INCREMENTAL boolean default true
 )
 returns variant
 language sql
@@ -105,6 +316,19 @@ declare
   V_MIN_ANCHOR_SEQ number;
   V_MAX_ANCHOR_SEQ number;
 
+  V_MODE string;
+  V_PREV_RUN_ID string;
+  V_PREV_ASOF_YYYYMM number;
+  V_PREV_ROWS number;
+  V_PREV_MAX_HORIZON number;
+
+  V_ROWS_OUT number;
+  V_ROWS_CARRIED number;
+  V_ROWS_CHANGED number;
+  V_ROWS_UNCHANGED number;
+  V_ROWS_REMOVED number;
+
+  V_SNAP variant;
 begin
   -- Resolve as-of
   if (P_ASOF_FISCAL_YYYYMM is null) then
@@ -128,155 +352,378 @@ begin
   -- Need lag_12 and 12-month rolling window available
   V_MIN_ANCHOR_SEQ := 13;
 
-  -- Base series from ACTUALS snapshot
+  -- Series-month rows with budget features pivoted on: actuals, budget at the month and
+  -- budget 12 months back are stacked and collapsed per (PC, reason, month), keeping
+  -- months that have actuals. All series windows then come from one ordered pass.
   create or replace temporary table TMP_SERIES as
+  with stacked as (
+    select
+      a.roll_up_shop, a.reason_group, a.month_seq,
+      a.fiscal_yyyymm, a.fiscal_year, a.fiscal_month,
+      a.total_revenue          as revenue,
+      null::number(18,2)       as budget,
+      null::number(18,2)       as budget_lag_12,
+      1                        as is_actual
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP a
+    where a.run_id = :P_RUN_ID
+      and a.asof_fiscal_yyyymm = :V_ASOF_YYYYMM
+
+    union all
+
+    select
+      b.roll_up_shop, b.reason_group, b.month_seq,
+      null, null, null,
+      null, b.total_budget, null, 0
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP b
+    where b.run_id = :P_RUN_ID
+      and b.asof_fiscal_yyyymm = :V_ASOF_YYYYMM
+
+    union all
+
+    select
+      b.roll_up_shop, b.reason_group, b.month_seq + 12,
+      null, null, null,
+      null, null, b.total_budget, 0
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP b
+    where b.run_id = :P_RUN_ID
+      and b.asof_fiscal_yyyymm = :V_ASOF_YYYYMM
+  ),
+  series_mth as (
+    select
+      roll_up_shop, reason_group, month_seq,
+      max(fiscal_yyyymm)  as fiscal_yyyymm,
+      max(fiscal_year)    as fiscal_year,
+      max(fiscal_month)   as fiscal_month,
+      max(revenue)        as revenue,
+      max(budget)         as budget,
+      max(budget_lag_12)  as budget_lag_12
+    from stacked
+    where roll_up_shop in (
+      select roll_up_shop
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_PC_ELIGIBILITY
+      where run_id = :P_RUN_ID
+        and is_eligible = true
+    )
+    group by 1,2,3
+    having max(is_actual) = 1
+  )
   select
-    a.roll_up_shop,
-    a.reason_group,
-    a.fiscal_yyyymm,
-    a.month_seq,
-    a.fiscal_year,
-    a.fiscal_month,
-    a.total_revenue as revenue,
-
-    lag(a.total_revenue, 1)  over (partition by a.roll_up_shop, a.reason_group order by a.month_seq) as lag_1,
-    lag(a.total_revenue, 2)  over (partition by a.roll_up_shop, a.reason_group order by a.month_seq) as lag_2,
-    lag(a.total_revenue, 3)  over (partition by a.roll_up_shop, a.reason_group order by a.month_seq) as lag_3,
-    lag(a.total_revenue, 6)  over (partition by a.roll_up_shop, a.reason_group order by a.month_seq) as lag_6,
-    lag(a.total_revenue, 12) over (partition by a.roll_up_shop, a.reason_group order by a.month_seq) as lag_12,
-
-    avg(a.total_revenue) over (
-      partition by a.roll_up_shop, a.reason_group
-      order by a.month_seq
+    m.*,
+
+    row_number()       over (partition by m.roll_up_shop, m.reason_group order by m.month_seq) as series_rn,
+
+    lag(m.revenue, 1)  over (partition by m.roll_up_shop, m.reason_group order by m.month_seq) as lag_1,
+    lag(m.revenue, 2)  over (partition by m.roll_up_shop, m.reason_group order by m.month_seq) as lag_2,
+    lag(m.revenue, 3)  over (partition by m.roll_up_shop, m.reason_group order by m.month_seq) as lag_3,
+    lag(m.revenue, 6)  over (partition by m.roll_up_shop, m.reason_group order by m.month_seq) as lag_6,
+    lag(m.revenue, 12) over (partition by m.roll_up_shop, m.reason_group order by m.month_seq) as lag_12,
+
+    -- Same partition and order as the lags, so every window shares a single sort
+    avg(m.revenue) over (
+      partition by m.roll_up_shop, m.reason_group order by m.month_seq
       rows between 2 preceding and current row
     ) as roll_mean_3,
 
-    avg(a.total_revenue) over (
-      partition by a.roll_up_shop, a.reason_group
-      order by a.month_seq
+    avg(m.revenue) over (
+      partition by m.roll_up_shop, m.reason_group order by m.month_seq
       rows between 5 preceding and current row
     ) as roll_mean_6,
 
-    avg(a.total_revenue) over (
-      partition by a.roll_up_shop, a.reason_group
-      order by a.month_seq
+    avg(m.revenue) over (
+      partition by m.roll_up_shop, m.reason_group order by m.month_seq
       rows between 11 preceding and current row
     ) as roll_mean_12,
 
-    stddev_samp(a.total_revenue) over (
-      partition by a.roll_up_shop, a.reason_group
-      order by a.month_seq
+    stddev_samp(m.revenue) over (
+      partition by m.roll_up_shop, m.reason_group order by m.month_seq
       rows between 11 preceding and current row
-    ) as roll_std_12
-
-  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP a
-  join DB_BI_P_SANDBOX.SANDBOX.FORECAST_PC_ELIGIBILITY e
-    on e.run_id = :P_RUN_ID
-   and e.roll_up_shop = a.roll_up_shop
-   and e.is_eligible = true
-  where a.run_id = :P_RUN_ID
-    and a.asof_fiscal_yyyymm = :V_ASOF_YYYYMM;
-
-  -- Budget series (anchor/target features)
-  create or replace temporary table TMP_BUD as
-  select
-    b.roll_up_shop,
-    b.reason_group,
-    b.month_seq,
-    b.total_budget
-  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP b
-  where b.run_id = :P_RUN_ID
-    and b.asof_fiscal_yyyymm = :V_ASOF_YYYYMM;
+    ) as roll_std_12,
+
+    r.series_id
+
+  from series_mth m
+  left join DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY r
+    on r.roll_up_shop = m.roll_up_shop
+   and equal_null(r.reason_group, m.reason_group);
 
   -- Horizons grid (1..P_MAX_HORIZON)
   create or replace temporary table TMP_H as
   select seq4()+1 as horizon
   from table(generator(rowcount => :P_MAX_HORIZON));
 
+  -- Previous run: what changed rows are counted against, and (same horizon grid, dataset
+  -- snapshot still kept) the run incremental mode carries forward from
+  V_MODE := 'FULL';
+
+  select max_by(r.run_id, r.triggered_at), max_by(r.asof_fiscal_yyyymm, r.triggered_at)
+    into :V_PREV_RUN_ID, :V_PREV_ASOF_YYYYMM
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUNS r
+  where r.run_id <> :P_RUN_ID
+    and r.status = 'SUCCEEDED'
+    and r.triggered_at < coalesce(
+          (select triggered_at from DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUNS where run_id = :P_RUN_ID),
+          current_timestamp());
+
+  if (P_INCREMENTAL and V_PREV_RUN_ID is not null) then
+    select count(*), max(horizon)
+      into :V_PREV_ROWS, :V_PREV_MAX_HORIZON
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP
+    where run_id = :V_PREV_RUN_ID
+      and asof_fiscal_yyyymm = :V_PREV_ASOF_YYYYMM;
+
+    if (V_PREV_ROWS > 0 and V_PREV_MAX_HORIZON = P_MAX_HORIZON) then
+      V_MODE := 'INCREMENTAL';
+    end if;
+  end if;
+
+  create or replace temporary table TMP_DS_AFFECTED (
+    roll_up_shop     string,
+    reason_group     string,
+    anchor_seq_from  number,
+    anchor_seq_to    number              -- null: no upper bound
+  );
+
+  if (V_MODE = 'INCREMENTAL') then
+    -- Series-months added, removed or changed (actuals or budget) since the previous run
+    create or replace temporary table TMP_DS_CHANGED_MTH as
+    with cur as (
+      select roll_up_shop, reason_group, month_seq, 'ACT' as src, total_revenue as value
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP
+      where run_id = :P_RUN_ID and asof_fiscal_yyyymm = :V_ASOF_YYYYMM
+      union all
+      select roll_up_shop, reason_group, month_seq, 'BUD', total_budget
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP
+      where run_id = :P_RUN_ID and asof_fiscal_yyyymm = :V_ASOF_YYYYMM
+    ),
+    prev as (
+      select roll_up_shop, reason_group, month_seq, 'ACT' as src, total_revenue as value
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP
+      where run_id = :V_PREV_RUN_ID and asof_fiscal_yyyymm = :V_PREV_ASOF_YYYYMM
+      union all
+      select roll_up_shop, reason_group, month_seq, 'BUD', total_budget
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP
+      where run_id = :V_PREV_RUN_ID and asof_fiscal_yyyymm = :V_PREV_ASOF_YYYYMM
+    )
+    select distinct
+      iff(c.src is null, p.roll_up_shop, c.roll_up_shop) as roll_up_shop,
+      iff(c.src is null, p.reason_group, c.reason_group) as reason_group,
+      iff(c.src is null, p.month_seq, c.month_seq)       as month_seq
+    from cur c
+    full outer join prev p
+      on  p.roll_up_shop = c.roll_up_shop
+      and equal_null(p.reason_group, c.reason_group)
+      and p.month_seq    = c.month_seq
+      and p.src          = c.src
+    where c.src is null
+       or p.src is null
+       or not equal_null(c.value, p.value);
+
+    -- Anchor range each change reaches: targets up to P_MAX_HORIZON back, features up to
+    -- the 12th series row after it (series_rn counts rows, as the lags do)
+    insert into TMP_DS_AFFECTED (roll_up_shop, reason_group, anchor_seq_from, anchor_seq_to)
+    with rows_before as (
+      select
+        c.roll_up_shop, c.reason_group, c.month_seq,
+        count(s.month_seq) as rows_upto
+      from TMP_DS_CHANGED_MTH c
+      left join TMP_SERIES s
+        on  s.roll_up_shop = c.roll_up_shop
+        and equal_null(s.reason_group, c.reason_group)
+        and s.month_seq   <= c.month_seq
+      group by 1,2,3
+    )
+    select
+      r.roll_up_shop, r.reason_group,
+      r.month_seq - :P_MAX_HORIZON,
+      s12.month_seq
+    from rows_before r
+    left join TMP_SERIES s12
+      on  s12.roll_up_shop = r.roll_up_shop
+      and equal_null(s12.reason_group, r.reason_group)
+      and s12.series_rn    = r.rows_upto + 12;
+
+    -- Series without rows in the previous dataset (e.g. newly eligible) are built in full
+    insert into TMP_DS_AFFECTED (roll_up_shop, reason_group, anchor_seq_from, anchor_seq_to)
+    select distinct s.roll_up_shop, s.reason_group, 0, null
+    from TMP_SERIES s
+    where not exists (
+      select 1
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP p
+      where p.run_id = :V_PREV_RUN_ID
+        and p.asof_fiscal_yyyymm = :V_PREV_ASOF_YYYYMM
+        and p.roll_up_shop = s.roll_up_shop
+        and equal_null(p.reason_group, s.reason_group)
+    );
+  end if;
+
   -- Supervised rows
   create or replace temporary table TMP_DS as
   with anchors as (
-    select *
-    from TMP_SERIES
-    where month_seq between :V_MIN_ANCHOR_SEQ and :V_MAX_ANCHOR_SEQ
-      and lag_12 is not null
+    select a.*
+    from TMP_SERIES a
+    where a.month_seq between :V_MIN_ANCHOR_SEQ and :V_MAX_ANCHOR_SEQ
+      and a.lag_12 is not null
+      and (:V_MODE = 'FULL' or exists (
+            select 1
+            from TMP_DS_AFFECTED x
+            where x.roll_up_shop = a.roll_up_shop
+              and equal_null(x.reason_group, a.reason_group)
+              and a.month_seq >= x.anchor_seq_from
+              and a.month_seq <= coalesce(x.anchor_seq_to, a.month_seq)))
   ),
   targets as (
-    select roll_up_shop, reason_group, month_seq, fiscal_yyyymm, revenue as y_revenue
+    select roll_up_shop, reason_group, month_seq, fiscal_yyyymm, revenue as y_revenue, budget
     from TMP_SERIES
+  ),
+  ds as (
+    select
+      :V_ASOF_YYYYMM as asof_fiscal_yyyymm,
+      :P_RUN_ID::string as run_id,
+
+      a.roll_up_shop,
+      a.reason_group,
+      a.series_id,
+
+      a.fiscal_yyyymm as anchor_fiscal_yyyymm,
+      a.month_seq     as anchor_month_seq,
+      a.fiscal_year   as anchor_fiscal_year,
+      a.fiscal_month  as anchor_fiscal_month,
+
+      h.horizon,
+      t.fiscal_yyyymm as target_fiscal_yyyymm,
+      t.month_seq     as target_month_seq,
+
+      t.y_revenue,
+      t.budget        as budget_target,
+
+      sin(2 * pi() * (a.fiscal_month / 12.0)) as fiscal_month_sin,
+      cos(2 * pi() * (a.fiscal_month / 12.0)) as fiscal_month_cos,
+
+      a.lag_1, a.lag_2, a.lag_3, a.lag_6, a.lag_12,
+      a.roll_mean_3, a.roll_mean_6, a.roll_mean_12, a.roll_std_12,
+
+      (a.revenue - a.lag_12) as yoy_diff_12,
+      iff(a.lag_12 = 0, null, (a.revenue - a.lag_12) / nullif(a.lag_12,0)) as yoy_pct_12,
+
+      a.budget        as budget_anchor,
+      a.budget_lag_12,
+
+      current_timestamp() as built_at,
+      false               as carried
+
+    from anchors a
+    join TMP_H h on 1=1
+    join targets t
+      on t.roll_up_shop = a.roll_up_shop
+     and equal_null(t.reason_group, a.reason_group)
+     and t.month_seq    = a.month_seq + h.horizon
+
+    union all
+
+    -- Unaffected anchors: previous run's rows under this run / as-of
+    select
+      :V_ASOF_YYYYMM, :P_RUN_ID::string,
+      p.roll_up_shop, p.reason_group, p.series_id,
+      p.anchor_fiscal_yyyymm, p.anchor_month_seq, p.anchor_fiscal_year, p.anchor_fiscal_month,
+      p.horizon, p.target_fiscal_yyyymm, p.target_month_seq,
+      p.y_revenue, p.budget_target,
+      p.fiscal_month_sin, p.fiscal_month_cos,
+      p.lag_1, p.lag_2, p.lag_3, p.lag_6, p.lag_12,
+      p.roll_mean_3, p.roll_mean_6, p.roll_mean_12, p.roll_std_12,
+      p.yoy_diff_12, p.yoy_pct_12,
+      p.budget_anchor, p.budget_lag_12,
+      p.built_at,
+      true
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP p
+    where :V_MODE = 'INCREMENTAL'
+      and p.run_id = :V_PREV_RUN_ID
+      and p.asof_fiscal_yyyymm = :V_PREV_ASOF_YYYYMM
+      and p.anchor_month_seq between :V_MIN_ANCHOR_SEQ and :V_MAX_ANCHOR_SEQ
+      and p.roll_up_shop in (
+        select roll_up_shop
+        from DB_BI_P_SANDBOX.SANDBOX.FORECAST_PC_ELIGIBILITY
+        where run_id = :P_RUN_ID
+          and is_eligible = true
+      )
+      and not exists (
+        select 1
+        from TMP_DS_AFFECTED x
+        where x.roll_up_shop = p.roll_up_shop
+          and equal_null(x.reason_group, p.reason_group)
+          and p.anchor_month_seq >= x.anchor_seq_from
+          and p.anchor_month_seq <= coalesce(x.anchor_seq_to, p.anchor_month_seq))
   )
   select
-    :V_ASOF_YYYYMM as asof_fiscal_yyyymm,
-    :P_RUN_ID::string as run_id,
-
-    a.roll_up_shop,
-    a.reason_group,
-
-    a.fiscal_yyyymm as anchor_fiscal_yyyymm,
-    a.month_seq     as anchor_month_seq,
-    a.fiscal_year   as anchor_fiscal_year,
-    a.fiscal_month  as anchor_fiscal_month,
-
-    h.horizon,
-    t.fiscal_yyyymm as target_fiscal_yyyymm,
-    t.month_seq     as target_month_seq,
-
-    t.y_revenue,
-    bt.total_budget as budget_target,
-
-    sin(2 * pi() * (a.fiscal_month / 12.0)) as fiscal_month_sin,
-    cos(2 * pi() * (a.fiscal_month / 12.0)) as fiscal_month_cos,
-
-    a.lag_1, a.lag_2, a.lag_3, a.lag_6, a.lag_12,
-    a.roll_mean_3, a.roll_mean_6, a.roll_mean_12, a.roll_std_12,
-
-    (a.revenue - a.lag_12) as yoy_diff_12,
-    iff(a.lag_12 = 0, null, (a.revenue - a.lag_12) / nullif(a.lag_12,0)) as yoy_pct_12,
-
-    ba.total_budget as budget_anchor,
-    bb12.total_budget as budget_lag_12,
-
-    current_timestamp() as built_at,
-
+    ds.*,
+    -- Content hash: series key + target + every feature (not run_id, as-of or built_at),
+    -- so an unchanged row hashes the same in every run. sin/cos derive from
+    -- anchor_fiscal_yyyymm.
     md5(
-      coalesce(:V_ASOF_YYYYMM::string,'') || '|' ||
-      coalesce(:P_RUN_ID::string,'') || '|' ||
-      coalesce(a.roll_up_shop,'') || '|' ||
-      coalesce(a.reason_group,'') || '|' ||
-      coalesce(a.fiscal_yyyymm::string,'') || '|' ||
-      coalesce(h.horizon::string,'')
+      coalesce(ds.roll_up_shop,'') || '|' ||
+      coalesce(ds.reason_group,'') || '|' ||
+      coalesce(ds.anchor_fiscal_yyyymm::string,'') || '|' ||
+      coalesce(ds.horizon::string,'') || '|' ||
+      coalesce(ds.target_fiscal_yyyymm::string,'') || '|' ||
+      coalesce(ds.y_revenue::string,'') || '|' ||
+      coalesce(ds.budget_target::string,'') || '|' ||
+      coalesce(ds.lag_1::string,'') || '|' ||
+      coalesce(ds.lag_2::string,'') || '|' ||
+      coalesce(ds.lag_3::string,'') || '|' ||
+      coalesce(ds.lag_6::string,'') || '|' ||
+      coalesce(ds.lag_12::string,'') || '|' ||
+      coalesce(ds.roll_mean_3::string,'') || '|' ||
+      coalesce(ds.roll_mean_6::string,'') || '|' ||
+      coalesce(ds.roll_mean_12::string,'') || '|' ||
+      coalesce(ds.roll_std_12::string,'') || '|' ||
+      coalesce(ds.yoy_diff_12::string,'') || '|' ||
+      coalesce(ds.yoy_pct_12::string,'') || '|' ||
+      coalesce(ds.budget_anchor::string,'') || '|' ||
+      coalesce(ds.budget_lag_12::string,'')
     ) as row_hash
+  from ds;
+
+  -- Rows new or changed since the previous run
+  create or replace temporary table TMP_DS_DELTA as
+  select s.*
+  from TMP_DS s
+  left join (
+    select roll_up_shop, reason_group, anchor_fiscal_yyyymm, horizon, row_hash
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP
+    where run_id = :V_PREV_RUN_ID
+      and asof_fiscal_yyyymm = :V_PREV_ASOF_YYYYMM
+  ) p
+    on  p.roll_up_shop         = s.roll_up_shop
+    and equal_null(p.reason_group, s.reason_group)
+    and p.anchor_fiscal_yyyymm = s.anchor_fiscal_yyyymm
+    and p.horizon              = s.horizon
+  where p.row_hash is null
+     or p.row_hash <> s.row_hash;
+
+  select count(*), count_if(carried) into :V_ROWS_OUT, :V_ROWS_CARRIED from TMP_DS;
+  select count(*) into :V_ROWS_CHANGED from TMP_DS_DELTA;
+  V_ROWS_UNCHANGED := V_ROWS_OUT - V_ROWS_CHANGED;
+
+  -- Snapshot: only versions that differ from the stored state are written; carried rows
+  -- stay references to the previous run's versions
+  call DB_BI_P_SANDBOX.SANDBOX.SP_WRITE_MODEL_DATASET_SNAPSHOT(:P_RUN_ID, :V_ASOF_YYYYMM, 'TMP_DS', :V_MIN_ANCHOR_SEQ, :V_MAX_ANCHOR_SEQ);
+  select $1 into :V_SNAP from table(result_scan(last_query_id()));
+  if (V_SNAP:"status"::string <> 'OK') then
+    return object_construct('status','ERROR','message','Dataset snapshot write failed: ' || coalesce(V_SNAP:"message"::string, ''));
+  end if;
 
-  from anchors a
-  join TMP_H h on 1=1
-  join targets t
-    on t.roll_up_shop = a.roll_up_shop
-   and t.reason_group = a.reason_group
-   and t.month_seq    = a.month_seq + h.horizon
-  left join TMP_BUD bt
-    on bt.roll_up_shop = a.roll_up_shop
-   and bt.reason_group = a.reason_group
-   and bt.month_seq    = a.month_seq + h.horizon
-  left join TMP_BUD ba
-    on ba.roll_up_shop = a.roll_up_shop
-   and ba.reason_group = a.reason_group
-   and ba.month_seq    = a.month_seq
-  left join TMP_BUD bb12
-    on bb12.roll_up_shop = a.roll_up_shop
-   and bb12.reason_group = a.reason_group
-   and bb12.month_seq    = a.month_seq - 12
-  ;
-
-  -- Upsert CURRENT
+  -- Upsert CURRENT: a row is rewritten only when its content differs. The source is the
+  -- full build rather than TMP_DS_DELTA because CURRENT holds the latest build, which
+  -- need not be the previous succeeded run (e.g. a run that failed after this stage).
   merge into DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H t
   using TMP_DS s
-  on  t.asof_fiscal_yyyymm   = s.asof_fiscal_yyyymm
-  and t.run_id               = s.run_id
-  and t.roll_up_shop         = s.roll_up_shop
-  and t.reason_group         = s.reason_group
+  on  t.roll_up_shop         = s.roll_up_shop
+  and equal_null(t.reason_group, s.reason_group)
   and t.anchor_fiscal_yyyymm = s.anchor_fiscal_yyyymm
   and t.horizon              = s.horizon
   when matched and (t.row_hash <> s.row_hash) then update set
+    asof_fiscal_yyyymm   = s.asof_fiscal_yyyymm,
+    run_id               = s.run_id,
+    series_id            = s.series_id,
     anchor_month_seq     = s.anchor_month_seq,
     anchor_fiscal_year   = s.anchor_fiscal_year,
     anchor_fiscal_month  = s.anchor_fiscal_month,
@@ -303,7 +750,7 @@ begin
     row_hash             = s.row_hash
   when not matched then insert (
     asof_fiscal_yyyymm, run_id,
-    roll_up_shop, reason_group,
+    roll_up_shop, reason_group, series_id,
     anchor_fiscal_yyyymm, anchor_month_seq, anchor_fiscal_year, anchor_fiscal_month,
     horizon, target_fiscal_yyyymm, target_month_seq,
     y_revenue, budget_target,
@@ -315,7 +762,7 @@ begin
     built_at, row_hash
   ) values (
     s.asof_fiscal_yyyymm, s.run_id,
-    s.roll_up_shop, s.reason_group,
+    s.roll_up_shop, s.reason_group, s.series_id,
     s.anchor_fiscal_yyyymm, s.anchor_month_seq, s.anchor_fiscal_year, s.anchor_fiscal_month,
     s.horizon, s.target_fiscal_yyyymm, s.target_month_seq,
     s.y_revenue, s.budget_target,
@@ -327,25 +774,17 @@ begin
     s.built_at, s.row_hash
   );
 
-  -- Snapshot overwrite-by-run
-  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP
-  where run_id = :P_RUN_ID
-    and asof_fiscal_yyyymm = :V_ASOF_YYYYMM;
+  -- Rows no longer in the build (series no longer eligible, anchors out of range)
+  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H t
+  where not exists (
+    select 1
+    from TMP_DS s
+    where s.roll_up_shop         = t.roll_up_shop
+      and equal_null(s.reason_group, t.reason_group)
+      and s.anchor_fiscal_yyyymm = t.anchor_fiscal_yyyymm
+      and s.horizon              = t.horizon);
 
-  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP
-  select
-    run_id, asof_fiscal_yyyymm,
-    roll_up_shop, reason_group,
-    anchor_fiscal_yyyymm, anchor_month_seq, anchor_fiscal_year, anchor_fiscal_month,
-    horizon, target_fiscal_yyyymm, target_month_seq,
-    y_revenue, budget_target,
-    fiscal_month_sin, fiscal_month_cos,
-    lag_1, lag_2, lag_3, lag_6, lag_12,
-    roll_mean_3, roll_mean_6, roll_mean_12, roll_std_12,
-    yoy_diff_12, yoy_pct_12,
-    budget_anchor, budget_lag_12,
-    built_at, row_hash
-  from TMP_DS;
+  V_ROWS_REMOVED := SQLROWCOUNT;
 
   return object_construct(
     'status','OK',
@@ -354,7 +793,14 @@ begin
     'anchors_min_seq', :V_MIN_ANCHOR_SEQ,
     'anchors_max_seq', :V_MAX_ANCHOR_SEQ,
     'max_horizon', :P_MAX_HORIZON,
-    'rows_out', (select count(*) from TMP_DS)
+    'mode', :V_MODE,
+    'prev_run_id', :V_PREV_RUN_ID,
+    'rows_out', :V_ROWS_OUT,
+    'rows_carried', :V_ROWS_CARRIED,
+    'rows_changed', :V_ROWS_CHANGED,
+    'rows_unchanged', :V_ROWS_UNCHANGED,
+    'rows_deleted', :V_ROWS_REMOVED,
+    'snapshot', :V_SNAP
   );
 end;
 $$;
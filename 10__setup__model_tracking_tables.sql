@@ -25,7 +25,7 @@ create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_RUNS (
   train_anchor_max_seq number,
   max_horizon          number,               -- typically 12
 
-  params               variant,              -- hyperparams / model config
+  params               variant,              -- hyperparams / model config (+ candidate, eps)
   training_env         variant,              -- {runner: "snowflake"|"local", python, package versions, etc.}
   code_ref             variant,              -- {notebook: "...", git_commit: "...", script: "..."} (optional)
 
@@ -40,27 +40,33 @@ create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_RUNS (
 
 create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_METRICS (
   model_run_id         string,
-  metric_scope         string,               -- OVERALL | BY_HORIZON
+  metric_scope         string,               -- OVERALL | BY_HORIZON | BY_ANCHOR | PC_REASON
   metric_name          string,               -- WAPE | SMAPE | RMSE | MAE (etc.)
-  horizon              number,               -- null for OVERALL
+  horizon              number,               -- null unless BY_HORIZON
+  anchor_month_seq     number,               -- null unless BY_ANCHOR
+  roll_up_shop         string,               -- null unless PC_REASON
+  reason_group         string,               -- null unless PC_REASON
   value                float,
 
   computed_at          timestamp_ntz,
   details              variant               -- optional: denominators, counts, filters
 );
 
+-- Compact prediction store: one narrow typed row per (model_run, series, anchor, horizon).
+-- Run-level metadata (candidate, eps, baseline kind, ...) lives in FORECAST_MODEL_RUNS.params;
+-- VW_FORECAST_MODEL_BACKTEST_PREDICTIONS rebuilds the legacy DETAILS column for old queries.
 create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS (
   model_run_id         string,
 
   roll_up_shop         string,
   reason_group         string,
 
-  anchor_fiscal_yyyymm number,
-  anchor_month_seq     number,
-  horizon              number,
+  anchor_fiscal_yyyymm number(6,0),
+  anchor_month_seq     number(6,0),
+  horizon              number(3,0),
 
-  target_fiscal_yyyymm number,
-  target_month_seq     number,
+  target_fiscal_yyyymm number(6,0),
+  target_month_seq     number(6,0),
 
   y_true               number(18,2),
   y_pred               number(18,2),
@@ -69,8 +75,32 @@ create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTI
   y_pred_hi            number(18,2),
 
   created_at           timestamp_ntz,
-  details              variant               -- optional: features used, residuals, etc.
-);
+
+  series_id            number               -- FORECAST_SERIES_REGISTRY (last: added after the table existed)
+)
+cluster by (model_run_id, anchor_month_seq);
+
+-- Legacy shape (with DETAILS variant) for existing queries
+create or replace view DB_BI_P_SANDBOX.SANDBOX.VW_FORECAST_MODEL_BACKTEST_PREDICTIONS as
+select
+  p.model_run_id,
+  p.roll_up_shop,
+  p.reason_group,
+  p.series_id,
+  p.anchor_fiscal_yyyymm,
+  p.anchor_month_seq,
+  p.horizon,
+  p.target_fiscal_yyyymm,
+  p.target_month_seq,
+  p.y_true,
+  p.y_pred,
+  p.y_pred_lo,
+  p.y_pred_hi,
+  p.created_at,
+  object_insert(coalesce(r.params, object_construct()), 'eval_anchor', p.anchor_month_seq, true) as details
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS p
+left join DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_RUNS r
+  on r.model_run_id = p.model_run_id;
 
 create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_CHAMPIONS (
   asof_fiscal_yyyymm    number,
@@ -15,6 +15,7 @@ create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH (
   
   roll_up_shop         string,
   reason_group         string,
+  series_id            number,              -- FORECAST_SERIES_REGISTRY
   
   target_fiscal_yyyymm number,
   target_fiscal_year   number,
@@ -46,7 +47,9 @@ create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_M
   
   roll_up_shop         string,
   reason_group         string,
+  series_id            number,              -- FORECAST_SERIES_REGISTRY
   cust_grp             string,
+  cust_grp_id          number,              -- FORECAST_CUST_GRP_REGISTRY
   
   target_fiscal_yyyymm number,
   target_fiscal_year   number,
@@ -91,7 +94,17 @@ declare
   V_ANCHOR_SEQ number;
   V_ROWS_FORECAST number;
   V_ROWS_CUST_FORECAST number;
+
+  V_STARTED_AT timestamp_ltz;
+  V_STEP2_STARTED_AT timestamp_ltz;
+  V_STEP2_ENDED_AT timestamp_ltz;
+  V_TRACK variant;
+  V_REVISION variant;
+
+  -- Tracking / revision marts do not invalidate the publish: a failure is a warning
+  V_WARNINGS array default array_construct();
 begin
+  V_STARTED_AT := current_timestamp();
 
   -- Resolve as-of fiscal month
   if (P_ASOF_FISCAL_YYYYMM is null) then
@@ -137,14 +150,20 @@ begin
     where asof_fiscal_yyyymm = :V_ASOF_YYYYMM
   ),
   
-  -- Get eligible PC x Reason combinations
+  -- Get eligible PC x Reason combinations: registry ids of the series that have actuals
+  -- (the registry keeps every series ever seen in the aggregate, so it is not the grid)
   eligible_series as (
-    select distinct
+    select
+      r.series_id,
       e.roll_up_shop,
-      coalesce(a.reason_group, 'TOTAL') as reason_group
+      coalesce(r.reason_group, 'TOTAL') as reason_group
     from DB_BI_P_SANDBOX.SANDBOX.FORECAST_PC_ELIGIBILITY e
-    left join DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH a
-      on a.roll_up_shop = e.roll_up_shop
+    left join (
+      select series_id, roll_up_shop, reason_group
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY
+      where series_id in (select series_id from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH)
+    ) r
+      on r.roll_up_shop = e.roll_up_shop
     where e.run_id = :P_RUN_ID
       and e.is_eligible = true
   ),
@@ -158,6 +177,7 @@ begin
   -- Cross join to create all combinations to score
   score_grid as (
     select
+      e.series_id,
       e.roll_up_shop,
       e.reason_group,
       h.horizon + 1 as horizon,  -- horizon 1..12
@@ -216,8 +236,7 @@ begin
   -- Pre-compute lag-12 actuals for baseline fallback
   lag12_actuals as (
     select
-      roll_up_shop,
-      reason_group,
+      series_id,
       month_seq,
       total_revenue
     from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH
@@ -226,8 +245,7 @@ begin
   -- Get anchor actuals (latest closed month) for scaling
   anchor_actuals as (
     select
-      roll_up_shop,
-      reason_group,
+      series_id,
       total_revenue as anchor_revenue
     from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH
     where month_seq = :V_ANCHOR_SEQ
@@ -238,31 +256,30 @@ begin
   backtest_recent as (
     select
       model_run_id,
-      roll_up_shop,
-      reason_group,
+      series_id,
       horizon,
       avg(y_pred) as avg_pred_recent,
       avg(y_true) as avg_true_recent
     from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS
     where anchor_month_seq >= (:V_ANCHOR_SEQ - 6)
-    group by 1, 2, 3, 4
+    group by 1, 2, 3
   ),
   
   -- All backtests (fallback)
   backtest_all as (
     select
       model_run_id,
-      roll_up_shop,
-      reason_group,
+      series_id,
       horizon,
       avg(y_pred) as avg_pred_all
     from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS
-    group by 1, 2, 3, 4
+    group by 1, 2, 3
   ),
   
   -- Generate predictions using backtest patterns
   model_predictions as (
     select
+      sg.series_id,
       sg.roll_up_shop,
       sg.reason_group,
       sg.target_fiscal_yyyymm,
@@ -296,21 +313,17 @@ begin
     from score_grid_with_model sg
     join models m on m.model_run_id = sg.model_run_id
     left join lag12_actuals lag12
-      on lag12.roll_up_shop = sg.roll_up_shop
-     and lag12.reason_group = sg.reason_group
+      on lag12.series_id = sg.series_id
      and lag12.month_seq = sg.target_month_seq - 12
     left join anchor_actuals aa
-      on aa.roll_up_shop = sg.roll_up_shop
-     and aa.reason_group = sg.reason_group
+      on aa.series_id = sg.series_id
     left join backtest_recent br
       on br.model_run_id = sg.model_run_id
-     and br.roll_up_shop = sg.roll_up_shop
-     and br.reason_group = sg.reason_group
+     and br.series_id = sg.series_id
      and br.horizon = sg.horizon
     left join backtest_all ba
       on ba.model_run_id = sg.model_run_id
-     and ba.roll_up_shop = sg.roll_up_shop
-     and ba.reason_group = sg.reason_group
+     and ba.series_id = sg.series_id
      and ba.horizon = sg.horizon
   ),
   
@@ -325,17 +338,15 @@ begin
     left join (
       select
         model_run_id,
-        roll_up_shop,
-        reason_group,
+        series_id,
         horizon,
         percentile_cont(0.1) within group (order by abs(y_true - y_pred)) as error_10pct,
         percentile_cont(0.9) within group (order by abs(y_true - y_pred)) as error_90pct
       from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS
-      group by 1, 2, 3, 4
+      group by 1, 2, 3
     ) res
       on res.model_run_id = mp.model_run_id
-     and res.roll_up_shop = mp.roll_up_shop
-     and res.reason_group = mp.reason_group
+     and res.series_id = mp.series_id
      and res.horizon = mp.horizon
   ),
   
@@ -343,6 +354,7 @@ begin
     select
       sg.roll_up_shop,
       sg.reason_group,
+      sg.series_id,
       sg.target_fiscal_yyyymm,
       sg.target_fiscal_year,
       sg.target_fiscal_month,
@@ -359,7 +371,8 @@ begin
       
     from score_grid_with_target sg
     join prediction_intervals pi
-      on pi.roll_up_shop = sg.roll_up_shop
+      on equal_null(pi.series_id, sg.series_id)
+     and pi.roll_up_shop = sg.roll_up_shop
      and pi.reason_group = sg.reason_group
      and pi.target_month_seq = sg.target_month_seq
      and pi.horizon = sg.horizon
@@ -372,6 +385,7 @@ begin
     current_timestamp() as forecast_created_at,
     roll_up_shop,
     reason_group,
+    series_id,
     target_fiscal_yyyymm,
     target_fiscal_year,
     target_fiscal_month,
@@ -399,6 +413,8 @@ begin
   -- STEP 2: Disaggregate to customer level using mix shares
   -- ========================================================================
   
+  V_STEP2_STARTED_AT := current_timestamp();
+
   create or replace temporary table TMP_FORECAST_PC_REASON_CUST as
   with
   forecasts as (
@@ -422,7 +438,9 @@ begin
     f.forecast_created_at,
     f.roll_up_shop,
     f.reason_group,
+    f.series_id,
     cm.cust_grp,
+    cg.cust_grp_id,
     f.target_fiscal_yyyymm,
     f.target_fiscal_year,
     f.target_fiscal_month,
@@ -437,7 +455,9 @@ begin
   from forecasts f
   join cust_mix cm
     on cm.roll_up_shop = f.roll_up_shop
-   and cm.reason_group = f.reason_group;
+   and cm.reason_group = f.reason_group
+  left join DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_GRP_REGISTRY cg
+    on cg.cust_grp = cm.cust_grp;
 
   -- Insert into customer-level output table
   insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH
@@ -445,20 +465,58 @@ begin
 
   select count(*) into :V_ROWS_CUST_FORECAST from TMP_FORECAST_PC_REASON_CUST;
 
+  V_STEP2_ENDED_AT := current_timestamp();
+
+  call DB_BI_P_SANDBOX.SANDBOX.SP_LOG_RUN_STAGES(:P_RUN_ID, :V_STARTED_AT, array_construct(
+    object_construct('stage_name','score_pc_reason',
+                     'started_at', :V_STARTED_AT, 'ended_at', :V_STEP2_STARTED_AT,
+                     'result', object_construct('status','OK','forecast_run_id',:V_FORECAST_RUN_ID,'rows_written',:V_ROWS_FORECAST)),
+    object_construct('stage_name','score_cust_disaggregate',
+                     'started_at', :V_STEP2_STARTED_AT, 'ended_at', :V_STEP2_ENDED_AT,
+                     'result', object_construct('status','OK','forecast_run_id',:V_FORECAST_RUN_ID,'rows_written',:V_ROWS_CUST_FORECAST))
+  ));
+
+
+  -- ========================================================================
+  -- STEP 3: Add the publish to the forecast-vs-actual tracking mart
+  -- ========================================================================
+
+  call DB_BI_P_SANDBOX.SANDBOX.SP_TRACK_PUBLISHED_FORECASTS(:V_FORECAST_RUN_ID);
+  select $1 into :V_TRACK from table(result_scan(last_query_id()));
+
+  if (coalesce(V_TRACK:"status"::string, '') <> 'OK') then
+    V_WARNINGS := array_append(:V_WARNINGS,
+      'Tracking mart failed: ' || coalesce(V_TRACK:"message"::string, ''));
+  end if;
+
+  -- ========================================================================
+  -- STEP 4: Revisions against the previous publish
+  -- ========================================================================
+
+  call DB_BI_P_SANDBOX.SANDBOX.SP_BUILD_FORECAST_REVISIONS(:V_FORECAST_RUN_ID, :P_RUN_ID);
+  select $1 into :V_REVISION from table(result_scan(last_query_id()));
+
+  if (coalesce(V_REVISION:"status"::string, '') <> 'OK') then
+    V_WARNINGS := array_append(:V_WARNINGS,
+      'Revision mart failed: ' || coalesce(V_REVISION:"message"::string, ''));
+  end if;
 
   -- ========================================================================
-  -- RETURN SUCCESS
+  -- RETURN SUCCESS (PARTIAL when a mart step failed)
   -- ========================================================================
   
   return object_construct(
-    'status', 'OK',
+    'status', iff(array_size(:V_WARNINGS) = 0, 'OK', 'PARTIAL'),
     'forecast_run_id', :V_FORECAST_RUN_ID,
     'run_id', :P_RUN_ID,
     'asof_fiscal_yyyymm', :V_ASOF_YYYYMM,
     'anchor_month_seq', :V_ANCHOR_SEQ,
     'max_horizon', :P_MAX_HORIZON,
     'rows_pc_reason_forecast', :V_ROWS_FORECAST,
-    'rows_customer_forecast', :V_ROWS_CUST_FORECAST
+    'rows_customer_forecast', :V_ROWS_CUST_FORECAST,
+    'tracking', :V_TRACK,
+    'revision', :V_REVISION,
+    'warnings', :V_WARNINGS
   );
 
 exception
@@ -0,0 +1,209 @@
+-- 12__proc__compute_backtest_metrics.sql
+--
+-- Backtest metrics for a set of model runs in ONE scan of FORECAST_MODEL_BACKTEST_PREDICTIONS.
+--
+-- Scopes written to FORECAST_MODEL_METRICS (details:"series_agg" = MICRO | MACRO):
+--   OVERALL     per model_run                      MICRO + MACRO
+--   BY_HORIZON  per model_run x horizon            MICRO + MACRO
+--   BY_ANCHOR   per model_run x anchor_month_seq   MICRO
+--   PC_REASON   per model_run x series             MICRO
+--
+-- Formulas (unchanged from the notebook):
+--   MAE      = avg(abs_err)
+--   RMSE     = sqrt(avg(err*err))
+--   WAPE     = sum(abs_err) / nullif(sum(abs_y),0)
+--   MAPE_EPS = avg(iff(abs_y >= eps, abs_err/abs_y, null))
+--   MASE     = avg(abs_err) / nullif(avg(abs_naive_err),0)   -- naive = baseline run, same series/anchor/horizon
+--   BIAS     = sum(y_pred - y_true) / nullif(sum(abs_y),0)
+--   MACRO    = avg of the per-series MICRO values
+--
+-- The baseline rows are read in the same scan; their error is spread to every
+-- model's rows with a window over (series, anchor, horizon) instead of a self-join.
+
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_COMPUTE_BACKTEST_METRICS(
+    P_MODEL_RUN_IDS array,
+    P_BASELINE_MODEL_RUN_ID string default null,
+    P_EVAL_ANCHORS array default null,          -- anchor_month_seq list; null = every anchor present
+    P_MAPE_EPSILON float default 100
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_EVAL_ANCHORS array;
+  V_ROWS_WRITTEN number;
+begin
+  if (P_MODEL_RUN_IDS is null or array_size(P_MODEL_RUN_IDS) = 0) then
+    return object_construct('status','ERROR','message','P_MODEL_RUN_IDS is empty.');
+  end if;
+
+  -- Resolve eval anchors (default = all anchors the runs have predictions for)
+  if (P_EVAL_ANCHORS is null) then
+    select array_agg(distinct anchor_month_seq) within group (order by anchor_month_seq)
+      into :V_EVAL_ANCHORS
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS
+    where model_run_id in (select value::string from table(flatten(input => :P_MODEL_RUN_IDS)));
+  else
+    V_EVAL_ANCHORS := P_EVAL_ANCHORS;
+  end if;
+
+  begin transaction;
+
+  -- Rerunnable: replace prior metrics for these runs
+  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_METRICS
+  where model_run_id in (select value::string from table(flatten(input => :P_MODEL_RUN_IDS)));
+
+  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_METRICS
+  (model_run_id, metric_scope, metric_name, horizon, anchor_month_seq, roll_up_shop, reason_group,
+   value, computed_at, details)
+  with p as (
+    -- single scan: requested runs + baseline run
+    select
+      p.model_run_id,
+      p.roll_up_shop,
+      p.reason_group,
+      p.anchor_month_seq,
+      p.horizon,
+      (p.y_true - p.y_pred)      as err,
+      (p.y_pred - p.y_true)      as err_signed,
+      abs(p.y_true - p.y_pred)   as abs_err,
+      abs(p.y_true)              as abs_y,
+      max(iff(p.model_run_id = :P_BASELINE_MODEL_RUN_ID, abs(p.y_true - p.y_pred), null))
+        over (partition by p.roll_up_shop, p.reason_group, p.anchor_month_seq, p.horizon) as abs_naive_err
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS p
+    where (p.model_run_id in (select value::string from table(flatten(input => :P_MODEL_RUN_IDS)))
+           or p.model_run_id = :P_BASELINE_MODEL_RUN_ID)
+      and p.anchor_month_seq in (select value::number from table(flatten(input => :V_EVAL_ANCHORS)))
+  ),
+  p3 as (
+    select *
+    from p
+    where array_contains(model_run_id::variant, :P_MODEL_RUN_IDS)
+  ),
+  g as (
+    select
+      model_run_id,
+      horizon,
+      anchor_month_seq,
+      roll_up_shop,
+      reason_group,
+      case
+        when grouping(roll_up_shop) = 0 and grouping(horizon) = 0 then 'PC_REASON_BY_HORIZON'
+        when grouping(roll_up_shop) = 0                           then 'PC_REASON'
+        when grouping(horizon) = 0                                then 'BY_HORIZON'
+        when grouping(anchor_month_seq) = 0                       then 'BY_ANCHOR'
+        else 'OVERALL'
+      end as metric_scope,
+      count(*) as n_rows,
+      avg(abs_err) as mae,
+      sqrt(avg(err*err)) as rmse,
+      sum(abs_err) / nullif(sum(abs_y),0) as wape,
+      avg(iff(abs_y >= :P_MAPE_EPSILON, abs_err/abs_y, null)) as mape_eps,
+      avg(abs_err) / nullif(avg(abs_naive_err),0) as mase,
+      sum(err_signed) / nullif(sum(abs_y),0) as bias
+    from p3
+    group by grouping sets (
+      (model_run_id),
+      (model_run_id, horizon),
+      (model_run_id, anchor_month_seq),
+      (model_run_id, roll_up_shop, reason_group),
+      (model_run_id, roll_up_shop, reason_group, horizon)   -- only feeds MACRO BY_HORIZON
+    )
+  ),
+  scored as (
+    -- MICRO
+    select
+      model_run_id, metric_scope, horizon, anchor_month_seq, roll_up_shop, reason_group,
+      'MICRO' as series_agg, n_rows, mae, rmse, wape, mape_eps, mase, bias
+    from g
+    where metric_scope <> 'PC_REASON_BY_HORIZON'
+
+    union all
+
+    -- MACRO (per series, then average)
+    select
+      model_run_id,
+      iff(metric_scope = 'PC_REASON', 'OVERALL', 'BY_HORIZON') as metric_scope,
+      horizon, null, null, null,
+      'MACRO', count(*), avg(mae), avg(rmse), avg(wape), avg(mape_eps), avg(mase), avg(bias)
+    from g
+    where metric_scope in ('PC_REASON', 'PC_REASON_BY_HORIZON')
+    group by model_run_id, metric_scope, horizon
+  ),
+  metric_names as (
+    select column1 as metric_name
+    from values ('MAE'), ('RMSE'), ('WAPE'), ('MAPE_EPS'), ('MASE'), ('BIAS')
+  )
+  select
+    s.model_run_id,
+    s.metric_scope,
+    n.metric_name,
+    s.horizon,
+    s.anchor_month_seq,
+    s.roll_up_shop,
+    s.reason_group,
+    case n.metric_name
+      when 'MAE'      then s.mae
+      when 'RMSE'     then s.rmse
+      when 'WAPE'     then s.wape
+      when 'MAPE_EPS' then s.mape_eps
+      when 'MASE'     then s.mase
+      when 'BIAS'     then s.bias
+    end as value,
+    current_timestamp(),
+    object_construct(
+      'series_agg', s.series_agg,
+      'eval_anchors', :V_EVAL_ANCHORS,
+      'mape_epsilon', :P_MAPE_EPSILON,
+      'baseline_model_run_id', :P_BASELINE_MODEL_RUN_ID,
+      'n', s.n_rows
+    )
+  from scored s
+  cross join metric_names n;
+
+  V_ROWS_WRITTEN := SQLROWCOUNT;
+
+  commit;
+
+  return object_construct(
+    'status','OK',
+    'model_run_ids', :P_MODEL_RUN_IDS,
+    'baseline_model_run_id', :P_BASELINE_MODEL_RUN_ID,
+    'eval_anchors', :V_EVAL_ANCHORS,
+    'mape_epsilon', :P_MAPE_EPSILON,
+    'rows_written', :V_ROWS_WRITTEN
+  );
+
+exception
+  when other then
+    rollback;
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
+end;
+$$;
+
+
+-- ========================================================================
+-- EXAMPLE USAGE
+-- ========================================================================
+
+/*
+-- Metrics for every candidate of a run, MASE vs the seasonal-naive baseline, last 12 anchors
+call DB_BI_P_SANDBOX.SANDBOX.SP_COMPUTE_BACKTEST_METRICS(
+  array_construct('<model_run_id_1>', '<model_run_id_2>', '<seasonal_naive_model_run_id>'),
+  '<seasonal_naive_model_run_id>',
+  array_construct(37, 38, 39, 40, 41, 42, 43, 44, 45, 46, 47, 48),
+  100
+);
+
+-- WAPE by anchor
+select model_run_id, anchor_month_seq, value as wape
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_METRICS
+where metric_scope = 'BY_ANCHOR'
+  and metric_name = 'WAPE'
+order by model_run_id, anchor_month_seq;
+*/
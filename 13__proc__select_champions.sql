@@ -0,0 +1,244 @@
+-- 13__proc__select_champions.sql
+--
+-- Champion selection for one forecast run, set-based, from FORECAST_MODEL_METRICS
+-- (SP_COMPUTE_BACKTEST_METRICS must have run first).
+--
+--   GLOBAL     lowest WAPE / MICRO / OVERALL across the run's model runs
+--   PC_REASON  per series, the lowest-WAPE model run (PC_REASON scope) that
+--                - beats the global champion on that series by >= P_OVERRIDE_MIN_REL_IMPROV
+--                  (wape <= champion_wape * (1 - P_OVERRIDE_MIN_REL_IMPROV))
+--                - stays inside the bias guardrail: abs(bias) <= P_BIAS_MAX_ABS
+--              Series where nothing qualifies fall back to GLOBAL (no row written).
+--
+-- GLOBAL uses the '__ALL__' sentinel for roll_up_shop / reason_group so the primary
+-- key columns are never null. Prior PC_REASON overrides for the as-of month are
+-- replaced, the GLOBAL row is merged, all in one transaction.
+
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_SELECT_CHAMPIONS(
+    P_RUN_ID string,
+    P_OVERRIDE_MIN_REL_IMPROV float default 0.05,
+    P_BIAS_MAX_ABS float default 0.02
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_ASOF_YYYYMM number;
+  V_GLOBAL_MODEL_RUN_ID string;
+  V_GLOBAL_WAPE float;
+  V_SERIES_COUNT number;
+  V_OVERRIDE_COUNT number;
+  V_SELECTED_AT timestamp_ntz;
+begin
+  select asof_fiscal_yyyymm
+    into :V_ASOF_YYYYMM
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUNS
+  where run_id = :P_RUN_ID;
+
+  if (V_ASOF_YYYYMM is null) then
+    return object_construct('status','ERROR','message','Could not resolve as-of fiscal month for run.', 'run_id', :P_RUN_ID);
+  end if;
+
+  V_SELECTED_AT := current_timestamp()::timestamp_ntz;
+
+  -- One pass over the run's metrics: GLOBAL + every PC_REASON override candidate
+  create or replace temporary table TMP_CHAMPION_SELECTION as
+  with m as (
+    select
+      m.model_run_id,
+      r.params:"candidate"::string as candidate,
+      m.metric_scope,
+      m.roll_up_shop,
+      m.reason_group,
+      max(iff(m.metric_name = 'WAPE', m.value, null)) as wape,
+      max(iff(m.metric_name = 'BIAS', m.value, null)) as bias,
+      any_value(m.details:"eval_anchors") as eval_anchors,
+      any_value(m.details:"mape_epsilon") as mape_epsilon
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_METRICS m
+    join DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_RUNS r
+      on r.model_run_id = m.model_run_id
+    where r.run_id = :P_RUN_ID
+      and m.metric_scope in ('OVERALL', 'PC_REASON')
+      and m.metric_name in ('WAPE', 'BIAS')
+      and m.details:"series_agg"::string = 'MICRO'
+    group by 1, 2, 3, 4, 5
+  ),
+  global_champ as (
+    select *
+    from m
+    where metric_scope = 'OVERALL'
+      and wape is not null
+    qualify row_number() over (order by wape, model_run_id) = 1
+  ),
+  series as (
+    select
+      s.*,
+      c.wape as champ_wape,
+      c.bias as champ_bias,
+      c.model_run_id as champ_model_run_id
+    from m s
+    join global_champ g
+      on true
+    join m c
+      on c.metric_scope = 'PC_REASON'
+     and c.model_run_id = g.model_run_id
+     and c.roll_up_shop = s.roll_up_shop
+     and c.reason_group = s.reason_group
+    where s.metric_scope = 'PC_REASON'
+  ),
+  overrides as (
+    select *
+    from series
+    where model_run_id <> champ_model_run_id
+      and wape is not null
+      and champ_wape is not null
+      and wape <= champ_wape * (1 - :P_OVERRIDE_MIN_REL_IMPROV)
+      and abs(bias) <= :P_BIAS_MAX_ABS
+    qualify row_number() over (partition by roll_up_shop, reason_group order by wape, model_run_id) = 1
+  )
+  select
+    'GLOBAL' as champion_scope,
+    '__ALL__' as roll_up_shop,
+    '__ALL__' as reason_group,
+    model_run_id,
+    'WAPE_MICRO_OVERALL' as selection_metric,
+    object_construct(
+      'series_agg', 'MICRO',
+      'metric_scope', 'OVERALL',
+      'metric', 'WAPE',
+      'wape', wape,
+      'bias', bias,
+      'eval_anchors', eval_anchors,
+      'mape_epsilon', mape_epsilon,
+      'run_id', :P_RUN_ID,
+      'candidate', candidate
+    ) as selection_logic
+  from global_champ
+
+  union all
+
+  select
+    'PC_REASON',
+    roll_up_shop,
+    reason_group,
+    model_run_id,
+    'WAPE_MICRO_PC_REASON',
+    object_construct(
+      'series_agg', 'MICRO',
+      'metric_scope', 'PC_REASON',
+      'metric', 'WAPE',
+      'wape', wape,
+      'bias', bias,
+      'global_model_run_id', champ_model_run_id,
+      'global_wape', champ_wape,
+      'global_bias', champ_bias,
+      'rel_improv', 1 - wape / nullif(champ_wape, 0),
+      'override_min_rel_improv', :P_OVERRIDE_MIN_REL_IMPROV,
+      'bias_max_abs', :P_BIAS_MAX_ABS,
+      'eval_anchors', eval_anchors,
+      'mape_epsilon', mape_epsilon,
+      'run_id', :P_RUN_ID,
+      'candidate', candidate
+    )
+  from overrides;
+
+  select
+    max(iff(champion_scope = 'GLOBAL', model_run_id, null)),
+    max(iff(champion_scope = 'GLOBAL', selection_logic:"wape"::float, null)),
+    count_if(champion_scope = 'PC_REASON')
+  into :V_GLOBAL_MODEL_RUN_ID, :V_GLOBAL_WAPE, :V_OVERRIDE_COUNT
+  from TMP_CHAMPION_SELECTION;
+
+  if (V_GLOBAL_MODEL_RUN_ID is null) then
+    return object_construct('status','ERROR','message','No OVERALL WAPE metrics for run; call SP_COMPUTE_BACKTEST_METRICS first.', 'run_id', :P_RUN_ID);
+  end if;
+
+  select count(*)
+    into :V_SERIES_COUNT
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_METRICS
+  where model_run_id = :V_GLOBAL_MODEL_RUN_ID
+    and metric_scope = 'PC_REASON'
+    and metric_name = 'WAPE'
+    and details:"series_agg"::string = 'MICRO';
+
+  begin transaction;
+
+  -- Overrides from an earlier selection that no longer qualify must not survive
+  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_CHAMPIONS
+  where asof_fiscal_yyyymm = :V_ASOF_YYYYMM
+    and champion_scope = 'PC_REASON';
+
+  merge into DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_CHAMPIONS t
+  using (
+    select
+      :V_ASOF_YYYYMM::number as asof_fiscal_yyyymm,
+      champion_scope,
+      roll_up_shop,
+      reason_group,
+      model_run_id,
+      selection_metric,
+      selection_logic,
+      :V_SELECTED_AT as selected_at,
+      current_user() as selected_by
+    from TMP_CHAMPION_SELECTION
+  ) s
+  on  t.asof_fiscal_yyyymm = s.asof_fiscal_yyyymm
+  and t.champion_scope     = s.champion_scope
+  and t.roll_up_shop       = s.roll_up_shop
+  and t.reason_group       = s.reason_group
+  when matched then update set
+    model_run_id      = s.model_run_id,
+    selection_metric  = s.selection_metric,
+    selection_logic   = s.selection_logic,
+    selected_at       = s.selected_at,
+    selected_by       = s.selected_by
+  when not matched then insert (
+    asof_fiscal_yyyymm, champion_scope, roll_up_shop, reason_group,
+    model_run_id, selection_metric, selection_logic, selected_at, selected_by
+  ) values (
+    s.asof_fiscal_yyyymm, s.champion_scope, s.roll_up_shop, s.reason_group,
+    s.model_run_id, s.selection_metric, s.selection_logic, s.selected_at, s.selected_by
+  );
+
+  commit;
+
+  return object_construct(
+    'status','OK',
+    'run_id', :P_RUN_ID,
+    'asof_fiscal_yyyymm', :V_ASOF_YYYYMM,
+    'global_model_run_id', :V_GLOBAL_MODEL_RUN_ID,
+    'global_wape', :V_GLOBAL_WAPE,
+    'series_evaluated', :V_SERIES_COUNT,
+    'override_count', :V_OVERRIDE_COUNT,
+    'override_min_rel_improv', :P_OVERRIDE_MIN_REL_IMPROV,
+    'bias_max_abs', :P_BIAS_MAX_ABS
+  );
+
+exception
+  when other then
+    rollback;
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
+end;
+$$;
+
+
+-- ========================================================================
+-- EXAMPLE USAGE
+-- ========================================================================
+
+/*
+call DB_BI_P_SANDBOX.SANDBOX.SP_SELECT_CHAMPIONS('<run_id>', 0.05, 0.02);
+
+-- Overrides by candidate
+select selection_logic:"candidate"::string as candidate, count(*) as n_series
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_CHAMPIONS
+where asof_fiscal_yyyymm = <asof_fiscal_yyyymm>
+  and champion_scope = 'PC_REASON'
+group by 1
+order by 2 desc;
+*/
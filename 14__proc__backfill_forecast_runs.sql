@@ -0,0 +1,292 @@
+-- 14__proc__backfill_forecast_runs.sql
+--
+-- Backfill mode: one FORECAST_RUNS row per historic as-of month in
+-- [P_FROM_ASOF_FISCAL_YYYYMM, P_TO_ASOF_FISCAL_YYYYMM], without rebuilding the
+-- shared history once per month.
+--
+--   1) Actuals + budget are aggregated ONCE for the whole span
+--      (earliest as-of - P_HISTORY_MONTHS + 1 .. latest as-of)
+--   2) Per as-of: eligibility, then the actuals / budget snapshots are carved out
+--      of the shared history by a month_seq filter, then the model dataset is built
+--   3) Each as-of gets its own run_id (run_type = P_RUN_TYPE); a failing month is
+--      marked FAILED and the loop continues
+--
+-- CURRENT tables (FORECAST_ACTUALS_PC_REASON_MTH etc.) are not touched, and the
+-- customer mix is skipped: neither is read by the model dataset or the backtests.
+--
+-- Backtests for the returned run_ids run concurrently from Python:
+--   revenue_forecast/backfill.py -> run_backfill_backtests()
+
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_BACKFILL_FORECAST_RUNS(
+    P_FROM_ASOF_FISCAL_YYYYMM number,
+    P_TO_ASOF_FISCAL_YYYYMM number,
+    P_RUN_TYPE string default 'BACKFILL',
+    P_HISTORY_MONTHS number default 72,
+    P_MAX_HORIZON number default 12
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_BACKFILL_ID string;
+  V_SRC string;
+
+  V_LATEST_ASOF_SEQ number;
+  V_FROM_SEQ number;
+  V_TO_SEQ number;
+  V_START_SEQ number;
+
+  V_RUN_ID string;
+  V_ASOF_YYYYMM number;
+  V_ASOF_SEQ number;
+  V_ASOF_END date;
+  V_WINDOW_START_SEQ number;
+
+  V_AGG  variant;
+  V_ELIG variant;
+  V_SNAP variant;
+  V_DS   variant;
+  V_ERR  string;
+
+  E_SNAPSHOT    exception (-20001, 'Snapshot write failed.');
+  E_ELIGIBILITY exception (-20002, 'Eligibility failed.');
+  E_DATASET     exception (-20003, 'Model dataset build failed.');
+
+  V_RUNS array default array_construct();
+  V_FAILED number default 0;
+begin
+  V_SRC := 'DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH';
+
+  select month_seq into :V_LATEST_ASOF_SEQ
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ASOF_FISCAL_MONTH;
+
+  select min(month_seq), max(month_seq)
+    into :V_FROM_SEQ, :V_TO_SEQ
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_FISCAL_MONTH_DIM
+  where fiscal_yyyymm between :P_FROM_ASOF_FISCAL_YYYYMM and :P_TO_ASOF_FISCAL_YYYYMM;
+
+  if (V_FROM_SEQ is null) then
+    return object_construct('status','ERROR','message','No fiscal months in the requested as-of range.');
+  end if;
+
+  if (V_TO_SEQ > V_LATEST_ASOF_SEQ) then
+    return object_construct('status','ERROR','message','Backfill range extends past the latest closed fiscal month.');
+  end if;
+
+  select uuid_string() into :V_BACKFILL_ID;
+
+  V_START_SEQ := greatest(1, V_FROM_SEQ - (P_HISTORY_MONTHS - 1));
+
+  -- ========================================================================
+  -- STEP 1: Shared history, built once for the whole span
+  -- ========================================================================
+
+  call DB_BI_P_SANDBOX.SANDBOX.SP_REFRESH_REVENUE_AGG_MTH();
+  select $1 into :V_AGG from table(result_scan(last_query_id()));
+
+  if (V_AGG:"status"::string <> 'OK') then
+    return object_construct('status','ERROR','backfill_id',:V_BACKFILL_ID,
+      'message','Revenue aggregate refresh failed: ' || coalesce(V_AGG:"message"::string, ''));
+  end if;
+
+  create or replace temporary table TMP_BACKFILL_ACT_PC_REASON as
+  with base as (
+    select
+      a.fiscal_yyyymm,
+      a.roll_up_shop,
+      a.reason_group,
+      sum(a.total_revenue) as total_revenue
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH a
+    group by 1,2,3
+  )
+  select
+    d.fiscal_yyyymm, d.fiscal_year, d.fiscal_month, d.month_seq, d.month_start_date, d.month_end_date,
+    b.roll_up_shop, b.reason_group, b.total_revenue,
+    :V_SRC as source_object,
+    md5(
+      coalesce(d.fiscal_yyyymm::string,'') || '|' ||
+      coalesce(b.roll_up_shop,'') || '|' ||
+      coalesce(b.reason_group,'') || '|' ||
+      coalesce(b.total_revenue::string,'')
+    ) as row_hash
+  from base b
+  join DB_BI_P_SANDBOX.SANDBOX.FORECAST_FISCAL_MONTH_DIM d
+    on d.fiscal_yyyymm = b.fiscal_yyyymm
+  where d.month_seq between :V_START_SEQ and :V_TO_SEQ;
+
+  create or replace temporary table TMP_BACKFILL_BUD_PC_REASON as
+  with base as (
+    select
+      a.fiscal_yyyymm,
+      a.roll_up_shop,
+      coalesce(a.reason_group, 'UNKNOWN') as reason_group,
+      sum(a.total_budget) as total_budget
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH a
+    group by 1,2,3
+  )
+  select
+    d.fiscal_yyyymm, d.fiscal_year, d.fiscal_month, d.month_seq, d.month_start_date, d.month_end_date,
+    b.roll_up_shop, b.reason_group, b.total_budget,
+    :V_SRC as source_object,
+    md5(
+      coalesce(d.fiscal_yyyymm::string,'') || '|' ||
+      coalesce(b.roll_up_shop,'') || '|' ||
+      coalesce(b.reason_group,'') || '|' ||
+      coalesce(b.total_budget::string,'')
+    ) as row_hash
+  from base b
+  join DB_BI_P_SANDBOX.SANDBOX.FORECAST_FISCAL_MONTH_DIM d
+    on d.fiscal_yyyymm = b.fiscal_yyyymm
+  where d.month_seq between :V_START_SEQ and :V_TO_SEQ;
+
+  -- ========================================================================
+  -- STEP 2: Per as-of month: eligibility -> filtered snapshots -> dataset
+  -- ========================================================================
+
+  let asofs resultset := (
+    select fiscal_yyyymm, month_seq, month_end_date
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_FISCAL_MONTH_DIM
+    where month_seq between :V_FROM_SEQ and :V_TO_SEQ
+    order by month_seq
+  );
+  let c_asof cursor for asofs;
+
+  for a in c_asof do
+    V_ASOF_YYYYMM := a.fiscal_yyyymm;
+    V_ASOF_SEQ := a.month_seq;
+    V_ASOF_END := a.month_end_date;
+    V_WINDOW_START_SEQ := greatest(1, V_ASOF_SEQ - (P_HISTORY_MONTHS - 1));
+
+    select uuid_string() into :V_RUN_ID;
+
+    insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUNS
+    (run_id, run_type, triggered_by, triggered_at, asof_fiscal_yyyymm, asof_month_end, status, status_message, config_snapshot, updated_at)
+    select
+      :V_RUN_ID,
+      :P_RUN_TYPE,
+      current_user(),
+      current_timestamp(),
+      :V_ASOF_YYYYMM,
+      :V_ASOF_END,
+      'STARTED',
+      null,
+      to_variant(object_construct('note','backfill run started','backfill_id',:V_BACKFILL_ID)),
+      current_timestamp();
+
+    begin
+      call DB_BI_P_SANDBOX.SANDBOX.SP_EVALUATE_PC_ELIGIBILITY(:V_RUN_ID, :V_ASOF_YYYYMM);
+      select $1 into :V_ELIG from table(result_scan(last_query_id()));
+      if (V_ELIG:"status"::string <> 'OK') then
+        raise E_ELIGIBILITY;
+      end if;
+
+      -- Snapshots store only the month-over-month delta (see 18__proc__write_pc_reason_mth_snapshot.sql)
+      create or replace temporary table TMP_BACKFILL_ACT_SNAP as
+      select
+        fiscal_yyyymm, fiscal_year, fiscal_month, month_seq, month_start_date, month_end_date,
+        roll_up_shop, reason_group, total_revenue as value,
+        source_object, row_hash
+      from TMP_BACKFILL_ACT_PC_REASON
+      where month_seq between :V_WINDOW_START_SEQ and :V_ASOF_SEQ;
+
+      call DB_BI_P_SANDBOX.SANDBOX.SP_WRITE_PC_REASON_MTH_SNAPSHOT('ACTUALS_PC_REASON_MTH', :V_RUN_ID, :V_ASOF_YYYYMM, 'TMP_BACKFILL_ACT_SNAP', :V_WINDOW_START_SEQ, :V_ASOF_SEQ);
+      select $1 into :V_SNAP from table(result_scan(last_query_id()));
+      if (V_SNAP:"status"::string <> 'OK') then
+        raise E_SNAPSHOT;
+      end if;
+
+      create or replace temporary table TMP_BACKFILL_BUD_SNAP as
+      select
+        fiscal_yyyymm, fiscal_year, fiscal_month, month_seq, month_start_date, month_end_date,
+        roll_up_shop, reason_group, total_budget as value,
+        source_object, row_hash
+      from TMP_BACKFILL_BUD_PC_REASON
+      where month_seq between :V_WINDOW_START_SEQ and :V_ASOF_SEQ;
+
+      call DB_BI_P_SANDBOX.SANDBOX.SP_WRITE_PC_REASON_MTH_SNAPSHOT('BUDGET_PC_REASON_MTH', :V_RUN_ID, :V_ASOF_YYYYMM, 'TMP_BACKFILL_BUD_SNAP', :V_WINDOW_START_SEQ, :V_ASOF_SEQ);
+      select $1 into :V_SNAP from table(result_scan(last_query_id()));
+      if (V_SNAP:"status"::string <> 'OK') then
+        raise E_SNAPSHOT;
+      end if;
+
+      call DB_BI_P_SANDBOX.SANDBOX.SP_BUILD_MODEL_DATASET_PC_REASON_H(:V_RUN_ID, :V_ASOF_YYYYMM, :P_MAX_HORIZON);
+      select $1 into :V_DS from table(result_scan(last_query_id()));
+      if (V_DS:"status"::string <> 'OK') then
+        raise E_DATASET;
+      end if;
+
+      update DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUNS
+      set status = 'SUCCEEDED',
+          status_message = 'Backfill: Eligibility + Actuals + Budget + ModelDataset built',
+          config_snapshot = to_variant(object_construct(
+            'backfill_id', :V_BACKFILL_ID,
+            'eligibility', :V_ELIG,
+            'model_dataset_pc_reason_h', :V_DS
+          )),
+          updated_at = current_timestamp()
+      where run_id = :V_RUN_ID;
+
+      V_RUNS := array_append(:V_RUNS, object_construct(
+        'asof_fiscal_yyyymm', :V_ASOF_YYYYMM, 'run_id', :V_RUN_ID, 'status', 'SUCCEEDED'));
+
+    exception
+      when other then
+        V_ERR := case SQLCODE
+                   when -20001 then SQLERRM || ' ' || coalesce(V_SNAP:"message"::string, '')
+                   when -20002 then SQLERRM || ' ' || coalesce(V_ELIG:"message"::string, '')
+                   when -20003 then SQLERRM || ' ' || coalesce(V_DS:"message"::string, '')
+                   else SQLERRM
+                 end;
+        V_FAILED := V_FAILED + 1;
+
+        update DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUNS
+        set status = 'FAILED',
+            status_message = :V_ERR,
+            updated_at = current_timestamp()
+        where run_id = :V_RUN_ID;
+
+        V_RUNS := array_append(:V_RUNS, object_construct(
+          'asof_fiscal_yyyymm', :V_ASOF_YYYYMM, 'run_id', :V_RUN_ID, 'status', 'FAILED', 'error', :V_ERR));
+    end;
+  end for;
+
+  return object_construct(
+    'status', iff(:V_FAILED = 0, 'OK', 'PARTIAL'),
+    'backfill_id', :V_BACKFILL_ID,
+    'run_type', :P_RUN_TYPE,
+    'month_seq_start', :V_START_SEQ,
+    'month_seq_end', :V_TO_SEQ,
+    'revenue_agg_mth', :V_AGG,
+    'history_rows_actuals', (select count(*) from TMP_BACKFILL_ACT_PC_REASON),
+    'history_rows_budget', (select count(*) from TMP_BACKFILL_BUD_PC_REASON),
+    'failed_count', :V_FAILED,
+    'runs', :V_RUNS
+  );
+
+exception
+  when other then
+    return object_construct('status','FAILED','backfill_id',:V_BACKFILL_ID,'error',SQLERRM,'runs',:V_RUNS);
+end;
+$$;
+
+
+-- ========================================================================
+-- EXAMPLE USAGE
+-- ========================================================================
+
+/*
+-- A year of simulated monthly runs
+call DB_BI_P_SANDBOX.SANDBOX.SP_BACKFILL_FORECAST_RUNS(202401, 202412);
+
+select r.value:"asof_fiscal_yyyymm"::number as asof, r.value:"run_id"::string as run_id, r.value:"status"::string as status
+from table(result_scan(last_query_id())) q,
+     lateral flatten(input => q.$1:"runs") r
+order by asof;
+
+-- Backtests for those runs, concurrently (Python):
+--   from revenue_forecast.backfill import start_backfill, run_backfill_backtests
+--   runs = start_backfill(session, 202401, 202412)
+--   run_backfill_backtests(session, runs, ["GBR_OHE"], max_workers=4)
+*/
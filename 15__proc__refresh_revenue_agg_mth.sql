@@ -0,0 +1,163 @@
+-- 15__proc__refresh_revenue_agg_mth.sql
+--
+-- Shared month x PC x reason x cust_grp aggregate of RNA_RCT_TMT_CCCI_PL_RO_REVENUE_5YEARS.
+--
+-- SP_EVALUATE_PC_ELIGIBILITY, SP_BUILD_ACTUALS_PC_REASON_MTH, SP_BUILD_CUST_MIX_PC_REASON,
+-- SP_BUILD_BUDGET_PC_REASON_MTH and SP_BACKFILL_FORECAST_RUNS read this table instead of the
+-- raw source, so their cost no longer grows with five years of transaction detail.
+--
+-- Maintained incrementally: a hash_agg fingerprint per fiscal month is compared with the
+-- fingerprint stored at the last refresh, and only months whose source rows changed (or
+-- that appeared / disappeared) are re-aggregated. The source is a view, so a stream is not
+-- an option; the fingerprint pass reads only the columns the aggregate uses.
+--
+-- Keys are stored as the source delivers them (reason_group / cust_grp may be null);
+-- readers apply their own coalesce(..., 'UNKNOWN') exactly as before.
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH (
+  fiscal_yyyymm        number(6,0),
+
+  roll_up_shop         string,
+  reason_group         string,
+  cust_grp             string,
+
+  total_revenue        number(38,6),        -- sum(revenue)
+  abs_revenue          number(38,6),        -- sum(abs(revenue)) at source-row grain (cust mix)
+  total_budget         number(38,6),        -- sum(budget)
+  source_rows          number,
+
+  loaded_at            timestamp_ntz
+)
+cluster by (fiscal_yyyymm);
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH_FINGERPRINT (
+  fiscal_yyyymm        number(6,0),
+  fingerprint          number,              -- hash_agg over the month's source rows
+  source_rows          number,
+  refreshed_at         timestamp_ntz,
+
+  primary key (fiscal_yyyymm)
+);
+
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_REFRESH_REVENUE_AGG_MTH(
+    P_FULL_REFRESH boolean default false
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_MONTHS_TOTAL number;
+  V_MONTHS_CHANGED number;
+  V_ROWS_INSERTED number;
+begin
+  -- 1) Fingerprint every source month (hash only, no grouping by PC / reason)
+  create or replace temporary table TMP_REVENUE_SRC_FP as
+  select
+    (try_to_number(v."Year")*100 + try_to_number(v."Period")) as fiscal_yyyymm,
+    hash_agg(v.roll_up_shop, v."Reason Code Group", v.CUST_GRP, v.revenue, v.budget) as fingerprint,
+    count(*) as source_rows
+  from DB_BI_P_SANDBOX.SANDBOX.RNA_RCT_TMT_CCCI_PL_RO_REVENUE_5YEARS v
+  group by 1
+  having fiscal_yyyymm is not null;    -- unparsable Year/Period never joins the fiscal month dim
+
+  -- 2) Months to rebuild: new, changed or gone from the source
+  create or replace temporary table TMP_REVENUE_CHANGED_MONTHS as
+  select coalesce(s.fiscal_yyyymm, f.fiscal_yyyymm) as fiscal_yyyymm,
+         s.fingerprint,
+         s.source_rows
+  from TMP_REVENUE_SRC_FP s
+  full outer join DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH_FINGERPRINT f
+    on f.fiscal_yyyymm = s.fiscal_yyyymm
+  where :P_FULL_REFRESH
+     or s.fiscal_yyyymm is null
+     or f.fiscal_yyyymm is null
+     or s.fingerprint <> f.fingerprint
+     or s.source_rows <> f.source_rows;
+
+  select count(*) into :V_MONTHS_TOTAL from TMP_REVENUE_SRC_FP;
+  select count(*) into :V_MONTHS_CHANGED from TMP_REVENUE_CHANGED_MONTHS;
+
+  if (V_MONTHS_CHANGED = 0) then
+    return object_construct(
+      'status','OK',
+      'months_total', :V_MONTHS_TOTAL,
+      'months_changed', 0,
+      'rows_inserted', 0
+    );
+  end if;
+
+  begin transaction;
+
+  -- 3) Replace the changed months
+  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH
+  where fiscal_yyyymm in (select fiscal_yyyymm from TMP_REVENUE_CHANGED_MONTHS);
+
+  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH
+  (fiscal_yyyymm, roll_up_shop, reason_group, cust_grp,
+   total_revenue, abs_revenue, total_budget, source_rows, loaded_at)
+  select
+    (try_to_number(v."Year")*100 + try_to_number(v."Period")) as fiscal_yyyymm,
+    v.roll_up_shop::string,
+    v."Reason Code Group"::string,
+    v.CUST_GRP::string,
+    sum(coalesce(v.revenue,0)),
+    sum(abs(coalesce(v.revenue,0))),
+    sum(coalesce(v.budget,0)),
+    count(*),
+    current_timestamp()
+  from DB_BI_P_SANDBOX.SANDBOX.RNA_RCT_TMT_CCCI_PL_RO_REVENUE_5YEARS v
+  where (try_to_number(v."Year")*100 + try_to_number(v."Period"))
+        in (select fiscal_yyyymm from TMP_REVENUE_CHANGED_MONTHS where fingerprint is not null)
+  group by 1,2,3,4;
+
+  V_ROWS_INSERTED := SQLROWCOUNT;
+
+  -- 4) Record the fingerprints the aggregate now reflects
+  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH_FINGERPRINT
+  where fiscal_yyyymm in (select fiscal_yyyymm from TMP_REVENUE_CHANGED_MONTHS);
+
+  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH_FINGERPRINT
+  (fiscal_yyyymm, fingerprint, source_rows, refreshed_at)
+  select fiscal_yyyymm, fingerprint, source_rows, current_timestamp()
+  from TMP_REVENUE_CHANGED_MONTHS
+  where fingerprint is not null;
+
+  commit;
+
+  return object_construct(
+    'status','OK',
+    'months_total', :V_MONTHS_TOTAL,
+    'months_changed', :V_MONTHS_CHANGED,
+    'changed_fiscal_yyyymm', (select array_agg(fiscal_yyyymm) within group (order by fiscal_yyyymm) from TMP_REVENUE_CHANGED_MONTHS),
+    'rows_inserted', :V_ROWS_INSERTED
+  );
+
+exception
+  when other then
+    rollback;
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
+end;
+$$;
+
+
+-- ========================================================================
+-- EXAMPLE USAGE
+-- ========================================================================
+
+/*
+-- First load (or after a source restatement)
+call DB_BI_P_SANDBOX.SANDBOX.SP_REFRESH_REVENUE_AGG_MTH(true);
+
+-- Monthly: only changed months are rebuilt (SP_START_FORECAST_RUN calls this first)
+call DB_BI_P_SANDBOX.SANDBOX.SP_REFRESH_REVENUE_AGG_MTH();
+
+-- Reconcile against the raw source
+select
+  (select sum(revenue) from DB_BI_P_SANDBOX.SANDBOX.RNA_RCT_TMT_CCCI_PL_RO_REVENUE_5YEARS) as src_revenue,
+  (select sum(total_revenue) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH) as agg_revenue;
+*/
@@ -6,10 +6,12 @@ Analyzes which features drive prediction errors to guide targeted improvements
 from snowflake.snowpark import Session
 import pandas as pd
 import numpy as np
+import pyarrow.compute as pac
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.inspection import permutation_importance
 from sklearn.model_selection import train_test_split
 import warnings
+from revenue_forecast.loader import load_dataset
 warnings.filterwarnings('ignore')
 
 # Snowflake connection
@@ -72,6 +74,10 @@ if row_count > 10_000_000:
 
 print("[OK] Row count within limits, proceeding...")
 
+# Results stream in Arrow batches under a memory budget (spilling to disk past it);
+# the analysis reads one series at a time from the memory-mapped table
+MEMORY_BUDGET_MB = 1024
+
 # Get predictions and training features
 print("\n=== Extracting predictions and training features ===")
 data_sql = f"""
@@ -157,8 +163,9 @@ ORDER BY p.roll_up_shop, p.reason_group, p.anchor_fiscal_yyyymm
 """
 
 print("Running query...")
-df = session.sql(data_sql).to_pandas()
-print(f"[OK] Retrieved {len(df)} rows")
+data = load_dataset(session.sql(data_sql), memory_budget_mb=MEMORY_BUDGET_MB)
+print(f"[OK] Retrieved {data.num_rows} rows"
+      + (f" (spilled {data.nbytes / 1e6:,.0f} MB to disk)" if data.spilled else ""))
 
 # Get customer group metadata for final output
 metadata_sql = """
@@ -186,29 +193,27 @@ feature_cols = [
     'BUDGET_ANCHOR', 'BUDGET_LAG_12', 'BUDGET_TARGET'
 ]
 
-# Compute recent trend (slope over last 6 months) for each series
-print("\n=== Computing recent trend features ===")
-df['RECENT_TREND'] = 0.0
-for (pc, reason) in target_series:
-    mask = (df['ROLL_UP_SHOP'] == pc) & (df['REASON_GROUP'] == reason)
-    series_df = df[mask].sort_values('ANCHOR_FISCAL_YYYYMM')
-    
-    # Calculate slope using last 6 lags
-    if len(series_df) >= 6:
-        for idx in series_df.index[5:]:
-            recent_vals = series_df.loc[series_df['ANCHOR_FISCAL_YYYYMM'] <= 
-                                        series_df.loc[idx, 'ANCHOR_FISCAL_YYYYMM']].tail(6)
-            if len(recent_vals) == 6:
-                x = np.arange(6)
-                y = recent_vals['Y_TRUE'].values
-                if not np.isnan(y).any():
-                    slope = np.polyfit(x, y, 1)[0]
-                    df.loc[idx, 'RECENT_TREND'] = slope
-
 feature_cols.append('RECENT_TREND')
 
-# Fill NaN with 0 for modeling
-df[feature_cols] = df[feature_cols].fillna(0)
+
+def load_series(pc, reason):
+    """One series' rows from the loaded dataset, with RECENT_TREND and NaN-filled features."""
+    table = data.to_table()
+    keep = pac.and_(pac.equal(table['ROLL_UP_SHOP'], pc), pac.equal(table['REASON_GROUP'], reason))
+    series_df = (table.filter(keep).to_pandas()
+                 .sort_values('ANCHOR_FISCAL_YYYYMM').reset_index(drop=True))
+
+    # Recent trend: slope over the last 6 months
+    series_df['RECENT_TREND'] = 0.0
+    for idx in series_df.index[5:]:
+        y = series_df.loc[idx - 5:idx, 'Y_TRUE'].values
+        if not np.isnan(y).any():
+            series_df.loc[idx, 'RECENT_TREND'] = np.polyfit(np.arange(6), y, 1)[0]
+
+    # Fill NaN with 0 for modeling
+    series_df[feature_cols] = series_df[feature_cols].fillna(0)
+    return series_df
+
 
 # === PER-SERIES FEATURE IMPORTANCE ===
 print("\n=== Computing feature importance per series ===")
@@ -216,8 +221,7 @@ importance_results = []
 
 for (pc, reason) in target_series:
     print(f"\n--- Analyzing {pc} | {reason} ---")
-    series_mask = (df['ROLL_UP_SHOP'] == pc) & (df['REASON_GROUP'] == reason)
-    series_df = df[series_mask].copy()
+    series_df = load_series(pc, reason)
     
     if len(series_df) < 10:
         print(f"  [SKIP] Only {len(series_df)} rows, need at least 10")
@@ -329,6 +333,8 @@ for (pc, reason) in target_series:
                 'short_note': note if rank == 1 else ''
             })
 
+data.close()
+
 # Save feature importance CSV
 print("\n=== Saving feature importance CSV ===")
 importance_csv = pd.DataFrame(importance_results)
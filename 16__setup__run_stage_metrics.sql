@@ -0,0 +1,257 @@
+-- 16__setup__run_stage_metrics.sql
+--
+-- Per-stage telemetry for the monthly pipeline.
+--
+-- FORECAST_RUN_STAGE_METRICS: one row per (run_id, stage_name) with timing, row counts
+-- and query ids. Filled by SP_START_FORECAST_RUN (refresh / eligibility / actuals /
+-- cust mix / budget / dataset) and SP_SCORE_AND_PUBLISH_FORECASTS (scoring steps)
+-- through SP_LOG_RUN_STAGES.
+--
+-- VW_FORECAST_RUN_STAGE_TREND: stage durations across runs with a trailing average,
+-- to spot regressions as the data grows.
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUN_STAGE_METRICS (
+  run_id               string,
+  stage_name           string,
+
+  started_at           timestamp_ltz,
+  ended_at             timestamp_ltz,
+  elapsed_ms           number,
+
+  status               string,              -- stage result:"status"
+  rows_read            number,              -- rows produced by the stage's SELECT / CTAS statements
+  rows_written         number,              -- rows inserted + updated + deleted
+  bytes_scanned        number,
+
+  call_query_id        string,              -- the CALL (null for inline steps)
+  query_ids            array,               -- statements run inside the stage window
+  overlapped           boolean,             -- ran concurrently with another stage: rows / bytes / query_ids
+                                            -- are then taken from the stage result only
+  stage_result         variant,
+  logged_at            timestamp_ltz,
+
+  primary key (run_id, stage_name)
+)
+cluster by (run_id);
+
+---------------------------------------------------------------
+-- SP_LOG_RUN_STAGES
+--
+-- P_STAGES: array of objects
+--   { stage_name, proc_name?, started_at?, ended_at?, result }
+--
+-- With proc_name (and no started_at) the stage window is read from the session's
+-- CALL statement in information_schema.query_history_by_session, which is exact
+-- even for async child jobs. Inline steps pass started_at / ended_at themselves.
+-- Statement stats are attributed to a stage only when its window does not overlap
+-- another stage of the same batch; otherwise rows_written falls back to the row
+-- counts the stage returned.
+---------------------------------------------------------------
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_LOG_RUN_STAGES(
+    P_RUN_ID string,
+    P_SINCE timestamp_ltz,
+    P_STAGES array
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_ROWS number;
+begin
+  create or replace temporary table TMP_STAGE_QH as
+  select
+    query_id,
+    query_type,
+    query_text,
+    start_time,
+    end_time,
+    total_elapsed_time,
+    rows_produced,
+    coalesce(rows_inserted,0) + coalesce(rows_updated,0) + coalesce(rows_deleted,0) as rows_written,
+    bytes_scanned
+  from table(DB_BI_P_SANDBOX.information_schema.query_history_by_session(result_limit => 10000))
+  where start_time >= :P_SINCE;
+
+  create or replace temporary table TMP_STAGE_WINDOWS as
+  with stages as (
+    select
+      s.value:"stage_name"::string as stage_name,
+      upper(s.value:"proc_name"::string) as proc_name,
+      s.value:"started_at"::timestamp_ltz as started_at,
+      s.value:"ended_at"::timestamp_ltz as ended_at,
+      s.value:"result" as stage_result
+    from table(flatten(input => :P_STAGES)) s
+  ),
+  calls as (
+    select
+      st.stage_name,
+      q.query_id as call_query_id,
+      q.start_time,
+      q.end_time
+    from stages st
+    join TMP_STAGE_QH q
+      on q.query_type = 'CALL'
+     and upper(q.query_text) like '%' || st.proc_name || '(%'
+    where st.proc_name is not null
+      and st.started_at is null
+    qualify row_number() over (partition by st.stage_name order by q.start_time desc) = 1
+  )
+  select
+    st.stage_name,
+    coalesce(st.started_at, c.start_time) as started_at,
+    coalesce(st.ended_at, c.end_time) as ended_at,
+    c.call_query_id,
+    st.stage_result
+  from stages st
+  left join calls c
+    on c.stage_name = st.stage_name;
+
+  create or replace temporary table TMP_STAGE_STATS as
+  with overlaps as (
+    select a.stage_name, count(*) as n_overlaps
+    from TMP_STAGE_WINDOWS a
+    join TMP_STAGE_WINDOWS b
+      on b.stage_name <> a.stage_name
+     and b.started_at < a.ended_at
+     and b.ended_at > a.started_at
+    group by 1
+  ),
+  w as (
+    select
+      w.*,
+      coalesce(o.n_overlaps, 0) > 0 as overlapped
+    from TMP_STAGE_WINDOWS w
+    left join overlaps o
+      on o.stage_name = w.stage_name
+  ),
+  child as (
+    select
+      w.stage_name,
+      sum(iff(q.query_type in ('SELECT', 'CREATE_TABLE_AS_SELECT'), q.rows_produced, 0)) as rows_read,
+      sum(q.rows_written) as rows_written,
+      sum(q.bytes_scanned) as bytes_scanned,
+      array_agg(q.query_id) within group (order by q.start_time) as query_ids
+    from w
+    join TMP_STAGE_QH q
+      on q.start_time >= w.started_at
+     and q.end_time <= w.ended_at
+     and q.query_type <> 'CALL'
+    where not w.overlapped
+    group by 1
+  )
+  select
+    w.stage_name,
+    w.started_at,
+    w.ended_at,
+    datediff('millisecond', w.started_at, w.ended_at) as elapsed_ms,
+    w.stage_result:"status"::string as status,
+    c.rows_read,
+    coalesce(
+      c.rows_written,
+      w.stage_result:"rows_written"::number,
+      w.stage_result:"rows_inserted"::number,
+      w.stage_result:"rows_out"::number,
+      w.stage_result:"rows_staged"::number,
+      w.stage_result:"rows_pc_reason_forecast"::number
+    ) as rows_written,
+    c.bytes_scanned,
+    w.call_query_id,
+    c.query_ids,
+    w.overlapped,
+    w.stage_result
+  from w
+  left join child c
+    on c.stage_name = w.stage_name;
+
+  merge into DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUN_STAGE_METRICS t
+  using TMP_STAGE_STATS s
+  on  t.run_id     = :P_RUN_ID
+  and t.stage_name = s.stage_name
+  when matched then update set
+    started_at    = s.started_at,
+    ended_at      = s.ended_at,
+    elapsed_ms    = s.elapsed_ms,
+    status        = s.status,
+    rows_read     = s.rows_read,
+    rows_written  = s.rows_written,
+    bytes_scanned = s.bytes_scanned,
+    call_query_id = s.call_query_id,
+    query_ids     = s.query_ids,
+    overlapped    = s.overlapped,
+    stage_result  = s.stage_result,
+    logged_at     = current_timestamp()
+  when not matched then insert (
+    run_id, stage_name, started_at, ended_at, elapsed_ms, status,
+    rows_read, rows_written, bytes_scanned, call_query_id, query_ids, overlapped,
+    stage_result, logged_at
+  ) values (
+    :P_RUN_ID, s.stage_name, s.started_at, s.ended_at, s.elapsed_ms, s.status,
+    s.rows_read, s.rows_written, s.bytes_scanned, s.call_query_id, s.query_ids, s.overlapped,
+    s.stage_result, current_timestamp()
+  );
+
+  V_ROWS := SQLROWCOUNT;
+
+  return object_construct('status','OK','run_id',:P_RUN_ID,'stages_logged',:V_ROWS);
+
+exception
+  when other then
+    -- telemetry must never fail the pipeline
+    return object_construct('status','ERROR','message',SQLERRM);
+end;
+$$;
+
+---------------------------------------------------------------
+-- Stage duration trend across runs
+---------------------------------------------------------------
+create or replace view DB_BI_P_SANDBOX.SANDBOX.VW_FORECAST_RUN_STAGE_TREND as
+with t as (
+  select
+    m.stage_name,
+    r.run_type,
+    r.asof_fiscal_yyyymm,
+    m.run_id,
+    m.started_at,
+    m.elapsed_ms,
+    m.rows_read,
+    m.rows_written,
+    m.bytes_scanned,
+    m.overlapped,
+    avg(m.elapsed_ms) over (
+      partition by m.stage_name, r.run_type
+      order by m.started_at
+      rows between 6 preceding and 1 preceding
+    ) as trailing_avg_elapsed_ms,
+    lag(m.rows_written) over (
+      partition by m.stage_name, r.run_type
+      order by m.started_at
+    ) as prev_rows_written
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUN_STAGE_METRICS m
+  left join DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUNS r
+    on r.run_id = m.run_id
+)
+select
+  t.*,
+  t.elapsed_ms / nullif(t.trailing_avg_elapsed_ms, 0) - 1 as elapsed_vs_trailing_pct,
+  t.rows_written / nullif(t.prev_rows_written, 0) - 1 as rows_written_vs_prev_pct
+from t;
+
+-- ========================================================================
+-- EXAMPLE USAGE
+-- ========================================================================
+
+/*
+-- Slowest stages of the latest run
+select stage_name, elapsed_ms, rows_read, rows_written, overlapped
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUN_STAGE_METRICS
+where run_id = (select run_id from DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUNS order by triggered_at desc limit 1)
+order by elapsed_ms desc;
+
+-- Regressions: stages more than 50% slower than their trailing 6-run average
+select *
+from DB_BI_P_SANDBOX.SANDBOX.VW_FORECAST_RUN_STAGE_TREND
+where elapsed_vs_trailing_pct > 0.5
+order by started_at desc;
+*/
@@ -0,0 +1,285 @@
+-- 17__proc__manage_snapshots.sql
+--
+-- Clustering + retention for the per-run snapshot tables:
+--   FORECAST_ACTUALS_PC_REASON_MTH_SNAP, FORECAST_BUDGET_PC_REASON_MTH_SNAP,
+--   FORECAST_CUST_MIX_PC_REASON_SNAP, FORECAST_MODEL_DATASET_PC_REASON_H_SNAP
+--
+-- All four are read with `where run_id = ...`. The cust mix table is append-only per run
+-- and clustered by run_id, which keeps those reads to the run's own micro-partitions;
+-- actuals / budget (18__proc__...) and the dataset (09__proc__...) are delta-encoded
+-- views. Retention keeps both from growing without bound.
+--
+-- Retention policy (SP_MANAGE_SNAPSHOTS), per FORECAST_RUNS row:
+--   PROTECTED  tagged KEEP, source run of a champion model, or one of the latest
+--              P_KEEP_LATEST_RUNS succeeded runs -> never touched
+--   DROP       tagged DISCARD, or older than P_DROP_AFTER_MONTHS
+--              -> rows deleted from all four snapshots (delta-encoded ones: run
+--                 unregistered, versions no remaining run can see are purged)
+--   COMPACT    older than P_COMPACT_AFTER_MONTHS (or FAILED)
+--              -> dataset + cust mix snapshots deleted (the large, rebuildable ones);
+--                 actuals / budget snapshots kept as the run's input record
+--
+-- Every deletion is written to FORECAST_SNAPSHOT_RETENTION_LOG.
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUN_TAGS (
+  run_id               string,
+  tag                  string,              -- KEEP | DISCARD | free text (e.g. AUDIT_FY25)
+  note                 string,
+  tagged_by            string,
+  tagged_at            timestamp_ntz,
+
+  primary key (run_id, tag)
+);
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_RETENTION_LOG (
+  managed_at           timestamp_ntz,
+  run_id               string,
+  asof_fiscal_yyyymm   number,
+  action               string,              -- COMPACT | DROP
+  reason               string,
+  table_name           string,
+  rows_deleted         number,
+  policy               variant
+);
+
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_MANAGE_SNAPSHOTS(
+    P_COMPACT_AFTER_MONTHS number default 3,
+    P_DROP_AFTER_MONTHS number default 13,
+    P_KEEP_LATEST_RUNS number default 3,
+    P_DRY_RUN boolean default false
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_NOW timestamp_ntz;
+  V_POLICY variant;
+
+  V_RUNS_COMPACT number;
+  V_RUNS_DROP number;
+  V_ROWS_DELETED number default 0;
+  V_VERSIONS_PURGED number default 0;
+begin
+  V_NOW := current_timestamp();
+  V_POLICY := object_construct(
+    'compact_after_months', :P_COMPACT_AFTER_MONTHS,
+    'drop_after_months', :P_DROP_AFTER_MONTHS,
+    'keep_latest_runs', :P_KEEP_LATEST_RUNS
+  );
+
+  -- 1) Clustering (idempotent; existing tables pick it up without a rebuild).
+  --    Actuals / budget / dataset snapshots are delta-encoded views; their version tables
+  --    are clustered by month_seq (anchor_month_seq) where they are created (18, 09).
+  alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_PC_REASON_SNAP cluster by (run_id);
+
+  -- 2) Classify runs
+  create or replace temporary table TMP_SNAPSHOT_RETENTION as
+  with tags as (
+    select
+      run_id,
+      max(iff(upper(tag) = 'KEEP', 1, 0)) = 1 as is_keep,
+      max(iff(upper(tag) = 'DISCARD', 1, 0)) = 1 as is_discard
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUN_TAGS
+    group by 1
+  ),
+  champion_runs as (
+    select distinct mr.run_id
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_CHAMPIONS c
+    join DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_RUNS mr
+      on mr.model_run_id = c.model_run_id
+  ),
+  latest_runs as (
+    select run_id
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUNS
+    where status = 'SUCCEEDED'
+    qualify row_number() over (order by triggered_at desc) <= :P_KEEP_LATEST_RUNS
+  ),
+  runs as (
+    select
+      r.run_id,
+      r.asof_fiscal_yyyymm,
+      r.status,
+      datediff('month', r.triggered_at, :V_NOW) as age_months,
+      coalesce(t.is_keep, false) as is_keep,
+      coalesce(t.is_discard, false) as is_discard,
+      cr.run_id is not null as is_champion_source,
+      lr.run_id is not null as is_latest
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUNS r
+    left join tags t on t.run_id = r.run_id
+    left join champion_runs cr on cr.run_id = r.run_id
+    left join latest_runs lr on lr.run_id = r.run_id
+  )
+  select
+    run_id,
+    asof_fiscal_yyyymm,
+    case
+      when is_keep or is_champion_source or is_latest then null
+      when is_discard or age_months >= :P_DROP_AFTER_MONTHS then 'DROP'
+      when status = 'FAILED' or age_months >= :P_COMPACT_AFTER_MONTHS then 'COMPACT'
+    end as action,
+    case
+      when is_keep or is_champion_source or is_latest then null
+      when is_discard then 'tag DISCARD'
+      when age_months >= :P_DROP_AFTER_MONTHS then 'age >= ' || :P_DROP_AFTER_MONTHS || ' months'
+      when status = 'FAILED' then 'run FAILED'
+      when age_months >= :P_COMPACT_AFTER_MONTHS then 'age >= ' || :P_COMPACT_AFTER_MONTHS || ' months'
+    end as reason
+  from runs;
+
+  delete from TMP_SNAPSHOT_RETENTION where action is null;
+
+  select count_if(action = 'COMPACT'), count_if(action = 'DROP')
+    into :V_RUNS_COMPACT, :V_RUNS_DROP
+  from TMP_SNAPSHOT_RETENTION;
+
+  if (P_DRY_RUN or (V_RUNS_COMPACT + V_RUNS_DROP) = 0) then
+    return object_construct(
+      'status','OK',
+      'dry_run', :P_DRY_RUN,
+      'policy', :V_POLICY,
+      'runs_compact', :V_RUNS_COMPACT,
+      'runs_drop', :V_RUNS_DROP,
+      'runs', (select array_agg(object_construct('run_id', run_id, 'asof_fiscal_yyyymm', asof_fiscal_yyyymm,
+                                                 'action', action, 'reason', reason))
+               from TMP_SNAPSHOT_RETENTION)
+    );
+  end if;
+
+  -- 3) Row counts per run x table for the log (before the transaction: DDL would commit it)
+  create or replace temporary table TMP_SNAPSHOT_DELETED as
+  -- Dataset + cust mix: COMPACT and DROP
+  select run_id, 'FORECAST_MODEL_DATASET_PC_REASON_H_SNAP' as table_name, count(*) as rows_deleted
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP
+  where run_id in (select run_id from TMP_SNAPSHOT_RETENTION)
+  group by 1
+  union all
+  select run_id, 'FORECAST_CUST_MIX_PC_REASON_SNAP', count(*)
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_PC_REASON_SNAP
+  where run_id in (select run_id from TMP_SNAPSHOT_RETENTION)
+  group by 1
+  union all
+  -- Actuals + budget: DROP only (logical rows of the delta-encoded snapshot views)
+  select run_id, 'FORECAST_ACTUALS_PC_REASON_MTH_SNAP', count(*)
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP
+  where run_id in (select run_id from TMP_SNAPSHOT_RETENTION where action = 'DROP')
+  group by 1
+  union all
+  select run_id, 'FORECAST_BUDGET_PC_REASON_MTH_SNAP', count(*)
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP
+  where run_id in (select run_id from TMP_SNAPSHOT_RETENTION where action = 'DROP')
+  group by 1;
+
+  select coalesce(sum(rows_deleted), 0) into :V_ROWS_DELETED from TMP_SNAPSHOT_DELETED;
+
+  begin transaction;
+
+  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_PC_REASON_SNAP
+  where run_id in (select run_id from TMP_SNAPSHOT_RETENTION);
+
+  -- Dataset: unregister the run, then purge closed versions no registered run can see
+  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY
+  where snapshot_kind = 'MODEL_DATASET_PC_REASON_H'
+    and run_id in (select run_id from TMP_SNAPSHOT_RETENTION);
+
+  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_VERSIONS v
+  where v.valid_to_seq is not null
+    and not exists (
+      select 1
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY r
+      where r.snapshot_kind = 'MODEL_DATASET_PC_REASON_H'
+        and r.snap_seq >= v.valid_from_seq
+        and r.snap_seq <  v.valid_to_seq
+        and v.anchor_month_seq between r.month_seq_start and r.month_seq_end
+    );
+  V_VERSIONS_PURGED := SQLROWCOUNT;
+
+  -- Actuals + budget: unregister the run, then purge closed versions no registered run can see
+  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY
+  where snapshot_kind in ('ACTUALS_PC_REASON_MTH', 'BUDGET_PC_REASON_MTH')
+    and run_id in (select run_id from TMP_SNAPSHOT_RETENTION where action = 'DROP');
+
+  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP_VERSIONS v
+  where v.valid_to_seq is not null
+    and not exists (
+      select 1
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY r
+      where r.snapshot_kind = 'ACTUALS_PC_REASON_MTH'
+        and r.snap_seq >= v.valid_from_seq
+        and r.snap_seq <  v.valid_to_seq
+        and v.month_seq between r.month_seq_start and r.month_seq_end
+    );
+  V_VERSIONS_PURGED := V_VERSIONS_PURGED + SQLROWCOUNT;
+
+  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP_VERSIONS v
+  where v.valid_to_seq is not null
+    and not exists (
+      select 1
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY r
+      where r.snapshot_kind = 'BUDGET_PC_REASON_MTH'
+        and r.snap_seq >= v.valid_from_seq
+        and r.snap_seq <  v.valid_to_seq
+        and v.month_seq between r.month_seq_start and r.month_seq_end
+    );
+  V_VERSIONS_PURGED := V_VERSIONS_PURGED + SQLROWCOUNT;
+
+  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_RETENTION_LOG
+  (managed_at, run_id, asof_fiscal_yyyymm, action, reason, table_name, rows_deleted, policy)
+  select :V_NOW, r.run_id, r.asof_fiscal_yyyymm, r.action, r.reason, d.table_name, d.rows_deleted, :V_POLICY
+  from TMP_SNAPSHOT_DELETED d
+  join TMP_SNAPSHOT_RETENTION r
+    on r.run_id = d.run_id;
+
+  commit;
+
+  return object_construct(
+    'status','OK',
+    'dry_run', false,
+    'policy', :V_POLICY,
+    'runs_compact', :V_RUNS_COMPACT,
+    'runs_drop', :V_RUNS_DROP,
+    'rows_deleted', :V_ROWS_DELETED,
+    'versions_purged', :V_VERSIONS_PURGED
+  );
+
+exception
+  when other then
+    rollback;
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
+end;
+$$;
+
+
+-- ========================================================================
+-- EXAMPLE USAGE
+-- ========================================================================
+
+/*
+-- Pin a run (e.g. the one behind a board pack) so retention never touches it
+merge into DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUN_TAGS t
+using (select '<run_id>' as run_id, 'KEEP' as tag, 'FY25 Q4 board pack' as note) s
+on t.run_id = s.run_id and t.tag = s.tag
+when not matched then insert (run_id, tag, note, tagged_by, tagged_at)
+values (s.run_id, s.tag, s.note, current_user(), current_timestamp());
+
+-- Preview, then apply
+call DB_BI_P_SANDBOX.SANDBOX.SP_MANAGE_SNAPSHOTS(3, 13, 3, true);
+call DB_BI_P_SANDBOX.SANDBOX.SP_MANAGE_SNAPSHOTS();
+
+-- Monthly schedule
+create or replace task DB_BI_P_SANDBOX.SANDBOX.TASK_MANAGE_SNAPSHOTS
+  warehouse = BI_P_QRY_FIN_OPT_WH
+  schedule = 'USING CRON 0 6 5 * * UTC'
+as
+  call DB_BI_P_SANDBOX.SANDBOX.SP_MANAGE_SNAPSHOTS();
+
+-- Clustering health of a snapshot table
+select system$clustering_information('DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_VERSIONS', '(anchor_month_seq)');
+
+-- What was removed
+select * from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_RETENTION_LOG order by managed_at desc, run_id;
+*/
@@ -0,0 +1,304 @@
+-- 18__proc__write_pc_reason_mth_snapshot.sql
+--
+-- Delta-encoded actuals / budget snapshots.
+--
+-- A run's actuals (or budget) snapshot is 72 months of PC x reason rows, of which only the
+-- newest month or two differ from the previous run. Instead of copying the whole window
+-- per run, each row version is stored once with the snapshot sequence range it is valid for:
+--
+--   FORECAST_ACTUALS_PC_REASON_MTH_SNAP_VERSIONS / FORECAST_BUDGET_PC_REASON_MTH_SNAP_VERSIONS
+--     one row per (key, version); valid_from_seq <= snap_seq < coalesce(valid_to_seq, inf)
+--   FORECAST_SNAPSHOT_REGISTRY
+--     one row per (snapshot_kind, run_id): the run's snap_seq and month_seq window
+--
+-- FORECAST_ACTUALS_PC_REASON_MTH_SNAP and FORECAST_BUDGET_PC_REASON_MTH_SNAP are views that
+-- rebuild the full per-run snapshot (same columns as the former tables), so
+-- `where run_id = ...` readers are unchanged.
+--
+-- SP_WRITE_PC_REASON_MTH_SNAPSHOT diffs a staged window against the open versions and
+-- writes only the delta. A rerun of a run_id takes a new snap_seq; runs in between keep
+-- the versions they saw. Writers of the same kind must not run concurrently (the
+-- orchestrator runs one actuals and one budget build per run, and the backfill is serial).
+
+create sequence if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_SEQ;
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY (
+  snapshot_kind        string,              -- ACTUALS_PC_REASON_MTH | BUDGET_PC_REASON_MTH | MODEL_DATASET_PC_REASON_H (09)
+  run_id               string,
+  asof_fiscal_yyyymm   number,
+
+  snap_seq             number,
+  month_seq_start      number,
+  month_seq_end        number,
+
+  rows_full            number,              -- rows in the rebuilt snapshot
+  rows_delta           number,              -- versions opened + closed by this run
+  snapshotted_at       timestamp_ntz,
+
+  primary key (snapshot_kind, run_id)
+);
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP_VERSIONS (
+  fiscal_yyyymm        number,
+  fiscal_year          number,
+  fiscal_month         number,
+  month_seq            number,
+  month_start_date     date,
+  month_end_date       date,
+
+  roll_up_shop         string,
+  reason_group         string,
+
+  value                number(18,2),        -- total_revenue
+
+  source_object        string,
+  row_hash             string,
+
+  valid_from_seq       number,
+  valid_to_seq         number,              -- null = still current
+  created_at           timestamp_ntz
+)
+cluster by (month_seq);
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP_VERSIONS (
+  fiscal_yyyymm        number,
+  fiscal_year          number,
+  fiscal_month         number,
+  month_seq            number,
+  month_start_date     date,
+  month_end_date       date,
+
+  roll_up_shop         string,
+  reason_group         string,
+
+  value                number(18,2),        -- total_budget
+
+  source_object        string,
+  row_hash             string,
+
+  valid_from_seq       number,
+  valid_to_seq         number,
+  created_at           timestamp_ntz
+)
+cluster by (month_seq);
+
+---------------------------------------------------------------
+-- Full snapshots per run (former _SNAP tables)
+---------------------------------------------------------------
+create or replace view DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP as
+select
+  r.run_id,
+  r.asof_fiscal_yyyymm,
+
+  v.fiscal_yyyymm,
+  v.fiscal_year,
+  v.fiscal_month,
+  v.month_seq,
+  v.month_start_date,
+  v.month_end_date,
+
+  v.roll_up_shop,
+  v.reason_group,
+
+  v.value as total_revenue,
+
+  v.source_object,
+  r.snapshotted_at,
+  v.row_hash
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY r
+join DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP_VERSIONS v
+  on v.month_seq between r.month_seq_start and r.month_seq_end
+ and v.valid_from_seq <= r.snap_seq
+ and (v.valid_to_seq is null or v.valid_to_seq > r.snap_seq)
+where r.snapshot_kind = 'ACTUALS_PC_REASON_MTH';
+
+create or replace view DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP as
+select
+  r.run_id,
+  r.asof_fiscal_yyyymm,
+
+  v.fiscal_yyyymm,
+  v.fiscal_year,
+  v.fiscal_month,
+  v.month_seq,
+  v.month_start_date,
+  v.month_end_date,
+
+  v.roll_up_shop,
+  v.reason_group,
+
+  v.value as total_budget,
+
+  v.source_object,
+  r.snapshotted_at,
+  v.row_hash
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY r
+join DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP_VERSIONS v
+  on v.month_seq between r.month_seq_start and r.month_seq_end
+ and v.valid_from_seq <= r.snap_seq
+ and (v.valid_to_seq is null or v.valid_to_seq > r.snap_seq)
+where r.snapshot_kind = 'BUDGET_PC_REASON_MTH';
+
+---------------------------------------------------------------
+-- SP_WRITE_PC_REASON_MTH_SNAPSHOT
+--
+-- P_STAGE_TABLE: (temp) table with the run's full window, columns
+--   fiscal_yyyymm, fiscal_year, fiscal_month, month_seq, month_start_date, month_end_date,
+--   roll_up_shop, reason_group, value, source_object, row_hash
+-- row_hash must cover the value (the builders' row_hash does).
+---------------------------------------------------------------
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_WRITE_PC_REASON_MTH_SNAPSHOT(
+    P_SNAPSHOT_KIND string,
+    P_RUN_ID string,
+    P_ASOF_FISCAL_YYYYMM number,
+    P_STAGE_TABLE string,
+    P_MONTH_SEQ_START number,
+    P_MONTH_SEQ_END number
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_VERSIONS string;
+  V_DIFF string;
+  V_SEQ number;
+
+  V_ROWS_FULL number;
+  V_ROWS_INSERTED number;
+  V_ROWS_UPDATED number;
+  V_ROWS_DELETED number;
+begin
+  if (P_SNAPSHOT_KIND = 'ACTUALS_PC_REASON_MTH') then
+    V_VERSIONS := 'DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP_VERSIONS';
+  elseif (P_SNAPSHOT_KIND = 'BUDGET_PC_REASON_MTH') then
+    V_VERSIONS := 'DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP_VERSIONS';
+  else
+    return object_construct('status','ERROR','message','Unknown snapshot kind: ' || coalesce(:P_SNAPSHOT_KIND, 'null'));
+  end if;
+
+  -- distinct per kind: actuals and budget snapshots are written from concurrent child jobs
+  V_DIFF := 'TMP_SNAP_DIFF_' || P_SNAPSHOT_KIND;
+
+  select DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_SEQ.nextval into :V_SEQ;
+
+  -- Stage vs. current versions inside the run's window
+  create or replace temporary table identifier(:V_DIFF) as
+  with cur as (
+    select *
+    from identifier(:V_VERSIONS)
+    where valid_to_seq is null
+      and month_seq between :P_MONTH_SEQ_START and :P_MONTH_SEQ_END
+  )
+  select
+    coalesce(s.fiscal_yyyymm, c.fiscal_yyyymm) as key_fiscal_yyyymm,
+    coalesce(s.roll_up_shop, c.roll_up_shop)   as key_roll_up_shop,
+    coalesce(s.reason_group, c.reason_group)   as key_reason_group,
+    s.fiscal_yyyymm, s.fiscal_year, s.fiscal_month, s.month_seq, s.month_start_date, s.month_end_date,
+    s.roll_up_shop, s.reason_group, s.value, s.source_object, s.row_hash,
+    case
+      when c.row_hash is null then 'INSERT'
+      when s.row_hash is null then 'DELETE'
+      else 'UPDATE'
+    end as change_type
+  from identifier(:P_STAGE_TABLE) s
+  full outer join cur c
+    on  c.fiscal_yyyymm = s.fiscal_yyyymm
+    and equal_null(c.roll_up_shop, s.roll_up_shop)
+    and equal_null(c.reason_group, s.reason_group)
+  where c.row_hash is null
+     or s.row_hash is null
+     or c.row_hash <> s.row_hash;
+
+  select count(*) into :V_ROWS_FULL from identifier(:P_STAGE_TABLE);
+
+  select count_if(change_type = 'INSERT'), count_if(change_type = 'UPDATE'), count_if(change_type = 'DELETE')
+    into :V_ROWS_INSERTED, :V_ROWS_UPDATED, :V_ROWS_DELETED
+  from identifier(:V_DIFF);
+
+  begin transaction;
+
+  -- Close replaced / vanished versions
+  update identifier(:V_VERSIONS) v
+  set valid_to_seq = :V_SEQ
+  from identifier(:V_DIFF) d
+  where d.change_type in ('UPDATE', 'DELETE')
+    and v.valid_to_seq is null
+    and v.fiscal_yyyymm = d.key_fiscal_yyyymm
+    and equal_null(v.roll_up_shop, d.key_roll_up_shop)
+    and equal_null(v.reason_group, d.key_reason_group);
+
+  -- Open new versions
+  insert into identifier(:V_VERSIONS)
+  (fiscal_yyyymm, fiscal_year, fiscal_month, month_seq, month_start_date, month_end_date,
+   roll_up_shop, reason_group, value, source_object, row_hash,
+   valid_from_seq, valid_to_seq, created_at)
+  select
+    fiscal_yyyymm, fiscal_year, fiscal_month, month_seq, month_start_date, month_end_date,
+    roll_up_shop, reason_group, value, source_object, row_hash,
+    :V_SEQ, null, current_timestamp()
+  from identifier(:V_DIFF)
+  where change_type in ('INSERT', 'UPDATE');
+
+  -- Point the run at this state (a rerun simply moves to the new seq)
+  merge into DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY t
+  using (select :P_SNAPSHOT_KIND as snapshot_kind, :P_RUN_ID as run_id) s
+  on  t.snapshot_kind = s.snapshot_kind
+  and t.run_id        = s.run_id
+  when matched then update set
+    asof_fiscal_yyyymm = :P_ASOF_FISCAL_YYYYMM,
+    snap_seq           = :V_SEQ,
+    month_seq_start    = :P_MONTH_SEQ_START,
+    month_seq_end      = :P_MONTH_SEQ_END,
+    rows_full          = :V_ROWS_FULL,
+    rows_delta         = :V_ROWS_INSERTED + :V_ROWS_UPDATED + :V_ROWS_DELETED,
+    snapshotted_at     = current_timestamp()
+  when not matched then insert (
+    snapshot_kind, run_id, asof_fiscal_yyyymm, snap_seq, month_seq_start, month_seq_end,
+    rows_full, rows_delta, snapshotted_at
+  ) values (
+    s.snapshot_kind, s.run_id, :P_ASOF_FISCAL_YYYYMM, :V_SEQ, :P_MONTH_SEQ_START, :P_MONTH_SEQ_END,
+    :V_ROWS_FULL, :V_ROWS_INSERTED + :V_ROWS_UPDATED + :V_ROWS_DELETED, current_timestamp()
+  );
+
+  commit;
+
+  return object_construct(
+    'status','OK',
+    'snapshot_kind', :P_SNAPSHOT_KIND,
+    'run_id', :P_RUN_ID,
+    'snap_seq', :V_SEQ,
+    'rows_full', :V_ROWS_FULL,
+    'rows_inserted', :V_ROWS_INSERTED,
+    'rows_updated', :V_ROWS_UPDATED,
+    'rows_deleted', :V_ROWS_DELETED
+  );
+
+exception
+  when other then
+    rollback;
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
+end;
+$$;
+
+
+-- ========================================================================
+-- EXAMPLE USAGE
+-- ========================================================================
+
+/*
+-- Full snapshot of one run (unchanged consumer query)
+select *
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP
+where run_id = '<run_id>';
+
+-- Stored vs. logical size per run
+select snapshot_kind, run_id, asof_fiscal_yyyymm, rows_full, rows_delta,
+       rows_delta / nullif(rows_full, 0) as delta_ratio
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY
+order by snap_seq desc;
+*/
@@ -0,0 +1,251 @@
+-- 19__proc__snapshot_forecast_output.sql
+--
+-- Zero-copy snapshots of the published forecast marts:
+--   FORECAST_OUTPUT_PC_REASON_MTH, FORECAST_OUTPUT_PC_REASON_CUST_MTH
+--
+-- SP_SNAPSHOT_FORECAST_OUTPUT clones both tables (metadata only: no data is copied until
+-- either side changes) and records the clones in FORECAST_OUTPUT_SNAPSHOT_CATALOG under
+-- one snapshot_id, labelled with the as-of month it archives.
+--
+-- SP_RESTORE_FORECAST_OUTPUT_SNAPSHOT swaps a snapshot back in. The snapshot clone itself
+-- is kept (it is re-cloned before the swap) and the displaced live tables are catalogued
+-- as a PRE_RESTORE snapshot, so a restore can be undone the same way.
+--
+-- Replaces the CTAS template in sql/archival/create_snapshot_forecast_monthly.sql.
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_SNAPSHOT_CATALOG (
+  snapshot_id          string,
+  snapshot_kind        string,              -- ARCHIVE | PRE_RESTORE
+  asof_fiscal_yyyymm   number,              -- as-of the snapshot archives
+
+  source_table         string,
+  snapshot_table       string,
+
+  row_count            number,              -- whole table at snapshot time
+  rows_for_asof        number,              -- rows with asof_fiscal_yyyymm = snapshot as-of
+
+  note                 string,
+  created_by           string,
+  created_at           timestamp_ntz,
+  restored_at          timestamp_ntz,       -- last time this snapshot was swapped in
+
+  primary key (snapshot_id, source_table)
+);
+
+---------------------------------------------------------------
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_SNAPSHOT_FORECAST_OUTPUT(
+    P_ASOF_FISCAL_YYYYMM number default null,
+    P_NOTE string default null
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_ASOF_YYYYMM number;
+  V_SNAPSHOT_ID string;
+  V_SUFFIX string;
+  V_SNAP_PC string;
+  V_SNAP_CUST string;
+begin
+  -- Default: latest published as-of
+  if (P_ASOF_FISCAL_YYYYMM is null) then
+    select max(asof_fiscal_yyyymm) into :V_ASOF_YYYYMM
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH;
+  else
+    V_ASOF_YYYYMM := P_ASOF_FISCAL_YYYYMM;
+  end if;
+
+  if (V_ASOF_YYYYMM is null) then
+    return object_construct('status','ERROR','message','No published forecasts to snapshot.');
+  end if;
+
+  select uuid_string() into :V_SNAPSHOT_ID;
+  V_SUFFIX := V_ASOF_YYYYMM::string || '_' || to_char(current_timestamp(), 'YYYYMMDDHH24MISS');
+  V_SNAP_PC := 'DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH_SNAPSHOT_' || V_SUFFIX;
+  V_SNAP_CUST := 'DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH_SNAPSHOT_' || V_SUFFIX;
+
+  create table identifier(:V_SNAP_PC) clone DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH;
+  create table identifier(:V_SNAP_CUST) clone DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH;
+
+  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_SNAPSHOT_CATALOG
+  (snapshot_id, snapshot_kind, asof_fiscal_yyyymm, source_table, snapshot_table,
+   row_count, rows_for_asof, note, created_by, created_at)
+  select :V_SNAPSHOT_ID, 'ARCHIVE', :V_ASOF_YYYYMM,
+         'DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH', :V_SNAP_PC,
+         count(*), count_if(asof_fiscal_yyyymm = :V_ASOF_YYYYMM),
+         :P_NOTE, current_user(), current_timestamp()
+  from identifier(:V_SNAP_PC)
+  union all
+  select :V_SNAPSHOT_ID, 'ARCHIVE', :V_ASOF_YYYYMM,
+         'DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH', :V_SNAP_CUST,
+         count(*), count_if(asof_fiscal_yyyymm = :V_ASOF_YYYYMM),
+         :P_NOTE, current_user(), current_timestamp()
+  from identifier(:V_SNAP_CUST);
+
+  return object_construct(
+    'status','OK',
+    'snapshot_id', :V_SNAPSHOT_ID,
+    'asof_fiscal_yyyymm', :V_ASOF_YYYYMM,
+    'snapshot_tables', array_construct(:V_SNAP_PC, :V_SNAP_CUST)
+  );
+
+exception
+  when other then
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
+end;
+$$;
+
+---------------------------------------------------------------
+-- Restore by swap.
+--
+-- The swap replaces the whole tables, so forecasts published after the snapshot leave
+-- the live tables (they stay in the PRE_RESTORE snapshot). Without P_FORCE the restore
+-- refuses when such rows exist.
+---------------------------------------------------------------
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_RESTORE_FORECAST_OUTPUT_SNAPSHOT(
+    P_SNAPSHOT_ID string,
+    P_FORCE boolean default false
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_SNAP_PC string;
+  V_SNAP_CUST string;
+  V_CREATED_AT timestamp_ntz;
+  V_ASOF_YYYYMM number;
+  V_NEWER_ROWS number;
+
+  V_PRE_ID string;
+  V_SUFFIX string;
+  V_PRE_PC string;
+  V_PRE_CUST string;
+  V_ERR string;
+begin
+  select
+    max(iff(source_table = 'DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH', snapshot_table, null)),
+    max(iff(source_table = 'DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH', snapshot_table, null)),
+    max(created_at),
+    max(asof_fiscal_yyyymm)
+    into :V_SNAP_PC, :V_SNAP_CUST, :V_CREATED_AT, :V_ASOF_YYYYMM
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_SNAPSHOT_CATALOG
+  where snapshot_id = :P_SNAPSHOT_ID;
+
+  if (V_SNAP_PC is null or V_SNAP_CUST is null) then
+    return object_construct('status','ERROR','message','Unknown or incomplete snapshot: ' || coalesce(:P_SNAPSHOT_ID, 'null'));
+  end if;
+
+  select count(*) into :V_NEWER_ROWS
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH
+  where published_at > :V_CREATED_AT;
+
+  if (V_NEWER_ROWS > 0 and not P_FORCE) then
+    return object_construct(
+      'status','ERROR',
+      'message','Live table has rows published after the snapshot; rerun with P_FORCE => true to restore anyway.',
+      'rows_published_since', :V_NEWER_ROWS
+    );
+  end if;
+
+  -- Working copies of the snapshot (zero-copy) become the live tables; the live tables
+  -- end up under the PRE_RESTORE names.
+  select uuid_string() into :V_PRE_ID;
+  V_SUFFIX := 'PRE_RESTORE_' || to_char(current_timestamp(), 'YYYYMMDDHH24MISS');
+  V_PRE_PC := 'DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH_SNAPSHOT_' || V_SUFFIX;
+  V_PRE_CUST := 'DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH_SNAPSHOT_' || V_SUFFIX;
+
+  create table identifier(:V_PRE_PC) clone identifier(:V_SNAP_PC);
+  create table identifier(:V_PRE_CUST) clone identifier(:V_SNAP_CUST);
+
+  -- Each swap is its own DDL commit: if the second one fails, the first is swapped back
+  -- so both marts stay on the same version
+  alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH swap with identifier(:V_PRE_PC);
+
+  begin
+    alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH swap with identifier(:V_PRE_CUST);
+  exception
+    when other then
+      V_ERR := SQLERRM;
+      alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH swap with identifier(:V_PRE_PC);
+      drop table if exists identifier(:V_PRE_PC);
+      drop table if exists identifier(:V_PRE_CUST);
+      return object_construct(
+        'status', 'ERROR',
+        'message', 'Customer mart swap failed, PC mart swapped back; nothing restored: ' || :V_ERR
+      );
+  end;
+
+  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_SNAPSHOT_CATALOG
+  (snapshot_id, snapshot_kind, asof_fiscal_yyyymm, source_table, snapshot_table,
+   row_count, rows_for_asof, note, created_by, created_at)
+  select :V_PRE_ID, 'PRE_RESTORE', max(asof_fiscal_yyyymm),
+         'DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH', :V_PRE_PC,
+         count(*), null,
+         'Live table before restoring snapshot ' || :P_SNAPSHOT_ID, current_user(), current_timestamp()
+  from identifier(:V_PRE_PC)
+  union all
+  select :V_PRE_ID, 'PRE_RESTORE', max(asof_fiscal_yyyymm),
+         'DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH', :V_PRE_CUST,
+         count(*), null,
+         'Live table before restoring snapshot ' || :P_SNAPSHOT_ID, current_user(), current_timestamp()
+  from identifier(:V_PRE_CUST);
+
+  update DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_SNAPSHOT_CATALOG
+  set restored_at = current_timestamp()
+  where snapshot_id = :P_SNAPSHOT_ID;
+
+  return object_construct(
+    'status','OK',
+    'restored_snapshot_id', :P_SNAPSHOT_ID,
+    'asof_fiscal_yyyymm', :V_ASOF_YYYYMM,
+    'pre_restore_snapshot_id', :V_PRE_ID,
+    'rows_published_since', :V_NEWER_ROWS
+  );
+
+exception
+  when other then
+    -- After both swaps the restore itself is done; only the catalog rows may be missing.
+    -- The displaced live tables are under the PRE_RESTORE names returned here.
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM,
+      'pre_restore_pc_table', :V_PRE_PC,
+      'pre_restore_cust_table', :V_PRE_CUST
+    );
+end;
+$$;
+
+
+-- ========================================================================
+-- EXAMPLE USAGE
+-- ========================================================================
+
+/*
+-- Archive the latest published as-of (instant, no storage at creation)
+call DB_BI_P_SANDBOX.SANDBOX.SP_SNAPSHOT_FORECAST_OUTPUT(null, 'Monthly archive');
+
+-- Catalog
+select snapshot_id, snapshot_kind, asof_fiscal_yyyymm, source_table, snapshot_table, rows_for_asof, created_at, restored_at
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_SNAPSHOT_CATALOG
+order by created_at desc;
+
+-- Roll back a bad publish
+call DB_BI_P_SANDBOX.SANDBOX.SP_RESTORE_FORECAST_OUTPUT_SNAPSHOT('<snapshot_id>');
+
+-- Undo that rollback
+call DB_BI_P_SANDBOX.SANDBOX.SP_RESTORE_FORECAST_OUTPUT_SNAPSHOT('<pre_restore_snapshot_id>', true);
+
+-- Monthly schedule, after publishing
+create or replace task DB_BI_P_SANDBOX.SANDBOX.TASK_SNAPSHOT_FORECAST_OUTPUT
+  warehouse = BI_P_QRY_FIN_OPT_WH
+  schedule = 'USING CRON 0 2 1 * * America/New_York'
+as
+  call DB_BI_P_SANDBOX.SANDBOX.SP_SNAPSHOT_FORECAST_OUTPUT();
+*/
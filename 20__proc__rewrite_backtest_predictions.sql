@@ -0,0 +1,221 @@
+-- 20__proc__rewrite_backtest_predictions.sql
+--
+-- Rerun-safe writes to FORECAST_MODEL_BACKTEST_PREDICTIONS.
+--
+-- SP_REWRITE_BACKTEST_PREDICTIONS replaces all rows of the given model_run_ids with the
+-- contents of a staging table in one transaction (delete + insert), so readers never see
+-- a half-written run. The table is clustered by (model_run_id, anchor_month_seq), so the
+-- delete only rewrites the affected runs' micro-partitions and a rerun costs about the
+-- size of the new data.
+--
+-- No physical backup is taken: FORECAST_BACKTEST_REWRITE_LOG records the time-travel
+-- point just before the rewrite, and SP_RESTORE_BACKTEST_REWRITE puts the previous rows
+-- back from it (within the table's DATA_RETENTION_TIME_IN_DAYS).
+--
+-- Replaces the manual flow in sql/hotfixes/safe_backtest_delete.sql.
+-- Python: revenue_forecast.snowpark_jobs.rewrite_predictions()
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_BACKTEST_REWRITE_LOG (
+  rewrite_id           string,
+  model_run_ids        array,
+  stage_table          string,
+
+  rows_replaced        number,              -- rows of those model_run_ids before the rewrite
+  rows_inserted        number,
+
+  pre_rewrite_at       timestamp_ltz,       -- time-travel point for restore
+  rewritten_by         string,
+  rewritten_at         timestamp_ltz,
+  restored_at          timestamp_ltz,
+
+  primary key (rewrite_id)
+);
+
+---------------------------------------------------------------
+-- P_STAGE_TABLE: (temp) table with the prediction columns
+--   model_run_id, roll_up_shop, reason_group, anchor_fiscal_yyyymm, anchor_month_seq,
+--   horizon, target_fiscal_yyyymm, target_month_seq, y_true, y_pred, y_pred_lo,
+--   y_pred_hi, created_at
+--   (series_id is resolved from FORECAST_SERIES_REGISTRY)
+-- P_MODEL_RUN_IDS: runs to replace (default: the runs present in the stage). Runs listed
+--   but absent from the stage are cleared.
+---------------------------------------------------------------
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_REWRITE_BACKTEST_PREDICTIONS(
+    P_STAGE_TABLE string,
+    P_MODEL_RUN_IDS array default null
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_REWRITE_ID string;
+  V_MODEL_RUN_IDS array;
+  V_FOREIGN_RUNS number;
+  V_ROWS_REPLACED number;
+  V_ROWS_INSERTED number;
+  V_PRE_REWRITE_AT timestamp_ltz;
+begin
+  if (P_MODEL_RUN_IDS is null) then
+    select array_agg(distinct model_run_id) into :V_MODEL_RUN_IDS
+    from identifier(:P_STAGE_TABLE);
+  else
+    V_MODEL_RUN_IDS := P_MODEL_RUN_IDS;
+  end if;
+
+  if (V_MODEL_RUN_IDS is null or array_size(V_MODEL_RUN_IDS) = 0) then
+    return object_construct('status','ERROR','message','No model_run_ids to rewrite.');
+  end if;
+
+  -- Stage rows for runs outside the list would be appended without replacing anything
+  select count(distinct model_run_id) into :V_FOREIGN_RUNS
+  from identifier(:P_STAGE_TABLE)
+  where not array_contains(model_run_id::variant, :V_MODEL_RUN_IDS);
+
+  if (V_FOREIGN_RUNS > 0) then
+    return object_construct('status','ERROR','message','Stage contains model_run_ids not listed in P_MODEL_RUN_IDS.');
+  end if;
+
+  select uuid_string() into :V_REWRITE_ID;
+
+  select count(*) into :V_ROWS_REPLACED
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS
+  where array_contains(model_run_id::variant, :V_MODEL_RUN_IDS);
+
+  V_PRE_REWRITE_AT := current_timestamp();
+
+  begin transaction;
+
+  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS
+  where array_contains(model_run_id::variant, :V_MODEL_RUN_IDS);
+
+  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS
+  (model_run_id, roll_up_shop, reason_group,
+   anchor_fiscal_yyyymm, anchor_month_seq, horizon,
+   target_fiscal_yyyymm, target_month_seq,
+   y_true, y_pred, y_pred_lo, y_pred_hi,
+   created_at, series_id)
+  select
+    s.model_run_id, s.roll_up_shop, s.reason_group,
+    s.anchor_fiscal_yyyymm, s.anchor_month_seq, s.horizon,
+    s.target_fiscal_yyyymm, s.target_month_seq,
+    s.y_true, s.y_pred, s.y_pred_lo, s.y_pred_hi,
+    coalesce(s.created_at, current_timestamp()), r.series_id
+  from identifier(:P_STAGE_TABLE) s
+  left join DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY r     -- stages carry string keys only
+    on r.roll_up_shop = s.roll_up_shop
+   and equal_null(r.reason_group, s.reason_group)
+  order by s.model_run_id, s.anchor_month_seq;   -- load in clustering order
+
+  V_ROWS_INSERTED := SQLROWCOUNT;
+
+  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_BACKTEST_REWRITE_LOG
+  (rewrite_id, model_run_ids, stage_table, rows_replaced, rows_inserted,
+   pre_rewrite_at, rewritten_by, rewritten_at)
+  select :V_REWRITE_ID, :V_MODEL_RUN_IDS, :P_STAGE_TABLE, :V_ROWS_REPLACED, :V_ROWS_INSERTED,
+         :V_PRE_REWRITE_AT, current_user(), current_timestamp();
+
+  commit;
+
+  return object_construct(
+    'status','OK',
+    'rewrite_id', :V_REWRITE_ID,
+    'model_run_ids', :V_MODEL_RUN_IDS,
+    'rows_replaced', :V_ROWS_REPLACED,
+    'rows_inserted', :V_ROWS_INSERTED
+  );
+
+exception
+  when other then
+    rollback;
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
+end;
+$$;
+
+---------------------------------------------------------------
+-- Undo a rewrite from time travel (rows of the rewritten runs as they were before it)
+---------------------------------------------------------------
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_RESTORE_BACKTEST_REWRITE(
+    P_REWRITE_ID string
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_MODEL_RUN_IDS array;
+  V_PRE_REWRITE_AT timestamp_ltz;
+  V_ROWS_RESTORED number;
+begin
+  select model_run_ids, pre_rewrite_at
+    into :V_MODEL_RUN_IDS, :V_PRE_REWRITE_AT
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BACKTEST_REWRITE_LOG
+  where rewrite_id = :P_REWRITE_ID;
+
+  if (V_MODEL_RUN_IDS is null) then
+    return object_construct('status','ERROR','message','Unknown rewrite_id: ' || coalesce(:P_REWRITE_ID, 'null'));
+  end if;
+
+  -- Read first: fails cleanly if the point is outside the retention window
+  create or replace temporary table TMP_BACKTEST_RESTORE as
+  select *
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS at(timestamp => :V_PRE_REWRITE_AT)
+  where array_contains(model_run_id::variant, :V_MODEL_RUN_IDS);
+
+  begin transaction;
+
+  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS
+  where array_contains(model_run_id::variant, :V_MODEL_RUN_IDS);
+
+  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS
+  select * from TMP_BACKTEST_RESTORE
+  order by model_run_id, anchor_month_seq;
+
+  V_ROWS_RESTORED := SQLROWCOUNT;
+
+  update DB_BI_P_SANDBOX.SANDBOX.FORECAST_BACKTEST_REWRITE_LOG
+  set restored_at = current_timestamp()
+  where rewrite_id = :P_REWRITE_ID;
+
+  commit;
+
+  return object_construct(
+    'status','OK',
+    'rewrite_id', :P_REWRITE_ID,
+    'model_run_ids', :V_MODEL_RUN_IDS,
+    'rows_restored', :V_ROWS_RESTORED
+  );
+
+exception
+  when other then
+    rollback;
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
+end;
+$$;
+
+
+-- ========================================================================
+-- EXAMPLE USAGE
+-- ========================================================================
+
+/*
+-- Rerun a backtest: stage the new predictions, then swap them in
+create or replace temporary table TMP_BACKTEST_STAGE like DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS;
+-- ... load TMP_BACKTEST_STAGE ...
+call DB_BI_P_SANDBOX.SANDBOX.SP_REWRITE_BACKTEST_PREDICTIONS('TMP_BACKTEST_STAGE');
+
+-- Clear runs without replacement (empty stage + explicit list)
+call DB_BI_P_SANDBOX.SANDBOX.SP_REWRITE_BACKTEST_PREDICTIONS('TMP_BACKTEST_STAGE', array_construct('<model_run_id>'));
+
+-- Recent rewrites, and undo one
+select * from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BACKTEST_REWRITE_LOG order by rewritten_at desc;
+call DB_BI_P_SANDBOX.SANDBOX.SP_RESTORE_BACKTEST_REWRITE('<rewrite_id>');
+*/
@@ -0,0 +1,132 @@
+-- 21__setup__series_registry.sql
+--
+-- Integer surrogate keys for series and customer groups.
+--
+-- FORECAST_SERIES_REGISTRY: one stable series_id per (roll_up_shop, reason_group). Ids are
+-- never reused or renumbered; reason_group is stored as the aggregate delivers it (null
+-- included), so lookups use equal_null on it.
+-- FORECAST_CUST_GRP_REGISTRY: one cust_grp_id per customer group.
+--
+-- SP_REGISTER_SERIES is called by SP_EVALUATE_PC_ELIGIBILITY, so every series in
+-- FORECAST_REVENUE_AGG_MTH has an id before the actuals / dataset / scoring stages of the
+-- run resolve it. Those stages carry series_id on FORECAST_ACTUALS_PC_REASON_MTH, the model
+-- dataset, FORECAST_MODEL_BACKTEST_PREDICTIONS and the output marts.
+--
+-- Existing tables: sql/migrations/series_registry_ids.sql
+
+create sequence if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_ID_SEQ start = 1 increment = 1;
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY (
+  series_id            number not null,
+
+  roll_up_shop         string,
+  reason_group         string,
+
+  first_run_id         string,              -- run that registered the series
+  registered_at        timestamp_ntz,
+
+  primary key (series_id),
+  unique (roll_up_shop, reason_group)
+)
+cluster by (roll_up_shop);
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_GRP_REGISTRY (
+  cust_grp_id          number not null,
+  cust_grp             string,
+
+  registered_at        timestamp_ntz,
+
+  primary key (cust_grp_id),
+  unique (cust_grp)
+);
+
+merge into DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_GRP_REGISTRY t
+using (
+  select column1::number as cust_grp_id, column2::string as cust_grp
+  from values (1,'CAPX'),(2,'CCCI'),(3,'EXT'),(4,'TRANS'),(5,'UNKNOWN')
+) s
+on t.cust_grp = s.cust_grp
+when not matched then insert (cust_grp_id, cust_grp, registered_at)
+values (s.cust_grp_id, s.cust_grp, current_timestamp());
+
+---------------------------------------------------------------
+-- Register series (and customer groups) not seen before. Idempotent.
+---------------------------------------------------------------
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_REGISTER_SERIES(
+    P_RUN_ID string default null
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_NEW_SERIES number;
+  V_NEW_CUST_GRPS number;
+begin
+  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY
+  (series_id, roll_up_shop, reason_group, first_run_id, registered_at)
+  select
+    DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_ID_SEQ.nextval,
+    n.roll_up_shop, n.reason_group, :P_RUN_ID, current_timestamp()
+  from (
+    select distinct a.roll_up_shop, a.reason_group
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH a
+    where not exists (
+      select 1
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY r
+      where r.roll_up_shop = a.roll_up_shop
+        and equal_null(r.reason_group, a.reason_group)
+    )
+    order by 1, 2
+  ) n;
+
+  V_NEW_SERIES := SQLROWCOUNT;
+
+  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_GRP_REGISTRY
+  (cust_grp_id, cust_grp, registered_at)
+  select
+    (select coalesce(max(cust_grp_id), 0) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_GRP_REGISTRY)
+      + row_number() over (order by n.cust_grp),
+    n.cust_grp, current_timestamp()
+  from (
+    select distinct coalesce(a.cust_grp, 'UNKNOWN') as cust_grp
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH a
+  ) n
+  where n.cust_grp not in (select cust_grp from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_GRP_REGISTRY);
+
+  V_NEW_CUST_GRPS := SQLROWCOUNT;
+
+  return object_construct(
+    'status','OK',
+    'new_series', :V_NEW_SERIES,
+    'new_cust_grps', :V_NEW_CUST_GRPS,
+    'series_total', (select count(*) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY)
+  );
+
+exception
+  when other then
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
+end;
+$$;
+
+
+-- ========================================================================
+-- EXAMPLE USAGE
+-- ========================================================================
+
+/*
+call DB_BI_P_SANDBOX.SANDBOX.SP_REGISTER_SERIES();
+
+-- Resolve ids for a string-keyed table
+select r.series_id, a.*
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH a
+join DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY r
+  on r.roll_up_shop = a.roll_up_shop
+ and equal_null(r.reason_group, a.reason_group);
+
+select * from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_GRP_REGISTRY order by cust_grp_id;
+*/
@@ -0,0 +1,336 @@
+-- 22__proc__stage_reuse.sql
+--
+-- Input fingerprints per pipeline stage, so a rerun for the same closed month reuses
+-- the previous build instead of recomputing it.
+--
+-- SP_RUN_STAGE wraps one stage of SP_START_FORECAST_RUN. It fingerprints the stage's
+-- inputs: the revenue aggregate's month fingerprints (FORECAST_REVENUE_AGG_MTH_FINGERPRINT,
+-- the change marker for everything downstream of the source view), RNA_RCT_CONFIG_SHOP_ELIGIBILITY,
+-- FORECAST_PC_MANUAL_EXCLUSIONS, the fiscal month dim, the as-of and stage argument, and
+-- the definitions of the pipeline procedures. When the latest execution of the stage
+-- succeeded with the same fingerprint, its output is carried over to the new run_id
+-- (SP_REUSE_STAGE_OUTPUT) and the stage is not run.
+--
+-- Only the latest execution qualifies: the stages also maintain "current" tables
+-- (FORECAST_ACTUALS_PC_REASON_MTH, FORECAST_CUST_MIX_PC_REASON, cust-mix window state, ...)
+-- which hold that execution's state, so reuse never has to restore them.
+--
+-- Reuse per stage:
+--   eligibility                 copy FORECAST_PC_ELIGIBILITY / _RULES rows
+--   actuals / budget /          register the run against the same snapshot version
+--   model_dataset_pc_reason_h   (FORECAST_SNAPSHOT_REGISTRY): no rows copied
+--   cust_mix_pc_reason          copy FORECAST_CUST_MIX_PC_REASON_SNAP rows
+--
+-- FORECAST_STAGE_FINGERPRINTS keeps one row per (run_id, stage_name); the orchestrator
+-- also lists reused stages under config_snapshot:"reused_stages" in FORECAST_RUNS.
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_STAGE_FINGERPRINTS (
+  run_id               string,
+  stage_name           string,
+
+  fingerprint          number,              -- hash(inputs)
+  inputs               variant,             -- the fingerprinted components
+
+  status               string,              -- stage result:"status"
+  reused_from_run_id   string,              -- null = computed
+  stage_result         variant,
+  recorded_at          timestamp_ntz,
+
+  primary key (run_id, stage_name)
+);
+
+---------------------------------------------------------------
+-- Carry a stage's output from P_FROM_RUN_ID over to P_RUN_ID
+---------------------------------------------------------------
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_REUSE_STAGE_OUTPUT(
+    P_STAGE_NAME string,
+    P_FROM_RUN_ID string,
+    P_RUN_ID string
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_KIND string;
+  V_ROWS number default 0;
+  V_ROWS_RULES number default 0;
+begin
+  if (P_STAGE_NAME = 'eligibility') then
+    select count(*) into :V_ROWS
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_PC_ELIGIBILITY
+    where run_id = :P_FROM_RUN_ID;
+
+    if (V_ROWS = 0) then
+      return object_construct('status','MISSING','message','No eligibility rows for ' || :P_FROM_RUN_ID);
+    end if;
+
+    begin transaction;
+
+    delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_PC_ELIGIBILITY where run_id = :P_RUN_ID;
+    delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_PC_ELIGIBILITY_RULES where run_id = :P_RUN_ID;
+
+    insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_PC_ELIGIBILITY
+    (run_id, as_of_month_end, roll_up_shop, months_present_lookback, avg_rev_lookback, total_rev_lookback,
+     is_eligible, exclusion_reasons, thresholds, evaluated_at)
+    select
+      :P_RUN_ID, as_of_month_end, roll_up_shop, months_present_lookback, avg_rev_lookback, total_rev_lookback,
+      is_eligible, exclusion_reasons, thresholds, evaluated_at
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_PC_ELIGIBILITY
+    where run_id = :P_FROM_RUN_ID;
+
+    V_ROWS := SQLROWCOUNT;
+
+    insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_PC_ELIGIBILITY_RULES
+    (run_id, as_of_month_end, roll_up_shop, rule_code, rule_passed, observed_value, threshold_value, evaluated_at)
+    select
+      :P_RUN_ID, as_of_month_end, roll_up_shop, rule_code, rule_passed, observed_value, threshold_value, evaluated_at
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_PC_ELIGIBILITY_RULES
+    where run_id = :P_FROM_RUN_ID;
+
+    V_ROWS_RULES := SQLROWCOUNT;
+
+    commit;
+
+  elseif (P_STAGE_NAME in ('actuals_pc_reason_mth', 'budget_pc_reason_mth', 'model_dataset_pc_reason_h')) then
+    V_KIND := upper(P_STAGE_NAME);
+
+    select count(*) into :V_ROWS
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY
+    where snapshot_kind = :V_KIND
+      and run_id = :P_FROM_RUN_ID;
+
+    if (V_ROWS = 0) then
+      return object_construct('status','MISSING','message','No ' || :V_KIND || ' snapshot for ' || :P_FROM_RUN_ID);
+    end if;
+
+    begin transaction;
+
+    delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY
+    where snapshot_kind = :V_KIND
+      and run_id = :P_RUN_ID;
+
+    -- Same snap_seq: the run sees exactly the versions the source run saw
+    insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY
+    (snapshot_kind, run_id, asof_fiscal_yyyymm, snap_seq, month_seq_start, month_seq_end,
+     rows_full, rows_delta, snapshotted_at)
+    select
+      snapshot_kind, :P_RUN_ID, asof_fiscal_yyyymm, snap_seq, month_seq_start, month_seq_end,
+      rows_full, 0, current_timestamp()
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SNAPSHOT_REGISTRY
+    where snapshot_kind = :V_KIND
+      and run_id = :P_FROM_RUN_ID;
+
+    commit;
+
+    V_ROWS := 0;    -- reference only
+
+  elseif (P_STAGE_NAME = 'cust_mix_pc_reason') then
+    select count(*) into :V_ROWS
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_PC_REASON_SNAP
+    where run_id = :P_FROM_RUN_ID;
+
+    if (V_ROWS = 0) then
+      return object_construct('status','MISSING','message','No cust mix snapshot for ' || :P_FROM_RUN_ID);
+    end if;
+
+    begin transaction;
+
+    delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_PC_REASON_SNAP where run_id = :P_RUN_ID;
+
+    insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_PC_REASON_SNAP
+    (run_id, asof_fiscal_yyyymm,
+     roll_up_shop, reason_group, cust_grp,
+     allocation_level, share_abs_rev, numerator_abs_rev, denominator_abs_rev,
+     months_present, nonzero_months, thresholds, source_object, snapshotted_at, row_hash)
+    select
+      :P_RUN_ID, asof_fiscal_yyyymm,
+      roll_up_shop, reason_group, cust_grp,
+      allocation_level, share_abs_rev, numerator_abs_rev, denominator_abs_rev,
+      months_present, nonzero_months, thresholds, source_object, current_timestamp(), row_hash
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_PC_REASON_SNAP
+    where run_id = :P_FROM_RUN_ID;
+
+    V_ROWS := SQLROWCOUNT;
+
+    commit;
+
+  else
+    return object_construct('status','ERROR','message','Unknown stage: ' || coalesce(:P_STAGE_NAME, 'null'));
+  end if;
+
+  return object_construct(
+    'status','OK',
+    'stage_name', :P_STAGE_NAME,
+    'reused_from_run_id', :P_FROM_RUN_ID,
+    'rows_written', :V_ROWS + :V_ROWS_RULES
+  );
+
+exception
+  when other then
+    rollback;
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
+end;
+$$;
+
+---------------------------------------------------------------
+-- P_STAGE_NAME: eligibility | actuals_pc_reason_mth | budget_pc_reason_mth |
+--               cust_mix_pc_reason | model_dataset_pc_reason_h
+-- P_STAGE_ARG:  the stage's numeric argument (history months / max horizon), if any
+-- P_ALLOW_REUSE: false forces the stage to run (fingerprint still recorded)
+---------------------------------------------------------------
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_RUN_STAGE(
+    P_STAGE_NAME string,
+    P_RUN_ID string,
+    P_ASOF_FISCAL_YYYYMM number,
+    P_STAGE_ARG number default null,
+    P_ALLOW_REUSE boolean default true
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_INPUTS variant;
+  V_FINGERPRINT number;
+
+  V_PREV_RUN_ID string;
+  V_PREV_FINGERPRINT number;
+  V_PREV_STATUS string;
+  V_PREV_RESULT variant;
+
+  V_REUSE variant;
+  V_REUSED_ROWS number;
+  V_RES variant;
+  V_STATUS string;
+  V_REUSED_FROM string;
+begin
+  -- 1) Fingerprint the inputs (all cheap: ~one row per fiscal month / config row / proc)
+  select inputs, hash(inputs)
+    into :V_INPUTS, :V_FINGERPRINT
+  from (
+    select object_construct(
+      'stage_name', :P_STAGE_NAME,
+      'asof_fiscal_yyyymm', :P_ASOF_FISCAL_YYYYMM,
+      'stage_arg', :P_STAGE_ARG,
+      'revenue_agg_fp', (select hash_agg(fiscal_yyyymm, fingerprint, source_rows)
+                         from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH_FINGERPRINT),
+      'config_fp', (select hash_agg(*) from DB_BI_P_SANDBOX.SANDBOX.RNA_RCT_CONFIG_SHOP_ELIGIBILITY),
+      'manual_exclusions_fp', (select hash_agg(*) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_PC_MANUAL_EXCLUSIONS),
+      'fiscal_month_dim_fp', (select hash_agg(*) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_FISCAL_MONTH_DIM),
+      -- every stage reads upstream stage output, so any pipeline code change invalidates all
+      'code_fp', (select hash_agg(procedure_name, argument_signature, procedure_definition)
+                  from DB_BI_P_SANDBOX.information_schema.procedures
+                  where procedure_schema = 'SANDBOX'
+                    and procedure_name in ('SP_EVALUATE_PC_ELIGIBILITY', 'SP_REGISTER_SERIES',
+                                           'SP_BUILD_ACTUALS_PC_REASON_MTH', 'SP_BUILD_BUDGET_PC_REASON_MTH',
+                                           'SP_WRITE_PC_REASON_MTH_SNAPSHOT', 'SP_BUILD_CUST_MIX_PC_REASON',
+                                           'SP_BUILD_MODEL_DATASET_PC_REASON_H'))
+    ) as inputs
+  );
+
+  -- 2) Latest execution of this stage by another run
+  select
+    max_by(run_id, recorded_at),
+    max_by(fingerprint, recorded_at),
+    max_by(status, recorded_at),
+    max_by(stage_result, recorded_at)
+    into :V_PREV_RUN_ID, :V_PREV_FINGERPRINT, :V_PREV_STATUS, :V_PREV_RESULT
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_STAGE_FINGERPRINTS
+  where stage_name = :P_STAGE_NAME
+    and run_id <> :P_RUN_ID;
+
+  if (P_ALLOW_REUSE and V_PREV_STATUS = 'OK' and V_PREV_FINGERPRINT = V_FINGERPRINT) then
+    call DB_BI_P_SANDBOX.SANDBOX.SP_REUSE_STAGE_OUTPUT(:P_STAGE_NAME, :V_PREV_RUN_ID, :P_RUN_ID);
+    select $1 into :V_REUSE from table(result_scan(last_query_id()));
+
+    if (V_REUSE:"status"::string = 'OK') then
+      V_REUSED_FROM := V_PREV_RUN_ID;
+      V_REUSED_ROWS := V_REUSE:"rows_written"::number;
+      select object_construct(
+               'status','OK',
+               'run_id', :P_RUN_ID,
+               'asof_fiscal_yyyymm', :P_ASOF_FISCAL_YYYYMM,
+               'reused_from_run_id', :V_PREV_RUN_ID,
+               'rows_written', :V_REUSED_ROWS,
+               'source_result', :V_PREV_RESULT)
+        into :V_RES;
+    end if;
+  end if;
+
+  -- 3) No match (or the source output is gone): run the stage
+  if (V_REUSED_FROM is null) then
+    if (P_STAGE_NAME = 'eligibility') then
+      call DB_BI_P_SANDBOX.SANDBOX.SP_EVALUATE_PC_ELIGIBILITY(:P_RUN_ID, :P_ASOF_FISCAL_YYYYMM);
+    elseif (P_STAGE_NAME = 'actuals_pc_reason_mth') then
+      call DB_BI_P_SANDBOX.SANDBOX.SP_BUILD_ACTUALS_PC_REASON_MTH(:P_RUN_ID, :P_ASOF_FISCAL_YYYYMM, :P_STAGE_ARG);
+    elseif (P_STAGE_NAME = 'budget_pc_reason_mth') then
+      call DB_BI_P_SANDBOX.SANDBOX.SP_BUILD_BUDGET_PC_REASON_MTH(:P_RUN_ID, :P_ASOF_FISCAL_YYYYMM, :P_STAGE_ARG);
+    elseif (P_STAGE_NAME = 'cust_mix_pc_reason') then
+      call DB_BI_P_SANDBOX.SANDBOX.SP_BUILD_CUST_MIX_PC_REASON(:P_RUN_ID, :P_ASOF_FISCAL_YYYYMM);
+    elseif (P_STAGE_NAME = 'model_dataset_pc_reason_h') then
+      call DB_BI_P_SANDBOX.SANDBOX.SP_BUILD_MODEL_DATASET_PC_REASON_H(:P_RUN_ID, :P_ASOF_FISCAL_YYYYMM, :P_STAGE_ARG);
+    else
+      return object_construct('status','ERROR','message','Unknown stage: ' || coalesce(:P_STAGE_NAME, 'null'));
+    end if;
+    select $1 into :V_RES from table(result_scan(last_query_id()));
+  end if;
+
+  V_STATUS := V_RES:"status"::string;
+
+  merge into DB_BI_P_SANDBOX.SANDBOX.FORECAST_STAGE_FINGERPRINTS t
+  using (select :P_RUN_ID as run_id, :P_STAGE_NAME as stage_name) s
+  on t.run_id = s.run_id and t.stage_name = s.stage_name
+  when matched then update set
+    fingerprint        = :V_FINGERPRINT,
+    inputs             = :V_INPUTS,
+    status             = :V_STATUS,
+    reused_from_run_id = :V_REUSED_FROM,
+    stage_result       = :V_RES,
+    recorded_at        = current_timestamp()
+  when not matched then insert
+    (run_id, stage_name, fingerprint, inputs, status, reused_from_run_id, stage_result, recorded_at)
+  values
+    (s.run_id, s.stage_name, :V_FINGERPRINT, :V_INPUTS, :V_STATUS, :V_REUSED_FROM, :V_RES, current_timestamp());
+
+  return V_RES;
+
+exception
+  when other then
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
+end;
+$$;
+
+
+-- ========================================================================
+-- EXAMPLE USAGE
+-- ========================================================================
+
+/*
+-- One stage by hand (reuses the previous build when the inputs are unchanged)
+call DB_BI_P_SANDBOX.SANDBOX.SP_RUN_STAGE('eligibility', '<run_id>', 202501);
+
+-- Force a rebuild
+call DB_BI_P_SANDBOX.SANDBOX.SP_RUN_STAGE('model_dataset_pc_reason_h', '<run_id>', 202501, 12, false);
+
+-- Which stages of the latest runs were reused, and from where
+select f.run_id, f.stage_name, f.reused_from_run_id, f.status, f.recorded_at
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_STAGE_FINGERPRINTS f
+order by f.recorded_at desc
+limit 50;
+
+-- Why a stage was recomputed: compare its inputs with the previous execution
+select run_id, inputs
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_STAGE_FINGERPRINTS
+where stage_name = 'actuals_pc_reason_mth'
+order by recorded_at desc
+limit 2;
+*/
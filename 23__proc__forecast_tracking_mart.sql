@@ -0,0 +1,361 @@
+-- 23__proc__forecast_tracking_mart.sql
+--
+-- Live forecast-vs-actual tracking.
+--
+-- FORECAST_TRACKING_PC_REASON_MTH: every published PC x reason forecast
+-- (FORECAST_OUTPUT_PC_REASON_MTH), with y_true filled in once its target month closes.
+-- Reruns for the same as-of stay in the mart; only the latest publish per as-of
+-- (is_latest_for_asof) counts towards accuracy.
+--
+-- FORECAST_TRACKING_WAPE_MTH: accumulators per (horizon, target month) -- sum of absolute
+-- error, of absolute actuals and of signed error -- plus rolling 3 / 6 / 12 month WAPE
+-- and 12 month bias computed from them. Dashboards read this table (a dozen rows per
+-- month) instead of joining all published runs back to actuals.
+--
+-- Maintenance is incremental:
+--   SP_TRACK_PUBLISHED_FORECASTS  called by SP_SCORE_AND_PUBLISH_FORECASTS after a publish
+--   SP_FILL_TRACKING_ACTUALS      called by SP_START_FORECAST_RUN once actuals are built;
+--                                 MERGEs the actual for one target month only and refreshes
+--                                 that month's accumulators and the rolling windows over it
+--
+-- Forecasts of series without an actual row for a closed month are scored against 0
+-- (no revenue booked). Scoring writes null reason groups as 'TOTAL'.
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_PC_REASON_MTH (
+  forecast_run_id      string,
+  asof_fiscal_yyyymm   number,
+
+  roll_up_shop         string,
+  reason_group         string,
+  series_id            number,              -- FORECAST_SERIES_REGISTRY
+
+  target_fiscal_yyyymm number,
+  target_month_seq     number,
+  horizon              number,
+
+  revenue_forecast     number(18,2),
+  revenue_forecast_lo  number(18,2),
+  revenue_forecast_hi  number(18,2),
+
+  model_run_id         string,
+  model_family         string,
+  model_scope          string,
+  published_at         timestamp_ntz,
+  is_latest_for_asof   boolean,
+
+  y_true               number(18,2),        -- null until the target month closes
+  abs_err              number(18,2),
+  actual_filled_at     timestamp_ntz,
+
+  primary key (forecast_run_id, roll_up_shop, reason_group, target_fiscal_yyyymm)
+)
+cluster by (target_fiscal_yyyymm);
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_WAPE_MTH (
+  horizon              number,
+  target_month_seq     number,
+  target_fiscal_yyyymm number,
+
+  n_forecasts          number,
+  sum_abs_err          number(38,2),
+  sum_abs_actual       number(38,2),
+  sum_err              number(38,2),        -- forecast - actual
+
+  wape_mth             float,
+  wape_roll_3          float,
+  wape_roll_6          float,
+  wape_roll_12         float,
+  bias_roll_12         float,               -- sum_err / sum_abs_actual over 12 months
+
+  updated_at           timestamp_ntz,
+
+  primary key (horizon, target_month_seq)
+);
+
+---------------------------------------------------------------
+-- Fill actuals for one closed target month (default: latest closed month)
+---------------------------------------------------------------
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_FILL_TRACKING_ACTUALS(
+    P_TARGET_FISCAL_YYYYMM number default null
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_TARGET_YYYYMM number;
+  V_TARGET_SEQ number;
+  V_ROWS_FILLED number;
+  V_HORIZONS number;
+begin
+  if (P_TARGET_FISCAL_YYYYMM is null) then
+    select fiscal_yyyymm, month_seq
+      into :V_TARGET_YYYYMM, :V_TARGET_SEQ
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ASOF_FISCAL_MONTH;
+  else
+    select fiscal_yyyymm, month_seq
+      into :V_TARGET_YYYYMM, :V_TARGET_SEQ
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_FISCAL_MONTH_DIM
+    where fiscal_yyyymm = :P_TARGET_FISCAL_YYYYMM;
+  end if;
+
+  if (V_TARGET_YYYYMM is null) then
+    return object_construct('status','ERROR','message','Could not resolve target fiscal month.');
+  end if;
+
+  begin transaction;
+
+  -- Only the target month's rows are touched (clustered by target_fiscal_yyyymm)
+  merge into DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_PC_REASON_MTH t
+  using (
+    select
+      f.forecast_run_id,
+      f.roll_up_shop,
+      f.reason_group,
+      f.target_fiscal_yyyymm,
+      coalesce(a.total_revenue, 0) as y_true,
+      abs(f.revenue_forecast - coalesce(a.total_revenue, 0)) as abs_err
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_PC_REASON_MTH f
+    left join DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH a
+      on a.fiscal_yyyymm = f.target_fiscal_yyyymm
+     and a.roll_up_shop = f.roll_up_shop
+     and equal_null(a.reason_group, nullif(f.reason_group, 'TOTAL'))
+    where f.target_fiscal_yyyymm = :V_TARGET_YYYYMM
+  ) s
+  on  t.forecast_run_id      = s.forecast_run_id
+  and t.roll_up_shop         = s.roll_up_shop
+  and t.reason_group         = s.reason_group
+  and t.target_fiscal_yyyymm = s.target_fiscal_yyyymm
+  when matched and not equal_null(t.y_true, s.y_true) then update set
+    y_true           = s.y_true,
+    abs_err          = s.abs_err,
+    actual_filled_at = current_timestamp();
+
+  V_ROWS_FILLED := SQLROWCOUNT;
+
+  -- This month's accumulators
+  delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_WAPE_MTH
+  where target_month_seq = :V_TARGET_SEQ;
+
+  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_WAPE_MTH
+  (horizon, target_month_seq, target_fiscal_yyyymm,
+   n_forecasts, sum_abs_err, sum_abs_actual, sum_err, wape_mth, updated_at)
+  select
+    horizon,
+    :V_TARGET_SEQ,
+    :V_TARGET_YYYYMM,
+    count(*),
+    sum(abs_err),
+    sum(abs(y_true)),
+    sum(revenue_forecast - y_true),
+    sum(abs_err) / nullif(sum(abs(y_true)), 0),
+    current_timestamp()
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_PC_REASON_MTH
+  where target_fiscal_yyyymm = :V_TARGET_YYYYMM
+    and is_latest_for_asof
+    and y_true is not null
+  group by horizon;
+
+  V_HORIZONS := SQLROWCOUNT;
+
+  -- Rolling windows that include this month (it and the 11 after it), from the accumulators
+  merge into DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_WAPE_MTH t
+  using (
+    select
+      w.horizon,
+      w.target_month_seq,
+      sum(iff(p.target_month_seq > w.target_month_seq - 3, p.sum_abs_err, 0))
+        / nullif(sum(iff(p.target_month_seq > w.target_month_seq - 3, p.sum_abs_actual, 0)), 0) as wape_roll_3,
+      sum(iff(p.target_month_seq > w.target_month_seq - 6, p.sum_abs_err, 0))
+        / nullif(sum(iff(p.target_month_seq > w.target_month_seq - 6, p.sum_abs_actual, 0)), 0) as wape_roll_6,
+      sum(p.sum_abs_err) / nullif(sum(p.sum_abs_actual), 0) as wape_roll_12,
+      sum(p.sum_err) / nullif(sum(p.sum_abs_actual), 0) as bias_roll_12
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_WAPE_MTH w
+    join DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_WAPE_MTH p
+      on p.horizon = w.horizon
+     and p.target_month_seq between w.target_month_seq - 11 and w.target_month_seq
+    where w.target_month_seq between :V_TARGET_SEQ and :V_TARGET_SEQ + 11
+    group by 1, 2
+  ) s
+  on t.horizon = s.horizon and t.target_month_seq = s.target_month_seq
+  when matched then update set
+    wape_roll_3  = s.wape_roll_3,
+    wape_roll_6  = s.wape_roll_6,
+    wape_roll_12 = s.wape_roll_12,
+    bias_roll_12 = s.bias_roll_12,
+    updated_at   = current_timestamp();
+
+  commit;
+
+  return object_construct(
+    'status','OK',
+    'target_fiscal_yyyymm', :V_TARGET_YYYYMM,
+    'rows_filled', :V_ROWS_FILLED,
+    'horizons', :V_HORIZONS
+  );
+
+exception
+  when other then
+    rollback;
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
+end;
+$$;
+
+---------------------------------------------------------------
+-- Add a publish to the mart (P_FORECAST_RUN_ID null = every publish not tracked yet,
+-- e.g. the initial load). Target months that are already closed are filled right away.
+---------------------------------------------------------------
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_TRACK_PUBLISHED_FORECASTS(
+    P_FORECAST_RUN_ID string default null
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_ROWS_TRACKED number;
+  V_CLOSED_SEQ number;
+  V_MONTHS_FILLED number default 0;
+  V_FILL variant;
+begin
+  create or replace temporary table TMP_TRACK_NEW as
+  select
+    o.forecast_run_id,
+    o.asof_fiscal_yyyymm,
+    o.roll_up_shop,
+    o.reason_group,
+    o.series_id,
+    o.target_fiscal_yyyymm,
+    o.target_month_seq,
+    o.horizon,
+    o.revenue_forecast,
+    o.revenue_forecast_lo,
+    o.revenue_forecast_hi,
+    o.model_run_id,
+    o.model_family,
+    o.model_scope,
+    o.published_at
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH o
+  where (:P_FORECAST_RUN_ID is null or o.forecast_run_id = :P_FORECAST_RUN_ID)
+    and not exists (
+      select 1
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_PC_REASON_MTH t
+      where t.forecast_run_id = o.forecast_run_id
+    );
+
+  -- Latest publish per as-of, over the mart and the new rows
+  create or replace temporary table TMP_TRACK_LATEST as
+  select asof_fiscal_yyyymm, max_by(forecast_run_id, published_at) as forecast_run_id
+  from (
+    select asof_fiscal_yyyymm, forecast_run_id, max(published_at) as published_at
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_PC_REASON_MTH
+    where asof_fiscal_yyyymm in (select asof_fiscal_yyyymm from TMP_TRACK_NEW)
+    group by 1, 2
+    union all
+    select asof_fiscal_yyyymm, forecast_run_id, max(published_at)
+    from TMP_TRACK_NEW
+    group by 1, 2
+  )
+  group by 1;
+
+  select month_seq into :V_CLOSED_SEQ
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ASOF_FISCAL_MONTH;
+
+  begin transaction;
+
+  insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_PC_REASON_MTH
+  (forecast_run_id, asof_fiscal_yyyymm, roll_up_shop, reason_group, series_id,
+   target_fiscal_yyyymm, target_month_seq, horizon,
+   revenue_forecast, revenue_forecast_lo, revenue_forecast_hi,
+   model_run_id, model_family, model_scope, published_at, is_latest_for_asof)
+  select
+    n.forecast_run_id, n.asof_fiscal_yyyymm, n.roll_up_shop, n.reason_group, n.series_id,
+    n.target_fiscal_yyyymm, n.target_month_seq, n.horizon,
+    n.revenue_forecast, n.revenue_forecast_lo, n.revenue_forecast_hi,
+    n.model_run_id, n.model_family, n.model_scope, n.published_at,
+    (l.forecast_run_id is not null)
+  from TMP_TRACK_NEW n
+  left join TMP_TRACK_LATEST l
+    on l.asof_fiscal_yyyymm = n.asof_fiscal_yyyymm
+   and l.forecast_run_id = n.forecast_run_id
+  order by n.target_fiscal_yyyymm;
+
+  V_ROWS_TRACKED := SQLROWCOUNT;
+
+  -- Superseded publishes of the same as-of stop counting
+  update DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_PC_REASON_MTH t
+  set is_latest_for_asof = false
+  from TMP_TRACK_LATEST l
+  where t.asof_fiscal_yyyymm = l.asof_fiscal_yyyymm
+    and t.forecast_run_id <> l.forecast_run_id
+    and t.is_latest_for_asof;
+
+  commit;
+
+  -- Closed target months touched by this publish (only backfills / late publishes have any)
+  let months resultset := (
+    select distinct t.target_fiscal_yyyymm
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_PC_REASON_MTH t
+    where t.asof_fiscal_yyyymm in (select asof_fiscal_yyyymm from TMP_TRACK_LATEST)
+      and t.target_month_seq <= :V_CLOSED_SEQ
+    order by 1
+  );
+  let c cursor for months;
+
+  for m in c do
+    let v_month number := m.target_fiscal_yyyymm;
+    call DB_BI_P_SANDBOX.SANDBOX.SP_FILL_TRACKING_ACTUALS(:v_month);
+    select $1 into :V_FILL from table(result_scan(last_query_id()));
+    if (V_FILL:"status"::string <> 'OK') then
+      return object_construct('status','ERROR','message','Fill failed for ' || :v_month || ': ' || coalesce(V_FILL:"message"::string, ''),
+                              'rows_tracked', :V_ROWS_TRACKED);
+    end if;
+    V_MONTHS_FILLED := V_MONTHS_FILLED + 1;
+  end for;
+
+  return object_construct(
+    'status','OK',
+    'forecast_run_id', :P_FORECAST_RUN_ID,
+    'rows_tracked', :V_ROWS_TRACKED,
+    'closed_months_filled', :V_MONTHS_FILLED
+  );
+
+exception
+  when other then
+    rollback;
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
+end;
+$$;
+
+
+-- ========================================================================
+-- EXAMPLE USAGE
+-- ========================================================================
+
+/*
+-- Initial load: every publish so far (fills all closed target months)
+call DB_BI_P_SANDBOX.SANDBOX.SP_TRACK_PUBLISHED_FORECASTS();
+
+-- Re-fill one month after an actuals restatement
+call DB_BI_P_SANDBOX.SANDBOX.SP_FILL_TRACKING_ACTUALS(202501);
+
+-- Live accuracy by horizon, latest closed month
+select horizon, n_forecasts, wape_mth, wape_roll_3, wape_roll_6, wape_roll_12, bias_roll_12
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_WAPE_MTH
+where target_month_seq = (select max(target_month_seq) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_WAPE_MTH)
+order by horizon;
+
+-- Forecast vs actual for one PC
+select asof_fiscal_yyyymm, target_fiscal_yyyymm, horizon, reason_group, revenue_forecast, y_true, abs_err
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_TRACKING_PC_REASON_MTH
+where roll_up_shop = '<pc>' and is_latest_for_asof and y_true is not null
+order by target_fiscal_yyyymm, horizon;
+*/
@@ -0,0 +1,362 @@
+-- 24__proc__forecast_revision_mart.sql
+--
+-- Why did the forecast move? Revisions between consecutive publishes, built at publish
+-- time by SP_SCORE_AND_PUBLISH_FORECASTS.
+--
+-- FORECAST_REVISION_RUNS: one row per publish with the publish it is compared to, so the
+-- previous run is a lookup here rather than a scan of FORECAST_OUTPUT_PC_REASON_MTH.
+--
+-- FORECAST_REVISION_PC_REASON_MTH: per series and target month, the previous and new
+-- forecast, the delta and its cause. The diff is a keyed full outer join of the two
+-- forecast_run_ids; customer mix shifts come from FORECAST_CUST_MIX_PC_REASON_SNAP of the
+-- two run_ids.
+--
+-- cause (first that applies; causes lists all of them, except that a NEW_SERIES /
+-- DROPPED_SERIES / HORIZON_ROLL row has no other side to compare champion, as-of or
+-- inputs with):
+--   NEW_SERIES       series not in the previous publish (at any target month)
+--   DROPPED_SERIES   series no longer published (at any target month)
+--   HORIZON_ROLL     series in both publishes, target month in one only: the as-of
+--                    moved, so the closed month left the horizon and a new one entered
+--   CHAMPION_CHANGE  forecast from a different model run
+--   NEW_ACTUAL       as-of moved on: a new closed month entered the history
+--   INPUT_CHANGE     same as-of and champion, forecast moved (restated actuals / budget)
+--   MIX_CHANGE       PC x reason forecast unchanged, customer split moved
+--   NO_CHANGE
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_RUNS (
+  forecast_run_id          string,
+  run_id                   string,          -- pipeline run scored (FORECAST_RUNS)
+  asof_fiscal_yyyymm       number,
+  published_at             timestamp_ntz,
+
+  prev_forecast_run_id     string,          -- null = first publish
+  prev_run_id              string,
+  prev_asof_fiscal_yyyymm  number,
+
+  rows_compared            number,
+  cause_counts             variant,         -- cause -> series x target rows
+  total_delta              number(18,2),    -- sum(new) - sum(prev)
+  built_at                 timestamp_ntz,
+
+  primary key (forecast_run_id)
+);
+
+create table if not exists DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_PC_REASON_MTH (
+  forecast_run_id          string,
+  prev_forecast_run_id     string,
+  asof_fiscal_yyyymm       number,
+  prev_asof_fiscal_yyyymm  number,
+
+  roll_up_shop             string,
+  reason_group             string,
+  series_id                number,          -- FORECAST_SERIES_REGISTRY
+
+  target_fiscal_yyyymm     number,
+  horizon                  number,          -- in the new publish (prev_horizon in the previous one)
+  prev_horizon             number,
+
+  forecast_prev            number(18,2),
+  forecast_new             number(18,2),
+  delta                    number(18,2),    -- new - prev (missing side counts as 0)
+  delta_pct                float,           -- delta / abs(prev)
+
+  model_run_id_prev        string,
+  model_run_id_new         string,
+  model_family_prev        string,
+  model_family_new         string,
+
+  latest_actual            number(18,2),    -- actual of the new as-of month
+  prev_forecast_of_latest  number(18,2),    -- what the previous publish said for that month
+  max_mix_share_shift      float,           -- max |share change| across customer groups
+
+  cause                    string,
+  causes                   array,
+
+  built_at                 timestamp_ntz,
+
+  primary key (forecast_run_id, roll_up_shop, reason_group, target_fiscal_yyyymm)
+)
+cluster by (forecast_run_id);
+
+---------------------------------------------------------------
+-- P_RUN_ID: pipeline run the publish scored (for the customer mix snapshot)
+---------------------------------------------------------------
+create or replace procedure DB_BI_P_SANDBOX.SANDBOX.SP_BUILD_FORECAST_REVISIONS(
+    P_FORECAST_RUN_ID string,
+    P_RUN_ID string default null
+)
+returns variant
+language sql
+execute as caller
+as
+$$
+declare
+  V_ASOF_YYYYMM number;
+  V_PUBLISHED_AT timestamp_ntz;
+
+  V_PREV_FORECAST_RUN_ID string;
+  V_PREV_RUN_ID string;
+  V_PREV_ASOF_YYYYMM number;
+
+  V_ROWS number default 0;
+begin
+  select max(asof_fiscal_yyyymm), max(published_at)
+    into :V_ASOF_YYYYMM, :V_PUBLISHED_AT
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH
+  where forecast_run_id = :P_FORECAST_RUN_ID;
+
+  if (V_ASOF_YYYYMM is null) then
+    return object_construct('status','ERROR','message','No published rows for forecast_run_id ' || coalesce(:P_FORECAST_RUN_ID, 'null'));
+  end if;
+
+  -- Previous publish: the latest one recorded before this one
+  select max_by(forecast_run_id, published_at), max_by(run_id, published_at), max_by(asof_fiscal_yyyymm, published_at)
+    into :V_PREV_FORECAST_RUN_ID, :V_PREV_RUN_ID, :V_PREV_ASOF_YYYYMM
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_RUNS
+  where forecast_run_id <> :P_FORECAST_RUN_ID
+    and published_at <= :V_PUBLISHED_AT;
+
+  if (V_PREV_FORECAST_RUN_ID is not null) then
+    -- Customer mix shift per series between the two runs' snapshots
+    create or replace temporary table TMP_REV_MIX as
+    select
+      coalesce(n.roll_up_shop, p.roll_up_shop) as roll_up_shop,
+      coalesce(n.reason_group, p.reason_group) as reason_group,
+      max(abs(coalesce(n.share_abs_rev, 0) - coalesce(p.share_abs_rev, 0))) as max_share_shift
+    from (
+      select roll_up_shop, reason_group, cust_grp, share_abs_rev
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_PC_REASON_SNAP
+      where run_id = :P_RUN_ID
+    ) n
+    full outer join (
+      select roll_up_shop, reason_group, cust_grp, share_abs_rev
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_MIX_PC_REASON_SNAP
+      where run_id = :V_PREV_RUN_ID
+    ) p
+      on p.roll_up_shop = n.roll_up_shop
+     and p.reason_group = n.reason_group
+     and p.cust_grp = n.cust_grp
+    where :P_RUN_ID is not null
+      and :V_PREV_RUN_ID is not null   -- no snapshot to compare against: no mix shift
+    group by 1, 2;
+
+    create or replace temporary table TMP_REV as
+    with
+    n as (
+      select *
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH
+      where forecast_run_id = :P_FORECAST_RUN_ID
+    ),
+    p as (
+      select *
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH
+      where forecast_run_id = :V_PREV_FORECAST_RUN_ID
+    ),
+    diff as (
+      select
+        coalesce(n.roll_up_shop, p.roll_up_shop) as roll_up_shop,
+        coalesce(n.reason_group, p.reason_group) as reason_group,
+        coalesce(n.series_id, p.series_id) as series_id,
+        coalesce(n.target_fiscal_yyyymm, p.target_fiscal_yyyymm) as target_fiscal_yyyymm,
+        n.horizon,
+        p.horizon as prev_horizon,
+        p.revenue_forecast as forecast_prev,
+        n.revenue_forecast as forecast_new,
+        p.model_run_id as model_run_id_prev,
+        n.model_run_id as model_run_id_new,
+        p.model_family as model_family_prev,
+        n.model_family as model_family_new,
+        (p.roll_up_shop is not null) as in_prev,
+        (n.roll_up_shop is not null) as in_new
+      from n
+      full outer join p
+        on p.roll_up_shop = n.roll_up_shop
+       and p.reason_group = n.reason_group
+       and p.target_fiscal_yyyymm = n.target_fiscal_yyyymm
+    ),
+    -- Series presence is decided over the whole other publish, not per target month
+    p_series as (
+      select distinct roll_up_shop, reason_group from p
+    ),
+    n_series as (
+      select distinct roll_up_shop, reason_group from n
+    ),
+    -- The previous publish's forecast of the month that has since closed
+    prev_of_latest as (
+      select roll_up_shop, reason_group, revenue_forecast
+      from p
+      where target_fiscal_yyyymm = :V_ASOF_YYYYMM
+    ),
+    d as (
+      select
+        diff.*,
+        (ps.roll_up_shop is not null) as series_in_prev,
+        (ns.roll_up_shop is not null) as series_in_new,
+        coalesce(forecast_new, 0) - coalesce(forecast_prev, 0) as delta,
+        coalesce(m.max_share_shift, 0) as max_mix_share_shift,
+        a.total_revenue as latest_actual,
+        pl.revenue_forecast as prev_forecast_of_latest
+      from diff
+      left join p_series ps
+        on ps.roll_up_shop = diff.roll_up_shop
+       and ps.reason_group = diff.reason_group
+      left join n_series ns
+        on ns.roll_up_shop = diff.roll_up_shop
+       and ns.reason_group = diff.reason_group
+      left join TMP_REV_MIX m
+        on m.roll_up_shop = diff.roll_up_shop
+       and m.reason_group = diff.reason_group
+      left join DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH a
+        on a.fiscal_yyyymm = :V_ASOF_YYYYMM
+       and a.roll_up_shop = diff.roll_up_shop
+       and equal_null(a.reason_group, nullif(diff.reason_group, 'TOTAL'))   -- scoring writes null reasons as 'TOTAL'
+      left join prev_of_latest pl
+        on pl.roll_up_shop = diff.roll_up_shop
+       and pl.reason_group = diff.reason_group
+    )
+    select
+      :P_FORECAST_RUN_ID::string as forecast_run_id,
+      :V_PREV_FORECAST_RUN_ID::string as prev_forecast_run_id,
+      :V_ASOF_YYYYMM as asof_fiscal_yyyymm,
+      :V_PREV_ASOF_YYYYMM as prev_asof_fiscal_yyyymm,
+      roll_up_shop,
+      reason_group,
+      series_id,
+      target_fiscal_yyyymm,
+      horizon,
+      prev_horizon,
+      forecast_prev,
+      forecast_new,
+      delta,
+      delta / nullif(abs(forecast_prev), 0) as delta_pct,
+      model_run_id_prev,
+      model_run_id_new,
+      model_family_prev,
+      model_family_new,
+      latest_actual,
+      prev_forecast_of_latest,
+      max_mix_share_shift,
+      case
+        when not series_in_prev then 'NEW_SERIES'
+        when not series_in_new then 'DROPPED_SERIES'
+        when not (in_prev and in_new) then 'HORIZON_ROLL'
+        when model_run_id_new <> model_run_id_prev then 'CHAMPION_CHANGE'
+        when :V_ASOF_YYYYMM > :V_PREV_ASOF_YYYYMM then 'NEW_ACTUAL'
+        when delta <> 0 then 'INPUT_CHANGE'
+        when max_mix_share_shift > 0 then 'MIX_CHANGE'
+        else 'NO_CHANGE'
+      end as cause,
+      array_construct_compact(
+        iff(not series_in_prev, 'NEW_SERIES', null),
+        iff(not series_in_new, 'DROPPED_SERIES', null),
+        iff(series_in_prev and series_in_new and not (in_prev and in_new), 'HORIZON_ROLL', null),
+        iff(in_prev and in_new and model_run_id_new <> model_run_id_prev, 'CHAMPION_CHANGE', null),
+        iff(in_prev and in_new and :V_ASOF_YYYYMM > :V_PREV_ASOF_YYYYMM, 'NEW_ACTUAL', null),
+        iff(in_prev and in_new and delta <> 0 and model_run_id_new = model_run_id_prev
+            and :V_ASOF_YYYYMM = :V_PREV_ASOF_YYYYMM, 'INPUT_CHANGE', null),
+        iff(max_mix_share_shift > 0, 'MIX_CHANGE', null)
+      ) as causes,
+      current_timestamp() as built_at
+    from d;
+
+    begin transaction;
+
+    delete from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_PC_REASON_MTH
+    where forecast_run_id = :P_FORECAST_RUN_ID;
+
+    insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_PC_REASON_MTH
+    select * from TMP_REV;
+
+    V_ROWS := SQLROWCOUNT;
+
+    commit;
+  end if;
+
+  merge into DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_RUNS t
+  using (
+    select
+      :P_FORECAST_RUN_ID as forecast_run_id,
+      :P_RUN_ID as run_id,
+      :V_ASOF_YYYYMM as asof_fiscal_yyyymm,
+      :V_PUBLISHED_AT as published_at,
+      :V_PREV_FORECAST_RUN_ID as prev_forecast_run_id,
+      :V_PREV_RUN_ID as prev_run_id,
+      :V_PREV_ASOF_YYYYMM as prev_asof_fiscal_yyyymm,
+      :V_ROWS as rows_compared,
+      (select object_agg(cause, n::variant)
+       from (select cause, count(*) as n
+             from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_PC_REASON_MTH
+             where forecast_run_id = :P_FORECAST_RUN_ID
+             group by 1)) as cause_counts,
+      (select sum(delta)
+       from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_PC_REASON_MTH
+       where forecast_run_id = :P_FORECAST_RUN_ID) as total_delta
+  ) s
+  on t.forecast_run_id = s.forecast_run_id
+  when matched then update set
+    run_id                  = s.run_id,
+    asof_fiscal_yyyymm      = s.asof_fiscal_yyyymm,
+    published_at            = s.published_at,
+    prev_forecast_run_id    = s.prev_forecast_run_id,
+    prev_run_id             = s.prev_run_id,
+    prev_asof_fiscal_yyyymm = s.prev_asof_fiscal_yyyymm,
+    rows_compared           = s.rows_compared,
+    cause_counts            = s.cause_counts,
+    total_delta             = s.total_delta,
+    built_at                = current_timestamp()
+  when not matched then insert
+    (forecast_run_id, run_id, asof_fiscal_yyyymm, published_at,
+     prev_forecast_run_id, prev_run_id, prev_asof_fiscal_yyyymm,
+     rows_compared, cause_counts, total_delta, built_at)
+  values
+    (s.forecast_run_id, s.run_id, s.asof_fiscal_yyyymm, s.published_at,
+     s.prev_forecast_run_id, s.prev_run_id, s.prev_asof_fiscal_yyyymm,
+     s.rows_compared, s.cause_counts, s.total_delta, current_timestamp());
+
+  return object_construct(
+    'status','OK',
+    'forecast_run_id', :P_FORECAST_RUN_ID,
+    'prev_forecast_run_id', :V_PREV_FORECAST_RUN_ID,
+    'rows_compared', :V_ROWS
+  );
+
+exception
+  when other then
+    rollback;
+    return object_construct(
+      'status', 'ERROR',
+      'message', SQLERRM
+    );
+end;
+$$;
+
+
+-- ========================================================================
+-- EXAMPLE USAGE
+-- ========================================================================
+
+/*
+-- Latest publish: what moved and why
+select cause, count(*) as rows, sum(delta) as total_delta
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_PC_REASON_MTH
+where forecast_run_id = (select max_by(forecast_run_id, published_at) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_RUNS)
+group by 1
+order by abs(sum(delta)) desc;
+
+-- Biggest movers for one target month
+select roll_up_shop, reason_group, forecast_prev, forecast_new, delta, cause, causes,
+       latest_actual, prev_forecast_of_latest
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_PC_REASON_MTH
+where forecast_run_id = '<forecast_run_id>'
+  and target_fiscal_yyyymm = 202506
+order by abs(delta) desc
+limit 50;
+
+-- Seed the run history from existing publishes, oldest first (revisions start at the next publish)
+insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_RUNS
+(forecast_run_id, asof_fiscal_yyyymm, published_at, rows_compared, built_at)
+select forecast_run_id, max(asof_fiscal_yyyymm), max(published_at), 0, current_timestamp()
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH
+group by 1;
+*/
@@ -0,0 +1,6 @@
+"""
+Python helpers for the PC x Reason revenue forecast pipeline.
+
+The SQL procedures (01__ ... 11__) build the Snowflake tables; these modules hold
+the Python side that the modeling notebook and the ops scripts share.
+"""
@@ -0,0 +1,169 @@
+"""
+Backfill: backtests for many historic as-of months in one job.
+
+SP_BACKFILL_FORECAST_RUNS (14__proc__backfill_forecast_runs.sql) builds the
+shared actuals / budget history once and one dataset snapshot per as-of month.
+This module registers the model runs for those run_ids and runs the backtests
+concurrently: each (as-of, candidate) pair is one call of the in-warehouse GLOBAL
+backtest sproc (revenue_forecast/snowpark_jobs.py), submitted from a thread
+pool so the warehouse works on several months at once.
+
+Usage:
+    runs = start_backfill(session, 202401, 202412)
+    results = run_backfill_backtests(session, runs, ["GBR_OHE"], max_workers=4)
+"""
+
+import json
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import sklearn
+from snowflake.snowpark.functions import col
+
+from revenue_forecast import snowpark_jobs
+
+BACKFILL_PROC = "DB_BI_P_SANDBOX.SANDBOX.SP_BACKFILL_FORECAST_RUNS"
+METRICS_PROC = "DB_BI_P_SANDBOX.SANDBOX.SP_COMPUTE_BACKTEST_METRICS"
+MODEL_RUNS_TABLE = "DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_RUNS"
+
+EXPERIMENT_ID = "EXP_BACKFILL_V1"
+DEFAULT_MAX_WORKERS = 4
+
+
+def _call(session, sql):
+    res = session.sql(sql).collect()[0][0]
+    return json.loads(res) if isinstance(res, str) else res
+
+
+def start_backfill(session, from_asof, to_asof, run_type="BACKFILL", history_months=72, max_horizon=12):
+    """
+    Build the per-as-of runs in the warehouse. Returns the SUCCEEDED runs as
+    [{"asof_fiscal_yyyymm": ..., "run_id": ...}, ...]; failed months are printed and skipped.
+    """
+    res = _call(session, f"""
+      call {BACKFILL_PROC}({int(from_asof)}, {int(to_asof)}, '{run_type}', {int(history_months)}, {int(max_horizon)})
+    """)
+    if res.get("status") not in ("OK", "PARTIAL"):
+        raise RuntimeError(f"SP_BACKFILL_FORECAST_RUNS failed: {res}")
+
+    runs = res.get("runs") or []
+    for r in runs:
+        if r["status"] != "SUCCEEDED":
+            print(f"Backfill {r['asof_fiscal_yyyymm']} failed: {r.get('error')}")
+    return [
+        {"asof_fiscal_yyyymm": int(r["asof_fiscal_yyyymm"]), "run_id": r["run_id"]}
+        for r in runs if r["status"] == "SUCCEEDED"
+    ]
+
+
+def eval_anchors_by_run(session, run_ids, n_anchors, dataset_table=snowpark_jobs.DATASET_SNAP):
+    """Last n_anchors anchor_month_seq per run_id, in one query over the dataset snapshot."""
+    df = (
+        session.table(dataset_table)
+        .filter(col("RUN_ID").isin(list(run_ids)))
+        .select("RUN_ID", "ANCHOR_MONTH_SEQ")
+        .distinct()
+        .to_pandas()
+    )
+    return {
+        run_id: sorted(int(a) for a in g["ANCHOR_MONTH_SEQ"])[-n_anchors:]
+        for run_id, g in df.groupby("RUN_ID")
+    }
+
+
+def plan_jobs(runs, candidates):
+    """One job (new model_run_id) per (as-of run, candidate)."""
+    return [
+        {**run, "candidate": c, "model_run_id": str(uuid.uuid4())}
+        for run in runs
+        for c in candidates
+    ]
+
+
+def register_model_runs(session, jobs, experiment_id=EXPERIMENT_ID, max_horizon=12, eps=100.0,
+                        model_family="gbr"):
+    """Insert the jobs into FORECAST_MODEL_RUNS (same shape as the notebook's registration cell)."""
+    for job in jobs:
+        run_params = {"candidate": job["candidate"], "eps": float(eps)}
+        session.sql(f"""
+          insert into {MODEL_RUNS_TABLE}
+          (model_run_id, run_id, asof_fiscal_yyyymm, experiment_id, model_scope, model_family, feature_set_id,
+           target_name, max_horizon, params, training_env, status, started_at, updated_at)
+          select
+            '{job["model_run_id"]}', '{job["run_id"]}', {job["asof_fiscal_yyyymm"]}, '{experiment_id}', 'GLOBAL',
+            '{model_family}', 'OHE_V1',
+            'TOTAL_REVENUE', {int(max_horizon)},
+            parse_json('{json.dumps(run_params)}'),
+            object_construct('python_version', '{sys.version}', 'sklearn_version', '{sklearn.__version__}'),
+            'PENDING', current_timestamp(), current_timestamp()
+        """).collect()
+
+
+def run_backtest_jobs(session, jobs, eval_anchors, eps=100.0, max_workers=DEFAULT_MAX_WORKERS,
+                      dataset_table=snowpark_jobs.DATASET_SNAP,
+                      predictions_table=snowpark_jobs.PREDICTIONS_TABLE):
+    """
+    Run every job's GLOBAL backtest in the warehouse, max_workers at a time.
+
+    eval_anchors: {run_id: [anchor_month_seq, ...]} (see eval_anchors_by_run).
+    Returns one row per job with ROWS_WRITTEN or ERROR; a failing job does not stop the others.
+    """
+    sproc = snowpark_jobs.register_global_backtest(session)
+
+    def _run(job):
+        return snowpark_jobs.run_global_backtest(
+            session, job["run_id"], job["candidate"], job["model_run_id"],
+            eval_anchors[job["run_id"]], eps,
+            dataset_table=dataset_table, predictions_table=predictions_table, sproc=sproc,
+        )
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_run, job): job for job in jobs}
+        for f in as_completed(futures):
+            job = futures[f]
+            try:
+                rows, error = f.result(), None
+            except Exception as e:  # keep the other months running
+                rows, error = None, str(e)
+            results.append({
+                "ASOF_FISCAL_YYYYMM": job["asof_fiscal_yyyymm"],
+                "RUN_ID": job["run_id"],
+                "CANDIDATE": job["candidate"],
+                "MODEL_RUN_ID": job["model_run_id"],
+                "ROWS_WRITTEN": rows,
+                "ERROR": error,
+            })
+
+    return pd.DataFrame(results).sort_values(["ASOF_FISCAL_YYYYMM", "CANDIDATE"]).reset_index(drop=True)
+
+
+def run_backfill_backtests(session, runs, candidates, n_eval_anchors=12, eps=100.0,
+                           max_workers=DEFAULT_MAX_WORKERS, experiment_id=EXPERIMENT_ID,
+                           max_horizon=12, mape_epsilon=100.0, compute_metrics=True):
+    """
+    Register, backtest (concurrently) and score every (as-of run, candidate).
+
+    Metrics go through SP_COMPUTE_BACKTEST_METRICS once per as-of run, so the
+    backfilled months are scored exactly like a monthly run.
+    """
+    jobs = plan_jobs(runs, candidates)
+    register_model_runs(session, jobs, experiment_id=experiment_id, max_horizon=max_horizon, eps=eps)
+
+    anchors = eval_anchors_by_run(session, [r["run_id"] for r in runs], n_eval_anchors)
+    results = run_backtest_jobs(session, jobs, anchors, eps=eps, max_workers=max_workers)
+
+    if compute_metrics:
+        ok = results[results["ERROR"].isna()]
+        for run_id, g in ok.groupby("RUN_ID"):
+            mrids = ", ".join(f"'{m}'" for m in g["MODEL_RUN_ID"])
+            anchor_sql = ", ".join(str(a) for a in anchors[run_id])
+            res = _call(session, f"""
+              call {METRICS_PROC}(array_construct({mrids}), null, array_construct({anchor_sql}), {float(mape_epsilon)})
+            """)
+            if res.get("status") != "OK":
+                print(f"Metrics for {run_id} failed: {res}")
+
+    return results
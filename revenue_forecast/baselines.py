@@ -0,0 +1,319 @@
+"""
+Vectorized statistical baselines for the PC x Reason backtest.
+
+All series are held in one (series x month) NumPy matrix so every baseline is
+computed for every series, anchor and horizon with array operations (the only
+Python loops are over months, never over series).
+
+Output rows match DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS,
+so the frame can go straight to session.write_pandas().
+
+Conventions (same as the SQL baseline in the notebook):
+- A month with no actuals row is missing (NaN), not zero.
+- SEASONAL_NAIVE_LAG12 predicts y[target - 12] and is NULL when that month is missing.
+- A prediction row is only emitted where the target month has an actual (y_true).
+"""
+
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+SEASON = 12
+
+BASELINES = (
+    "SEASONAL_NAIVE_LAG12",
+    "NAIVE",
+    "DRIFT",
+    "SEASONAL_MEAN",
+    "SES",
+    "CROSTON",
+)
+
+PREDICTION_COLUMNS = [
+    "MODEL_RUN_ID",
+    "ROLL_UP_SHOP",
+    "REASON_GROUP",
+    "ANCHOR_FISCAL_YYYYMM",
+    "ANCHOR_MONTH_SEQ",
+    "HORIZON",
+    "TARGET_FISCAL_YYYYMM",
+    "TARGET_MONTH_SEQ",
+    "Y_TRUE",
+    "Y_PRED",
+    "Y_PRED_LO",
+    "Y_PRED_HI",
+    "CREATED_AT",
+]
+
+
+class SeriesMatrix(NamedTuple):
+    """Actuals for all series on one contiguous month grid."""
+
+    keys: pd.DataFrame          # one row per series: ROLL_UP_SHOP, REASON_GROUP
+    month_seq: np.ndarray       # (T,) month_seq of each column, contiguous
+    fiscal_yyyymm: np.ndarray   # (T,) fiscal_yyyymm of each column (0 if unknown)
+    values: np.ndarray          # (n_series, T) float, NaN where no actuals row
+
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Matrix construction
+# ───────────────────────────────────────────────────────────────────────────────
+
+def build_series_matrix(
+    actuals,
+    y_col="TOTAL_REVENUE",
+    seq_col="MONTH_SEQ",
+    yyyymm_col="FISCAL_YYYYMM",
+    key_cols=("ROLL_UP_SHOP", "REASON_GROUP"),
+):
+    """
+    Pivot long actuals (e.g. FORECAST_ACTUALS_PC_REASON_MTH_SNAP for one run_id)
+    into a SeriesMatrix. Duplicate (series, month) rows are summed.
+    """
+    key_cols = list(key_cols)
+    missing = [c for c in key_cols + [y_col, seq_col] if c not in actuals.columns]
+    if missing:
+        raise ValueError(f"Actuals frame missing required columns: {missing}")
+
+    df = actuals[actuals[y_col].notna()]
+    series_idx = df.groupby(key_cols, sort=True).ngroup().to_numpy()
+    keys = (
+        df[key_cols].drop_duplicates()
+        .sort_values(key_cols)
+        .reset_index(drop=True)
+    )
+
+    seq = df[seq_col].to_numpy(dtype=np.int64)
+    seq0 = int(seq.min())
+    n_months = int(seq.max()) - seq0 + 1
+    col_idx = seq - seq0
+
+    values = np.zeros((len(keys), n_months), dtype=float)
+    seen = np.zeros((len(keys), n_months), dtype=bool)
+    np.add.at(values, (series_idx, col_idx), df[y_col].to_numpy(dtype=float))
+    seen[series_idx, col_idx] = True
+    values[~seen] = np.nan
+
+    fiscal = np.zeros(n_months, dtype=np.int64)
+    if yyyymm_col in df.columns:
+        fiscal[col_idx] = df[yyyymm_col].to_numpy(dtype=np.int64)
+
+    return SeriesMatrix(
+        keys=keys,
+        month_seq=np.arange(seq0, seq0 + n_months, dtype=np.int64),
+        fiscal_yyyymm=fiscal,
+        values=values,
+    )
+
+
+def _take(values, idx):
+    """values[:, idx] with NaN for out-of-range column indexes (idx any shape)."""
+    idx = np.asarray(idx)
+    ok = (idx >= 0) & (idx < values.shape[1])
+    out = values[:, np.where(ok, idx, 0)].astype(float)
+    out[:, ~ok] = np.nan
+    return out
+
+
+def _grid(anchor_idx, horizons):
+    """(A, H) anchor and target column indexes."""
+    a = np.asarray(anchor_idx, dtype=np.int64)[:, None]
+    h = np.asarray(horizons, dtype=np.int64)[None, :]
+    return a, h
+
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Baselines: each returns an (n_series, n_anchors, n_horizons) array
+# ───────────────────────────────────────────────────────────────────────────────
+
+def seasonal_naive(values, anchor_idx, horizons, season=SEASON):
+    """y[a + h - season * ceil(h / season)]; for h <= 12 this is y[target - 12]."""
+    a, h = _grid(anchor_idx, horizons)
+    src = a + h - season * ((h + season - 1) // season)
+    return _take(values, src)
+
+
+def naive(values, anchor_idx, horizons):
+    """Last value at the anchor, repeated for every horizon."""
+    a, h = _grid(anchor_idx, horizons)
+    last = _take(values, a[:, 0])
+    return np.repeat(last[:, :, None], h.shape[1], axis=2)
+
+
+def drift(values, anchor_idx, horizons):
+    """Naive plus the average month-over-month change from first observation to anchor."""
+    a, h = _grid(anchor_idx, horizons)
+    observed = ~np.isnan(values)
+    first = np.where(observed.any(axis=1), observed.argmax(axis=1), values.shape[1])
+
+    last = _take(values, a[:, 0])                                   # (n, A)
+    start = values[np.arange(values.shape[0]), np.minimum(first, values.shape[1] - 1)]
+    span = a[:, 0][None, :] - first[:, None]                        # (n, A)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = np.where(span > 0, (last - start[:, None]) / span, 0.0)
+    return last[:, :, None] + slope[:, :, None] * h[None, :, :]
+
+
+def seasonal_mean(values, anchor_idx, horizons, season=SEASON, years=3):
+    """Mean of the same fiscal period over the last `years` seasons before the anchor."""
+    a, h = _grid(anchor_idx, horizons)
+    src = a + h - season * ((h + season - 1) // season)
+    total = np.zeros((values.shape[0],) + src.shape)
+    count = np.zeros_like(total)
+    for k in range(years):
+        v = _take(values, src - season * k)
+        ok = ~np.isnan(v)
+        total += np.where(ok, v, 0.0)
+        count += ok
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def _ses_levels(values, alpha):
+    """Smoothed level after each month; missing months carry the level forward."""
+    n, t_count = values.shape
+    level = np.full(n, np.nan)
+    out = np.empty_like(values)
+    for t in range(t_count):
+        y = values[:, t]
+        ok = ~np.isnan(y)
+        level = np.where(ok & np.isnan(level), y, level)
+        level = np.where(ok, alpha * y + (1 - alpha) * level, level)
+        out[:, t] = level
+    return out
+
+
+def ses(values, anchor_idx, horizons, alpha=0.3):
+    """Simple exponential smoothing (flat forecast from the anchor level)."""
+    a, h = _grid(anchor_idx, horizons)
+    level = _take(_ses_levels(values, alpha), a[:, 0])
+    return np.repeat(level[:, :, None], h.shape[1], axis=2)
+
+
+def _croston_rates(values, alpha, sba):
+    """Croston demand-rate estimate after each month (z / p, optional SBA correction)."""
+    n, t_count = values.shape
+    size = np.full(n, np.nan)       # smoothed non-zero value
+    interval = np.full(n, np.nan)   # smoothed months between non-zero values
+    since = np.ones(n)              # months since last non-zero value (or series start)
+    started = np.zeros(n, dtype=bool)
+    out = np.empty_like(values)
+    for t in range(t_count):
+        y = values[:, t]
+        # the clock starts at the first month with actuals, not at the matrix start
+        started |= ~np.isnan(y)
+        demand = ~np.isnan(y) & (y != 0)
+        first = demand & np.isnan(size)
+        size = np.where(first, y, np.where(demand, size + alpha * (y - size), size))
+        interval = np.where(first, since, np.where(demand, interval + alpha * (since - interval), interval))
+        since = np.where(demand, 1.0, np.where(started, since + 1.0, since))
+        out[:, t] = size / interval
+    if sba:
+        out *= 1 - alpha / 2
+    return out
+
+
+def croston(values, anchor_idx, horizons, alpha=0.1, sba=False):
+    """Croston's method for intermittent (zero-heavy) series; flat forecast."""
+    a, h = _grid(anchor_idx, horizons)
+    rate = _take(_croston_rates(values, alpha, sba), a[:, 0])
+    # series that are all zeros up to the anchor forecast zero, not NULL
+    zero_hist = _take(np.where(np.isnan(values), 0.0, np.abs(values)).cumsum(axis=1), a[:, 0]) == 0
+    seen = _take((~np.isnan(values)).cumsum(axis=1), a[:, 0]) > 0
+    rate = np.where(np.isnan(rate) & zero_hist & seen, 0.0, rate)
+    return np.repeat(rate[:, :, None], h.shape[1], axis=2)
+
+
+BASELINE_FUNCS = {
+    "SEASONAL_NAIVE_LAG12": seasonal_naive,
+    "NAIVE": naive,
+    "DRIFT": drift,
+    "SEASONAL_MEAN": seasonal_mean,
+    "SES": ses,
+    "CROSTON": croston,
+}
+
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Backtest + output rows
+# ───────────────────────────────────────────────────────────────────────────────
+
+def compute_baselines(matrix, anchors, max_horizon=12, baselines=BASELINES, params=None):
+    """
+    Compute every requested baseline for every series, anchor and horizon.
+
+    anchors are month_seq values; params maps baseline name -> kwargs
+    (e.g. {"SES": {"alpha": 0.2}}). Returns {name: (n_series, n_anchors, H) array}.
+    """
+    params = params or {}
+    unknown = [b for b in baselines if b not in BASELINE_FUNCS]
+    if unknown:
+        raise ValueError(f"Unknown baselines: {unknown}. Available: {list(BASELINE_FUNCS)}")
+
+    anchor_idx = np.asarray(anchors, dtype=np.int64) - matrix.month_seq[0]
+    horizons = np.arange(1, max_horizon + 1)
+    return {
+        b: BASELINE_FUNCS[b](matrix.values, anchor_idx, horizons, **params.get(b, {}))
+        for b in baselines
+    }
+
+
+def _utcnow():
+    """Naive UTC timestamp (CREATED_AT is timestamp_ntz)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_prediction_rows(matrix, preds, anchors, model_run_id, created_at=None):
+    """
+    Flatten one (n_series, n_anchors, H) forecast array into
+    FORECAST_MODEL_BACKTEST_PREDICTIONS rows. Only targets with actuals are kept.
+    """
+    n, n_anchors, n_h = preds.shape
+    anchors = np.asarray(anchors, dtype=np.int64)
+    horizons = np.arange(1, n_h + 1)
+
+    anchor_idx = anchors - matrix.month_seq[0]
+    target_idx = anchor_idx[:, None] + horizons[None, :]
+    y_true = _take(matrix.values, target_idx)
+
+    keep = ~np.isnan(y_true)
+    s_i, a_i, h_i = np.nonzero(keep)
+    t_idx = target_idx[a_i, h_i]
+
+    y_pred = preds[s_i, a_i, h_i]
+    y_pred = np.where(np.isfinite(y_pred), y_pred, np.nan)
+
+    out = pd.DataFrame({
+        "MODEL_RUN_ID": model_run_id,
+        "ROLL_UP_SHOP": matrix.keys["ROLL_UP_SHOP"].to_numpy()[s_i],
+        "REASON_GROUP": matrix.keys["REASON_GROUP"].to_numpy()[s_i],
+        "ANCHOR_FISCAL_YYYYMM": matrix.fiscal_yyyymm[anchor_idx[a_i]],
+        "ANCHOR_MONTH_SEQ": anchors[a_i],
+        "HORIZON": horizons[h_i],
+        "TARGET_FISCAL_YYYYMM": matrix.fiscal_yyyymm[t_idx],
+        "TARGET_MONTH_SEQ": matrix.month_seq[t_idx],
+        "Y_TRUE": y_true[s_i, a_i, h_i],
+        "Y_PRED": y_pred,
+        "Y_PRED_LO": None,
+        "Y_PRED_HI": None,
+        "CREATED_AT": created_at or _utcnow(),
+    })
+    return out[PREDICTION_COLUMNS]
+
+
+def run_baselines(actuals, anchors, model_run_ids, max_horizon=12, params=None, **matrix_kwargs):
+    """
+    One call from actuals frame to prediction rows for several baselines.
+
+    model_run_ids maps baseline name -> model_run_id; only those baselines run.
+    """
+    matrix = build_series_matrix(actuals, **matrix_kwargs)
+    created_at = _utcnow()
+    preds = compute_baselines(matrix, anchors, max_horizon, list(model_run_ids), params)
+    frames = [
+        to_prediction_rows(matrix, preds[name], anchors, mrid, created_at)
+        for name, mrid in model_run_ids.items()
+    ]
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,169 @@
+"""
+Streaming dataset loader with a memory budget.
+
+Instead of one big .to_pandas() (or a COUNT(*) guard that aborts), results are
+pulled as pandas batches, converted to Arrow and kept in memory until the
+budget is reached. Past the budget everything is spilled to a local Arrow IPC
+file and read back memory-mapped, so large pulls slow down instead of being
+killed for running out of memory.
+
+Usage:
+    with load_dataset(session.sql(sql), memory_budget_mb=2048) as data:
+        for batch in data.iter_batches():      # pandas DataFrames
+            ...
+        table = data.to_table()                # pyarrow.Table (memory-mapped if spilled)
+"""
+
+import os
+import tempfile
+
+import pyarrow as pa
+
+DEFAULT_MEMORY_BUDGET_MB = 2048
+
+
+def _batches(source):
+    """pandas batches from a Snowpark DataFrame (to_pandas_batches) or any iterable of frames."""
+    if hasattr(source, "to_pandas_batches"):
+        return source.to_pandas_batches()
+    return iter(source)
+
+
+def _widen(schema, batch_schema):
+    """
+    `schema` promoted to also hold `batch_schema` (None: no change). The connector
+    types every chunk on its own: a column can be all null in one chunk, int8 in
+    one and int16 or float in the next.
+    """
+    unified = pa.unify_schemas([schema, batch_schema], promote_options="permissive")
+    widened = pa.schema([unified.field(f.name) for f in schema], metadata=schema.metadata)
+    return None if widened.equals(schema) else widened
+
+
+def _rewrite_spill(path, schema, spill_dir):
+    """Copy a closed spill file into a new one cast to `schema`; returns (writer, new path)."""
+    fd, new_path = tempfile.mkstemp(prefix="forecast_dataset_", suffix=".arrow", dir=spill_dir)
+    os.close(fd)
+    writer = pa.ipc.new_file(new_path, schema)
+    with pa.memory_map(path, "r") as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            writer.write_table(pa.Table.from_batches([reader.get_batch(i)]).cast(schema))
+    os.remove(path)
+    return writer, new_path
+
+
+class LoadedDataset:
+    """Result of load_dataset(): in-memory Arrow batches or a spilled IPC file."""
+
+    def __init__(self, schema, batches=None, path=None, num_rows=0, nbytes=0):
+        self.schema = schema
+        self.path = path
+        self.num_rows = num_rows
+        self.nbytes = nbytes
+        self._batches = batches or []
+
+    @property
+    def spilled(self):
+        return self.path is not None
+
+    def to_table(self):
+        """Whole result as a pyarrow.Table; zero-copy memory map when spilled."""
+        if self.spilled:
+            with pa.memory_map(self.path, "r") as source:
+                return pa.ipc.open_file(source).read_all()
+        if not self._batches:
+            return self.schema.empty_table() if self.schema is not None else pa.table({})
+        return pa.Table.from_batches(self._batches, schema=self.schema)
+
+    def iter_batches(self, columns=None):
+        """Yield pandas DataFrames one record batch at a time."""
+        if self.spilled:
+            with pa.memory_map(self.path, "r") as source:
+                reader = pa.ipc.open_file(source)
+                for i in range(reader.num_record_batches):
+                    batch = reader.get_batch(i)
+                    yield (batch.select(columns) if columns else batch).to_pandas()
+        else:
+            for batch in self._batches:
+                yield (batch.select(columns) if columns else batch).to_pandas()
+
+    def to_pandas(self, columns=None):
+        """Materialize as one pandas DataFrame (optionally only some columns)."""
+        table = self.to_table()
+        if columns:
+            table = table.select(columns)
+        return table.to_pandas()
+
+    def close(self):
+        """Drop in-memory batches and delete the spill file."""
+        self._batches = []
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_dataset(source, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, spill_dir=None):
+    """
+    Stream `source` under a memory budget.
+
+    source: Snowpark DataFrame (session.sql(...) / session.table(...)) or an
+            iterable of pandas DataFrames.
+    memory_budget_mb: Arrow bytes kept in memory before spilling to disk.
+    spill_dir: directory for the spill file (default: system temp dir).
+    """
+    budget = int(memory_budget_mb * 1024 * 1024)
+    schema = None
+    held = []
+    writer = None
+    path = None
+    num_rows = 0
+    nbytes = 0
+
+    try:
+        for frame in _batches(source):
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if schema is None:
+                schema = table.schema
+            else:
+                # earlier batches are re-typed when this one needs a wider type
+                widened = _widen(schema, table.schema)
+                if widened is not None:
+                    held = pa.Table.from_batches(held, schema=schema).cast(widened).to_batches()
+                    if writer is not None:
+                        writer.close()
+                        writer, path = _rewrite_spill(path, widened, spill_dir)
+                    schema = widened
+                table = table.select(schema.names).cast(schema)
+            num_rows += table.num_rows
+            nbytes += table.nbytes
+
+            if writer is None and nbytes > budget:
+                fd, path = tempfile.mkstemp(prefix="forecast_dataset_", suffix=".arrow", dir=spill_dir)
+                os.close(fd)
+                writer = pa.ipc.new_file(path, schema)
+                for batch in held:
+                    writer.write_batch(batch)
+                held = []
+
+            if writer is not None:
+                writer.write_table(table)
+            else:
+                held.extend(table.to_batches())
+    except Exception:
+        if writer is not None:
+            writer.close()
+        if path and os.path.exists(path):
+            os.remove(path)
+        raise
+
+    if writer is not None:
+        writer.close()
+
+    return LoadedDataset(schema, batches=held, path=path, num_rows=num_rows, nbytes=nbytes)
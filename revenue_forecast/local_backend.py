@@ -0,0 +1,793 @@
+"""
+Local execution backend: the pipeline's SQL procedures on DuckDB.
+
+The stage procedures (03, 06 - 09, 11 and the procedures they call) are executed
+from the repo's .sql files as they are deployed to Snowflake, against Parquet
+fixtures instead of the sandbox:
+
+  translate()     Snowflake -> DuckDB dialect for single statements (names,
+                  types, iff / equal_null / object_construct / generator ...)
+  LocalBackend    loads fixtures, deploys tables / views / sequences and
+                  registers procedures, and interprets the Snowflake Scripting
+                  subset the procedures use (declare / let, :=, select ... into,
+                  if / elseif, for over a resultset, call + result_scan,
+                  transactions, exception handlers)
+
+Fixtures are one <TABLE_NAME>.parquet per source table the SQL reads but does not
+create (DIM_DATE_5, FORECAST_REVENUE_AGG_MTH, FORECAST_REVENUE_AGG_MTH_FINGERPRINT,
+RNA_RCT_CONFIG_SHOP_ELIGIBILITY, FORECAST_PC_MANUAL_EXCLUSIONS), plus seed rows for
+tables the repo does create (for scoring: FORECAST_MODEL_RUNS / _CHAMPIONS /
+_BACKTEST_PREDICTIONS), which are inserted by column name after the DDL runs.
+
+Not emulated: async child jobs (run_pipeline() runs the stages in DAG order, one at
+a time), SP_RUN_STAGE reuse, query history (SP_LOG_RUN_STAGES returns its ERROR
+object, as it does whenever telemetry fails), and Snowflake's dropping of null
+values in object_construct. Results are compared on values; row_hash strings
+differ from Snowflake's because numbers print differently.
+
+Needs duckdb (and pyarrow for the fixtures); development only, so it is not part
+of environment.yml.
+
+Usage:
+    backend = LocalBackend.from_fixtures("fixtures/")
+    results = backend.run_pipeline(asof_fiscal_yyyymm=202406)
+    backend.table("FORECAST_OUTPUT_PC_REASON_MTH")
+    backend.call("SP_BUILD_CUST_MIX_PC_REASON", results["run_id"], 202406)
+"""
+
+import json
+import re
+import time
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+
+import duckdb
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SCHEMA_PREFIX = "DB_BI_P_SANDBOX.SANDBOX."
+
+# Deploy order: views and procedures after the tables they read
+DEPLOY_FILES = (
+    "01__setup__fiscal_month_dim_and_asof.sql",
+    "04__proc__run_orchestrator.sql",
+    "10__setup__model_tracking_tables.sql",
+    "15__proc__refresh_revenue_agg_mth.sql",
+    "16__setup__run_stage_metrics.sql",
+    "18__proc__write_pc_reason_mth_snapshot.sql",
+    "21__setup__series_registry.sql",
+    "03__proc__pc_eligibility.sql",
+    "06__proc__build_actuals_pc_reason.sql",
+    "07__proc__build_cust_mix_pc_reason.sql",
+    "08__proc__build_budget_pc_reason_mth.sql",
+    "09__proc__build_model_dataset_pc_reason_h.sql",
+    "11__proc__score_and_publish_marts.sql",
+    "23__proc__forecast_tracking_mart.sql",
+    "24__proc__forecast_revision_mart.sql",
+)
+
+# Written by SP_EVALUATE_PC_ELIGIBILITY but created outside this repo
+EXTERNAL_DDL = """
+create table if not exists FORECAST_PC_ELIGIBILITY (
+  run_id                  string,
+  as_of_month_end         date,
+  roll_up_shop            string,
+  months_present_lookback number,
+  avg_rev_lookback        float,
+  total_rev_lookback      float,
+  is_eligible             boolean,
+  exclusion_reasons       array,
+  thresholds              variant,
+  evaluated_at            timestamp_ntz
+);
+
+create table if not exists FORECAST_PC_ELIGIBILITY_RULES (
+  run_id                  string,
+  as_of_month_end         date,
+  roll_up_shop            string,
+  rule_code               string,
+  rule_passed             boolean,
+  observed_value          variant,
+  threshold_value         variant,
+  evaluated_at            timestamp_ntz
+);
+"""
+
+# Snowflake functions without a DuckDB equivalent of the same name
+MACROS = (
+    "create or replace macro iff(c, a, b) as case when c then a else b end",
+    "create or replace macro equal_null(a, b) as a is not distinct from b",
+    "create or replace macro nvl(a, b) as coalesce(a, b)",
+    "create or replace macro zeroifnull(a) as coalesce(a, 0)",
+    "create or replace macro div0(a, b) as case when b = 0 then 0 else a / b end",
+    "create or replace macro to_variant(a) as a",
+    "create or replace macro uuid_string() as uuid()::varchar",
+    "create or replace macro object_insert(o, k, v, overwrite) as json_merge_patch(o, json_object(k::varchar, v))",
+)
+
+# (stage name, procedure, extra arguments after run_id / as-of) in orchestrator order
+PIPELINE_STAGES = (
+    ("eligibility", "SP_EVALUATE_PC_ELIGIBILITY", ()),
+    ("actuals_pc_reason_mth", "SP_BUILD_ACTUALS_PC_REASON_MTH", ("history_months",)),
+    ("budget_pc_reason_mth", "SP_BUILD_BUDGET_PC_REASON_MTH", ("history_months",)),
+    ("cust_mix_pc_reason", "SP_BUILD_CUST_MIX_PC_REASON", ()),
+    ("model_dataset_pc_reason_h", "SP_BUILD_MODEL_DATASET_PC_REASON_H", ("max_horizon",)),
+    ("score_and_publish", "SP_SCORE_AND_PUBLISH_FORECASTS", ("max_horizon",)),
+)
+
+_JSON_TYPES = ("VARIANT", "OBJECT", "ARRAY")
+
+
+class LocalExecutionError(RuntimeError):
+    """A statement failed outside any exception handler of the procedure."""
+
+
+# ---------------------------------------------------------------------------
+# Lexing: string literals, quoted identifiers and comments are masked so that
+# rewrites only ever see code. Placeholders are \x00<n>\x00.
+# ---------------------------------------------------------------------------
+
+_LEX = re.compile(r"""'(?:[^']|'')*'|"[^"]*"|--[^\n]*|/\*.*?\*/|\$\$.*?\$\$""", re.S)
+_PH = re.compile(r"\x00(\d+)\x00")
+
+
+def _mask(sql):
+    lits = []
+
+    def keep(m):
+        lits.append(m.group(0))
+        return f"\x00{len(lits) - 1}\x00"
+
+    return _LEX.sub(keep, sql), lits
+
+
+def _unmask(masked, lits):
+    while _PH.search(masked):
+        masked = _PH.sub(lambda m: lits[int(m.group(1))], masked)
+    return masked
+
+
+def _lit(lits, text):
+    lits.append(text)
+    return f"\x00{len(lits) - 1}\x00"
+
+
+def _split(masked, sep=";"):
+    """Split masked text on `sep` at parenthesis depth 0."""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(masked):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(masked[start:i])
+            start = i + 1
+    parts.append(masked[start:])
+    return parts
+
+
+def _close_paren(masked, open_idx):
+    depth = 0
+    for i in range(open_idx, len(masked)):
+        if masked[i] == "(":
+            depth += 1
+        elif masked[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError("Unbalanced parentheses")
+
+
+def _rewrite_calls(masked, name, fn):
+    """Replace every call name(args) with fn([arg, ...]) (args as masked text)."""
+    pat = re.compile(rf"(?<![\w.]){name}\s*\(", re.I)
+    pos = 0
+    while True:
+        m = pat.search(masked, pos)
+        if not m:
+            return masked
+        close = _close_paren(masked, m.end() - 1)
+        inner = masked[m.end():close]
+        args = [] if not inner.strip() else [a.strip() for a in _split(inner, ",")]
+        repl = fn(args)
+        masked = masked[:m.start()] + repl + masked[close + 1:]
+        pos = m.start() + len(repl) if name.lower() in repl.lower() else m.start()
+
+
+def _rewrite_values(masked):
+    """`from values (..), (..)` -> `from (values ..) as _values(column1, ..)`."""
+    pat = re.compile(r"\bfrom\s+values\s*(?=\()", re.I)
+    while True:
+        m = pat.search(masked)
+        if not m:
+            return masked
+        pos, rows = m.end(), []
+        while True:
+            close = _close_paren(masked, pos)
+            rows.append(masked[pos:close + 1])
+            nxt = re.match(r"\s*,\s*(?=\()", masked[close + 1:])
+            if not nxt:
+                break
+            pos = close + 1 + nxt.end()
+        ncols = len(_split(rows[0][1:-1], ","))
+        cols = ", ".join(f"column{i + 1}" for i in range(ncols))
+        masked = masked[:m.start()] + f"from (values {', '.join(rows)}) as _values({cols})" + masked[close + 1:]
+
+
+_TYPE_RULES = (
+    (re.compile(r"\bnumber\s*\(", re.I), "decimal("),
+    (re.compile(r"\bnumber\b", re.I), "decimal(38,0)"),
+    (re.compile(r"\bfloat\b", re.I), "double"),             # Snowflake FLOAT is 64-bit
+    (re.compile(r"\btimestamp_ntz\b", re.I), "timestamp"),
+    (re.compile(r"\btimestamp_(?:ltz|tz)\b", re.I), "timestamptz"),
+    (re.compile(r"\b(?:variant|object|array)\b(?!\s*\()", re.I), "json"),
+)
+
+_FUNC_RULES = (
+    (re.compile(r"\bcurrent_timestamp\s*\(\s*\)", re.I), "current_timestamp"),
+    (re.compile(r"\bcurrent_date\s*\(\s*\)", re.I), "current_date"),
+    (re.compile(r"\btable\s*\(\s*generator\s*\(\s*rowcount\s*=>\s*([^()]*?)\s*\)\s*\)", re.I), r"range(\1)"),
+    (re.compile(r"\bseq4\s*\(\s*\)", re.I), "range"),
+    (re.compile(r"(?<![\w.])object_construct\s*\(", re.I), "json_object("),
+    (re.compile(r"(?<![\w.])object_agg\s*\(", re.I), "json_group_object("),
+    (re.compile(r"(?<![\w.])parse_json\s*\(", re.I), "json("),
+    (re.compile(r"(?<![\w.])array_size\s*\(", re.I), "json_array_length("),
+)
+
+_DDL_RULES = (
+    (re.compile(r",\s*(?:primary\s+key|unique)\s*\([^)]*\)", re.I), ""),
+    (re.compile(r"\)\s*cluster\s+by\s*\([^)]*\)", re.I), ")"),
+    (re.compile(r"\b(start|increment)\s*=\s*", re.I), r"\1 "),
+)
+
+
+def _translate_masked(masked, lits):
+    masked = re.sub(re.escape(SCHEMA_PREFIX), "", masked, flags=re.I)
+
+    # variant paths: x:"key" (scripting variables and columns alike)
+    def path(m):
+        key = lits[int(m.group(2))]
+        if not key.startswith('"'):
+            return m.group(0)
+        return f"json_extract_string({m.group(1)}, {_lit(lits, repr('$.' + key[1:-1]))})"
+
+    masked = re.sub(r"((?<!:):?[A-Za-z_][\w.]*)\s*:\s*\x00(\d+)\x00", path, masked)
+
+    masked = re.sub(r"\b([A-Za-z_]\w*)\.nextval\b",
+                    lambda m: f"nextval({_lit(lits, repr(m.group(1)))})", masked, flags=re.I)
+    masked = re.sub(r"\bcurrent_user\s*\(\s*\)", lambda m: _lit(lits, "'LOCAL'"), masked, flags=re.I)
+
+    for pat, repl in _DDL_RULES + _FUNC_RULES + _TYPE_RULES:
+        masked = pat.sub(repl, masked)
+
+    masked = _rewrite_calls(
+        masked, "array_construct_compact",
+        lambda a: f"to_json(list_filter(list_value({', '.join(a)}), x -> x is not null))")
+    masked = _rewrite_calls(
+        masked, "array_construct",
+        lambda a: f"to_json(list_value({', '.join(a)}))" if a else "'[]'::json")
+    masked = _rewrite_calls(
+        masked, "array_append",
+        lambda a: f"to_json(list_append(cast(json({a[0]}) as json[]), to_json({a[1]})))")
+    masked = _rewrite_calls(
+        masked, "array_to_string",
+        lambda a: f"array_to_string(cast(json({a[0]}) as varchar[]), {a[1]})")
+    masked = _rewrite_calls(masked, "hash_agg", lambda a: f"bit_xor(hash({', '.join(a)}))")
+    # DuckDB's count_if is null over no rows; Snowflake's is 0
+    masked = _rewrite_calls(masked, "count_if", lambda a: f"count(*) filter (where {a[0]})")
+    return _rewrite_values(masked)
+
+
+def translate(sql):
+    """One Snowflake statement in DuckDB dialect (bind variables left as :NAME)."""
+    masked, lits = _mask(sql)
+    return _unmask(_translate_masked(masked, lits), lits)
+
+
+def _sql_literal(value):
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, datetime):
+        return f"timestamp{'tz' if value.tzinfo else ''} '{value.isoformat(sep=' ')}'"
+    if isinstance(value, date):
+        return f"date '{value.isoformat()}'"
+    if isinstance(value, (dict, list)):
+        return "'" + json.dumps(value, default=str).replace("'", "''") + "'::json"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _from_json(value):
+    if isinstance(value, str) and value[:1] in "{[":
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+# ---------------------------------------------------------------------------
+# Snowflake Scripting: parse a procedure body into a statement tree
+# ---------------------------------------------------------------------------
+
+_KW = re.compile(r"\s*(?:\x00\d+\x00\s*)*", re.S)   # leading whitespace / comments
+
+
+def _header(masked, keyword):
+    """Split `<keyword> cond then rest` at the first `then` outside parentheses."""
+    depth = 0
+    for m in re.finditer(r"\(|\)|\bthen\b", masked, re.I):
+        tok = m.group(0)
+        if tok == "(":
+            depth += 1
+        elif tok == ")":
+            depth -= 1
+        elif depth == 0:
+            return masked[len(keyword):m.start()].strip(), masked[m.end():]
+    raise ValueError(f"{keyword} without then")
+
+
+def _tokens(masked_body):
+    """Flat list of (kind, payload) from the masked body."""
+    out = []
+    for chunk in _split(masked_body):
+        rest = chunk
+        while True:
+            rest = rest[_KW.match(rest).end():]
+            if not rest.strip():
+                break
+            low = rest.lower()
+            if re.match(r"begin\s+transaction\b", low) or re.match(r"(commit|rollback)\b", low):
+                out.append(("stmt", rest.strip()))
+                break
+            m = re.match(r"(declare|begin|else|exception)\b", low)
+            if m:
+                out.append((m.group(1), None))
+                rest = rest[m.end():]
+                continue
+            m = re.match(r"end\s+(if|for)\b", low)
+            if m:
+                out.append(("end " + m.group(1), None))
+                rest = rest[m.end():]
+                continue
+            if re.match(r"end\b", low):
+                out.append(("end", None))
+                rest = rest[3:]
+                continue
+            m = re.match(r"(if|elseif)\b", low)
+            if m:
+                cond, rest = _header(rest, m.group(1))
+                out.append((m.group(1), cond))
+                continue
+            m = re.match(r"when\b", low)
+            if m:
+                cond, rest = _header(rest, "when")
+                out.append(("when", cond))
+                continue
+            m = re.match(r"for\s+(\w+)\s+in\s+(\w+)\s+do\b", low)
+            if m:
+                out.append(("for", (m.group(1).upper(), m.group(2).upper())))
+                rest = rest[m.end():]
+                continue
+            out.append(("stmt", rest.strip()))
+            break
+    return out
+
+
+def _parse_block(toks, i, stop):
+    """Statements from toks[i] until a token kind in `stop`; returns (nodes, i)."""
+    nodes = []
+    while i < len(toks):
+        kind, payload = toks[i]
+        if kind in stop:
+            return nodes, i
+        if kind == "stmt":
+            nodes.append(("stmt", payload))
+            i += 1
+        elif kind == "if":
+            branches = []
+            cond = payload
+            while True:
+                body, i = _parse_block(toks, i + 1, ("elseif", "else", "end if"))
+                branches.append((cond, body))
+                kind, payload = toks[i]
+                if kind == "elseif":
+                    cond = payload
+                    continue
+                if kind == "else":
+                    body, i = _parse_block(toks, i + 1, ("end if",))
+                    branches.append((None, body))
+                break
+            nodes.append(("if", branches))
+            i += 1
+        elif kind == "for":
+            body, i = _parse_block(toks, i + 1, ("end for",))
+            nodes.append(("for", payload, body))
+            i += 1
+        else:
+            raise ValueError(f"Unexpected {kind}")
+    return nodes, i
+
+
+class Procedure:
+    """A registered procedure: signature plus parsed body."""
+
+    def __init__(self, name, params, body, lits):
+        self.name = name
+        self.params = params            # [(NAME, TYPE, default masked text or None)]
+        self.lits = lits
+        toks = _tokens(body)
+        i, self.declares = 0, []
+        if toks and toks[0][0] == "declare":
+            i = 1
+            while toks[i][0] == "stmt":
+                m = re.match(r"(\w+)\s+(\w+)(?:\s*\(.*?\))?(?:\s+default\s+(.*))?$", toks[i][1], re.I | re.S)
+                self.declares.append((m.group(1).upper(), m.group(2).upper(), m.group(3)))
+                i += 1
+        if toks[i][0] != "begin":
+            raise ValueError(f"{name}: body must start with begin")
+        self.body, i = _parse_block(toks, i + 1, ("exception", "end"))
+        self.handlers = []
+        if toks[i][0] == "exception":
+            i += 1
+            while toks[i][0] == "when":
+                cond = toks[i][1]
+                handler, i = _parse_block(toks, i + 1, ("when", "end"))
+                self.handlers.append((cond, handler))
+
+
+_PROC = re.compile(r"\s*create\s+(?:or\s+replace\s+)?procedure\s+([\w.]+)\s*\(", re.I)
+
+
+def _parse_procedure(statement):
+    masked, lits = _mask(statement)
+    m = _PROC.match(masked, _KW.match(masked).end())
+    close = _close_paren(masked, m.end() - 1)
+    params = []
+    for p in _split(masked[m.end():close], ","):
+        if not p.strip():
+            continue
+        pm = re.match(r"\s*(\w+)\s+(\w+)(?:\s*\(.*?\))?(?:\s+default\s+(.*))?$", p, re.I | re.S)
+        params.append((pm.group(1).upper(), pm.group(2).upper(), pm.group(3)))
+    body = next(lit for lit in lits if lit.startswith("$$"))[2:-2]
+    body_masked, body_lits = _mask(body)
+    name = m.group(1).upper().replace(SCHEMA_PREFIX, "")
+    return Procedure(name, params, body_masked, body_lits)
+
+
+class _Return(Exception):
+    def __init__(self, value):
+        self.value = value
+
+
+class _Scope(dict):
+    """Variables of one procedure call (upper-case names)."""
+
+    def __init__(self):
+        super().__init__()
+        self.records = {}               # for-loop variables: NAME -> {FIELD: value}
+        self.types = {}
+
+
+# ---------------------------------------------------------------------------
+# Backend
+# ---------------------------------------------------------------------------
+
+class LocalBackend:
+    """DuckDB database holding the fixtures, the deployed objects and the procedures."""
+
+    def __init__(self, database=":memory:"):
+        self.con = duckdb.connect(database)
+        self.procedures = {}
+        self._in_txn = False
+        self._last_result = None
+        self._rowcount = None
+        self._fixtures = set()
+        for macro in MACROS:
+            self.con.execute(macro)
+
+    @classmethod
+    def from_fixtures(cls, fixture_dir, database=":memory:", sql_dir=REPO_ROOT, files=DEPLOY_FILES):
+        backend = cls(database)
+        backend.load_fixtures(fixture_dir)
+        backend.deploy(sql_dir, files)
+        return backend
+
+    # -- objects -------------------------------------------------------------
+
+    def _exists(self, name):
+        return self.con.execute(
+            "select count(*) from information_schema.tables where upper(table_name) = ?",
+            [name.upper()]).fetchone()[0] > 0
+
+    def load_fixtures(self, fixture_dir):
+        """One table per <TABLE_NAME>.parquet; returns the table names."""
+        names = []
+        for path in sorted(Path(fixture_dir).glob("*.parquet")):
+            name = path.stem.upper()
+            self.con.execute(f"create or replace table {name} as select * from read_parquet(?)", [str(path)])
+            self._fixtures.add(name)
+            names.append(name)
+        return names
+
+    def deploy(self, sql_dir=REPO_ROOT, files=DEPLOY_FILES):
+        """Create tables / views / sequences and register procedures from the .sql files.
+
+        Other top-level statements (calls, merges, ad-hoc selects) are skipped. A table
+        that already exists is kept, except that a fixture of a table the repo creates
+        is re-created from the DDL and its rows inserted by column name.
+        """
+        self.run_script(EXTERNAL_DDL)
+        for fname in files:
+            self.run_script(Path(sql_dir, fname).read_text())
+
+    def run_script(self, text):
+        masked, lits = _mask(text)
+        for part in _split(masked):
+            statement = _unmask(part, lits).strip()
+            if not statement:
+                continue
+            head = _mask(statement)[0].lower()
+            head = head[_KW.match(head).end():]
+            m = _PROC.match(head)
+            if m:
+                # parsed on first call: procedures the stages never call may use
+                # scripting the interpreter does not cover (async / await)
+                self.procedures[m.group(1).upper().replace(SCHEMA_PREFIX, "")] = statement
+                continue
+            m = re.match(r"create\s+(?:or\s+replace\s+)?(?:temporary\s+)?(table|view|sequence)\s+"
+                         r"(?:if\s+not\s+exists\s+)?([\w.]+)", head)
+            if not m:
+                continue
+            name = m.group(2).upper().replace(SCHEMA_PREFIX, "")
+            if m.group(1) == "table" and name in self._fixtures:
+                self.con.execute(f"alter table {name} rename to _FIXTURE_{name}")
+                self.con.execute(translate(statement))
+                self.con.execute(f"insert into {name} by name select * from _FIXTURE_{name}")
+                self.con.execute(f"drop table _FIXTURE_{name}")
+                self._fixtures.discard(name)
+                continue
+            if m.group(1) == "table" and self._exists(name):
+                continue
+            self.con.execute(translate(statement))
+
+    def table(self, name):
+        return self.con.execute(f"select * from {name}").df()
+
+    def sql(self, query):
+        """Run one Snowflake-dialect query; returns a DataFrame."""
+        return self.con.execute(translate(query)).df()
+
+    # -- procedures ----------------------------------------------------------
+
+    def call(self, name, *args):
+        """Call a registered procedure; returns its result (dict for objects)."""
+        try:
+            return self._call(name.upper().replace(SCHEMA_PREFIX, ""), list(args))
+        except Exception:
+            self._rollback()
+            raise
+
+    def _call(self, name, args):
+        proc = self.procedures.get(name)
+        if proc is None:
+            raise LocalExecutionError(f"Procedure {name} is not deployed locally")
+        if isinstance(proc, str):
+            proc = self.procedures[name] = _parse_procedure(proc)
+        if len(args) > len(proc.params):
+            raise LocalExecutionError(f"{name}: too many arguments")
+
+        scope = _Scope()
+        for i, (pname, ptype, default) in enumerate(proc.params):
+            if i < len(args):
+                value = args[i]
+            elif default is not None:
+                value = self._eval(default, proc.lits, scope)
+            else:
+                raise LocalExecutionError(f"{name}: missing argument {pname}")
+            scope.types[pname] = ptype
+            scope[pname] = _from_json(value) if ptype in _JSON_TYPES else value
+        for vname, vtype, default in proc.declares:
+            scope.types[vname] = vtype
+            scope[vname] = None if default is None else self._eval(default, proc.lits, scope)
+
+        try:
+            self._run(proc.body, proc, scope)
+        except _Return as r:
+            return r.value
+        except (duckdb.Error, LocalExecutionError) as e:
+            if not proc.handlers:
+                raise
+            scope["SQLERRM"] = str(e)
+            try:
+                self._run(proc.handlers[0][1], proc, scope)
+            except _Return as r:
+                return r.value
+            raise
+        return None
+
+    def _run(self, nodes, proc, scope):
+        for node in nodes:
+            if node[0] == "stmt":
+                self._statement(node[1], proc, scope)
+            elif node[0] == "if":
+                for cond, body in node[1]:
+                    if cond is None or self._eval(cond, proc.lits, scope):
+                        self._run(body, proc, scope)
+                        break
+            elif node[0] == "for":
+                var, cursor = node[1]
+                for row in scope[scope[cursor]] if isinstance(scope.get(cursor), str) else scope[cursor]:
+                    scope.records[var] = row
+                    self._run(node[2], proc, scope)
+
+    def _statement(self, masked, proc, scope):
+        low = masked.lower()
+        lits = proc.lits
+
+        m = re.match(r"(\w+)\s*:=\s*(.*)$", masked, re.S)
+        if m:
+            self._assign(scope, m.group(1).upper(), self._eval(m.group(2), lits, scope))
+            return
+        m = re.match(r"let\s+(\w+)\s+resultset\s*:=\s*\((.*)\)\s*$", masked, re.I | re.S)
+        if m:
+            cur = self._execute(m.group(2), lits, scope)
+            cols = [d[0].upper() for d in cur.description]
+            scope[m.group(1).upper()] = [dict(zip(cols, row)) for row in cur.fetchall()]
+            return
+        m = re.match(r"let\s+(\w+)\s+cursor\s+for\s+(\w+)\s*$", masked, re.I)
+        if m:
+            scope[m.group(1).upper()] = m.group(2).upper()
+            return
+        m = re.match(r"let\s+(\w+)\s+(\w+)\s*:=\s*(.*)$", masked, re.I | re.S)
+        if m:
+            scope.types[m.group(1).upper()] = m.group(2).upper()
+            self._assign(scope, m.group(1).upper(), self._eval(m.group(3), lits, scope))
+            return
+        if re.match(r"return\b", low):
+            raise _Return(_from_json(self._eval(masked[6:], lits, scope)))
+        if re.match(r"begin\s+transaction\b", low):
+            self.con.execute("begin transaction")
+            self._in_txn = True
+            return
+        if re.match(r"commit\b", low):
+            if self._in_txn:
+                self.con.execute("commit")
+                self._in_txn = False
+            return
+        if re.match(r"rollback\b", low):
+            self._rollback()
+            return
+        m = re.match(r"call\s+([\w.]+)\s*\(", masked, re.I)
+        if m:
+            close = _close_paren(masked, m.end() - 1)
+            arg_text = masked[m.end():close]
+            args = []
+            if arg_text.strip():
+                row = self._execute("select " + ", ".join(f"({a})" for a in _split(arg_text, ",")),
+                                    lits, scope).fetchone()
+                args = list(row)
+            name = m.group(1).upper().replace(SCHEMA_PREFIX, "")
+            self._last_result = self._call(name, args)
+            return
+        m = re.match(r"select\s+\$1\s+into\s+:(\w+)\s+from\s+table\s*\(\s*result_scan", masked, re.I)
+        if m:
+            self._assign(scope, m.group(1).upper(), self._last_result)
+            return
+        m = re.match(r"(select\b.*?)\binto\s+(:\w+(?:\s*,\s*:\w+)*)(\s+from\b.*|\s*)$", masked, re.I | re.S)
+        if m:
+            cur = self._execute(m.group(1) + m.group(3), lits, scope)
+            row = cur.fetchone()
+            names = [n.strip()[1:].upper() for n in m.group(2).split(",")]
+            for i, n in enumerate(names):
+                self._assign(scope, n, None if row is None else row[i])
+            return
+
+        cur = self._execute(masked, lits, scope)
+        if re.match(r"(insert|update|delete|merge)\b", low):
+            row = cur.fetchone()
+            self._rowcount = row[0] if row else 0
+
+    def _assign(self, scope, name, value):
+        if scope.types.get(name) in _JSON_TYPES:
+            value = _from_json(value)
+        scope[name] = value
+
+    def _rollback(self):
+        if self._in_txn:
+            self.con.execute("rollback")
+            self._in_txn = False
+
+    # -- rendering -----------------------------------------------------------
+
+    def _lookup(self, scope, name):
+        if name == "SQLROWCOUNT":
+            return self._rowcount
+        return scope[name]
+
+    def _render(self, masked, lits, scope, bare):
+        """Masked statement -> DuckDB SQL with variables inlined as literals."""
+        lits = list(lits)
+        known = set(scope) | {"SQLROWCOUNT"}
+
+        if bare:
+            # scripting expressions reference variables without the colon
+            def record(m):
+                rec = scope.records.get(m.group(1).upper())
+                if rec is None:
+                    return m.group(0)
+                return _lit(lits, _sql_literal(rec[m.group(2).upper()]))
+
+            masked = re.sub(r"(?<![\w.:$])([A-Za-z_]\w*)\.([A-Za-z_]\w*)\b(?!\s*\()", record, masked)
+            masked = re.sub(r"(?<![\w.:$])([A-Za-z_]\w*)\b(?!\s*\(|\.)",
+                            lambda m: ":" + m.group(1) if m.group(1).upper() in known else m.group(0),
+                            masked)
+
+        masked = _translate_masked(masked, lits)
+
+        def ident(m):
+            return self._lookup(scope, m.group(1).upper()).upper().replace(SCHEMA_PREFIX, "")
+
+        masked = re.sub(r"\bidentifier\s*\(\s*:(\w+)\s*\)", ident, masked, flags=re.I)
+
+        def var(m):
+            name = m.group(1).upper()
+            if name not in known:
+                raise LocalExecutionError(f"Unknown variable :{m.group(1)}")
+            return _lit(lits, _sql_literal(self._lookup(scope, name)))
+
+        masked = re.sub(r"(?<![:\w]):(?!:)([A-Za-z_]\w*)", var, masked)
+        return _unmask(masked, lits)
+
+    def _execute(self, masked, lits, scope, bare=False):
+        sql = self._render(masked, lits, scope, bare)
+        try:
+            return self.con.execute(sql)
+        except duckdb.Error as e:
+            raise LocalExecutionError(f"{e}\n--- statement ---\n{sql}") from e
+
+    def _eval(self, masked, lits, scope):
+        return self._execute(f"select ({masked})", lits, scope, bare=True).fetchone()[0]
+
+    # -- pipeline ------------------------------------------------------------
+
+    def run_pipeline(self, asof_fiscal_yyyymm, run_id=None, history_months=72, max_horizon=12,
+                     score=True):
+        """
+        One monthly run: FORECAST_RUNS row, then every stage of PIPELINE_STAGES in
+        orchestrator order (scoring needs champions for the as-of in the fixtures).
+        Returns {"run_id", "status", "stages": {name: {"result", "seconds"}}}.
+        """
+        run_id = run_id or str(uuid.uuid4())
+        extra = {"history_months": history_months, "max_horizon": max_horizon}
+        self.con.execute(translate(f"""
+          insert into FORECAST_RUNS
+          (run_id, run_type, triggered_by, triggered_at, asof_fiscal_yyyymm, asof_month_end, status, updated_at)
+          select {_sql_literal(run_id)}, 'LOCAL', current_user(), current_timestamp(),
+                 fiscal_yyyymm, month_end_date, 'STARTED', current_timestamp()
+          from FORECAST_FISCAL_MONTH_DIM
+          where fiscal_yyyymm = {int(asof_fiscal_yyyymm)}
+        """))
+
+        stages, status = {}, "SUCCEEDED"
+        for stage, proc, extra_args in PIPELINE_STAGES:
+            if proc == "SP_SCORE_AND_PUBLISH_FORECASTS" and not score:
+                continue
+            started = time.perf_counter()
+            result = self.call(proc, run_id, asof_fiscal_yyyymm, *(extra[a] for a in extra_args))
+            stages[stage] = {"result": result, "seconds": round(time.perf_counter() - started, 3)}
+            # PARTIAL: outputs written, a side mart (tracking / revisions) failed
+            if not isinstance(result, dict) or result.get("status") not in ("OK", "PARTIAL"):
+                status = "FAILED"
+                break
+
+        self.con.execute(
+            "update FORECAST_RUNS set status = ?, config_snapshot = ?::json, updated_at = current_timestamp "
+            "where run_id = ?",
+            [status, json.dumps({k: v["result"] for k, v in stages.items()}, default=str), run_id])
+        return {"run_id": run_id, "status": status, "stages": stages}
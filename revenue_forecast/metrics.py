@@ -0,0 +1,135 @@
+"""
+Backtest metrics computed locally in one grouped pass.
+
+Same formulas as the SQL in the notebook's compute_metrics cell:
+    MAE      = avg(abs_err)
+    RMSE     = sqrt(avg(err * err))
+    WAPE     = sum(abs_err) / nullif(sum(abs_y), 0)
+    MAPE_EPS = avg(iff(abs_y >= mape_epsilon, abs_err / abs_y, null))
+    MASE     = avg(abs_err) / nullif(avg(abs_naive_err), 0)
+    BIAS     = sum(y_pred - y_true) / nullif(sum(abs_y), 0)
+
+SQL NULL semantics are kept: every sum/avg skips its own NULL inputs (a row with
+NULL y_pred still counts in sum(abs_y)), and an empty aggregate or a zero
+denominator gives NaN.
+
+Group by any columns in the frame: MODEL_RUN_ID, HORIZON, ANCHOR_MONTH_SEQ,
+ROLL_UP_SHOP, REASON_GROUP, or CUST_GRP after a join to the customer mix.
+All sums come from np.bincount over one group index, so each metric costs a
+single pass over the rows.
+"""
+
+import numpy as np
+import pandas as pd
+
+METRICS = ("MAE", "RMSE", "WAPE", "MAPE_EPS", "MASE", "BIAS")
+
+SERIES_COLS = ["ROLL_UP_SHOP", "REASON_GROUP"]
+NAIVE_KEYS = ["ROLL_UP_SHOP", "REASON_GROUP", "ANCHOR_MONTH_SEQ", "HORIZON"]
+
+
+def add_naive_errors(pred, baseline_pred, keys=NAIVE_KEYS):
+    """
+    Attach ABS_NAIVE_ERR = |y_true - y_pred| of the baseline run on the same
+    (series, anchor, horizon); left join like the SQL.
+    """
+    naive = baseline_pred[list(keys)].copy()
+    naive["ABS_NAIVE_ERR"] = (baseline_pred["Y_TRUE"] - baseline_pred["Y_PRED"]).abs()
+    return pred.drop(columns=["ABS_NAIVE_ERR"], errors="ignore").merge(naive, on=list(keys), how="left")
+
+
+def _group_index(df, group_by):
+    if not group_by:
+        return np.zeros(len(df), dtype=np.int64), pd.DataFrame(index=[0])
+    grouped = df.groupby(list(group_by), sort=True, dropna=False)
+    codes = grouped.ngroup().to_numpy()
+    keys = grouped.size().reset_index()[list(group_by)]
+    return codes, keys
+
+
+def _ratio(num, den):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(den != 0, num / den, np.nan)
+
+
+def compute_metrics(pred, group_by=("MODEL_RUN_ID",), mape_epsilon=100.0,
+                    y_true="Y_TRUE", y_pred="Y_PRED", naive_err="ABS_NAIVE_ERR"):
+    """
+    MICRO metrics per group: one row per group, columns = group_by + METRICS + N.
+
+    MASE is NaN when the frame has no naive_err column (see add_naive_errors).
+    """
+    codes, out = _group_index(pred, group_by)
+    n_groups = len(out)
+
+    yt = pred[y_true].to_numpy(dtype=float)
+    yp = pred[y_pred].to_numpy(dtype=float)
+    err = yt - yp
+    abs_err = np.abs(err)
+    abs_y = np.abs(yt)
+
+    has_err = ~np.isnan(err)
+    has_y = ~np.isnan(abs_y)
+    in_mape = has_err & has_y & (abs_y >= mape_epsilon)
+
+    def bsum(weights, mask):
+        return np.bincount(codes, weights=np.where(mask, weights, 0.0), minlength=n_groups)
+
+    def bcount(mask):
+        return np.bincount(codes, weights=mask.astype(float), minlength=n_groups)
+
+    n_err = bcount(has_err)
+    s_abs_err = bsum(abs_err, has_err)
+    s_sq_err = bsum(err * err, has_err)
+    s_err_signed = bsum(-err, has_err)
+    s_abs_y = bsum(abs_y, has_y)
+
+    # sum() over all-NULL inputs is NULL, so numerators need at least one row
+    s_abs_err_sql = np.where(n_err > 0, s_abs_err, np.nan)
+    s_err_signed_sql = np.where(n_err > 0, s_err_signed, np.nan)
+    s_abs_y_sql = np.where(bcount(has_y) > 0, s_abs_y, np.nan)
+
+    mae = _ratio(s_abs_err, n_err)
+    out["MAE"] = mae
+    out["RMSE"] = np.sqrt(_ratio(s_sq_err, n_err))
+    out["WAPE"] = _ratio(s_abs_err_sql, s_abs_y_sql)
+    out["MAPE_EPS"] = _ratio(bsum(_ratio(abs_err, abs_y), in_mape), bcount(in_mape))
+
+    if naive_err in pred.columns:
+        ne = pred[naive_err].to_numpy(dtype=float)
+        has_ne = ~np.isnan(ne)
+        out["MASE"] = _ratio(mae, _ratio(bsum(ne, has_ne), bcount(has_ne)))
+    else:
+        out["MASE"] = np.nan
+
+    out["BIAS"] = _ratio(s_err_signed_sql, s_abs_y_sql)
+    out["N"] = np.bincount(codes, minlength=n_groups)
+    return out.reset_index(drop=True)
+
+
+def compute_macro_metrics(pred, group_by=("MODEL_RUN_ID",), series_cols=SERIES_COLS, **kwargs):
+    """
+    MACRO metrics: metrics per series within each group, then the plain average
+    across series (NULL per-series values are skipped, like SQL avg()).
+    """
+    group_by = list(group_by)
+    per_series = compute_metrics(pred, group_by + [c for c in series_cols if c not in group_by], **kwargs)
+
+    codes, out = _group_index(per_series, group_by)
+    for m in METRICS:
+        v = per_series[m].to_numpy(dtype=float)
+        ok = ~np.isnan(v)
+        out[m] = _ratio(
+            np.bincount(codes, weights=np.where(ok, v, 0.0), minlength=len(out)),
+            np.bincount(codes, weights=ok.astype(float), minlength=len(out)),
+        )
+    out["N"] = np.bincount(codes, minlength=len(out))
+    return out.reset_index(drop=True)
+
+
+def to_long(metrics_df, group_by=("MODEL_RUN_ID",)):
+    """Wide metrics -> (group_by..., METRIC_NAME, VALUE), the FORECAST_MODEL_METRICS shape."""
+    return metrics_df.melt(
+        id_vars=list(group_by), value_vars=list(METRICS),
+        var_name="METRIC_NAME", value_name="VALUE",
+    )
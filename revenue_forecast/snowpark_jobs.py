@@ -0,0 +1,238 @@
+"""
+In-warehouse backtests: the same runner as revenue_forecast/training.py, executed
+inside Snowflake so the dataset snapshot never leaves the warehouse.
+
+- GLOBAL models  -> temporary stored procedure (one model over all series)
+- per-series     -> vectorized UDTF partitioned by SERIES_ID (ROLL_UP_SHOP, REASON_GROUP
+                    on snapshots built before the series registry)
+
+Both append straight into FORECAST_MODEL_BACKTEST_PREDICTIONS. Reruns go through
+rewrite_predictions(), which stages the rows and swaps them in atomically
+(SP_REWRITE_BACKTEST_PREDICTIONS).
+
+Works against a real session or Snowpark's local testing session:
+    Session.builder.config("local_testing", True).create()
+"""
+
+import json
+from pathlib import Path
+
+import pandas as pd
+from snowflake.snowpark import Session
+from snowflake.snowpark.functions import col, current_timestamp, lit, vectorized
+from snowflake.snowpark.types import (
+    DecimalType,
+    FloatType,
+    IntegerType,
+    LongType,
+    PandasDataFrameType,
+    StringType,
+    TimestampType,
+)
+
+from revenue_forecast import training
+from revenue_forecast.baselines import PREDICTION_COLUMNS
+
+DATASET_SNAP = "DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP"
+PREDICTIONS_TABLE = "DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS"
+REWRITE_PROC = "DB_BI_P_SANDBOX.SANDBOX.SP_REWRITE_BACKTEST_PREDICTIONS"
+STAGE_TABLE = "TMP_BACKTEST_PREDICTIONS_STAGE"
+
+PACKAGES = ["snowflake-snowpark-python", "pandas", "numpy", "scikit-learn"]
+
+# ship this package with the sproc / UDTF so the handlers import the same code
+PACKAGE_IMPORT = (str(Path(__file__).resolve().parent), "revenue_forecast")
+
+# UDTF output = prediction columns produced by the runner (lo/hi/created_at added after)
+_UDTF_OUTPUT = PandasDataFrameType(
+    [StringType(), StringType(), StringType(),
+     LongType(), LongType(), LongType(), LongType(), LongType(),
+     FloatType(), FloatType()],
+    PREDICTION_COLUMNS[:10],
+)
+
+
+def _dataset(session, run_id, dataset_table):
+    return session.table(dataset_table).filter(col("RUN_ID") == lit(run_id))
+
+
+def _feature_columns(df):
+    """(num_cols, cat_cols) from the Snowpark schema, same rules as training.select_features."""
+    exclude = set(training.ID_COLS + [training.Y_COL] + training.NON_FEATURE_COLS)
+    fields = [f for f in df.schema.fields if f.name not in exclude]
+    cat_cols = [f.name for f in fields if isinstance(f.datatype, StringType)]
+    num_cols = [f.name for f in fields if f.name not in cat_cols]
+    for c in training.SERIES_COLS:
+        if c not in cat_cols:
+            cat_cols.append(c)
+    if "HORIZON" not in num_cols:
+        num_cols.append("HORIZON")
+    return num_cols, cat_cols
+
+
+def _udtf_output(with_series_id):
+    if not with_series_id:
+        return _UDTF_OUTPUT
+    return PandasDataFrameType(
+        list(_UDTF_OUTPUT.col_types) + [LongType()],
+        PREDICTION_COLUMNS[:10] + [training.SERIES_ID_COL],
+    )
+
+
+def _runner_columns(df):
+    """Runner output columns present in df (pandas or Snowpark)."""
+    return PREDICTION_COLUMNS[:10] + \
+        ([training.SERIES_ID_COL] if training.SERIES_ID_COL in df.columns else [])
+
+
+def _table_layout(df):
+    """Pad runner output (first 10 prediction columns, SERIES_ID if present) to the table layout."""
+    return df.select(
+        *[col(c) for c in PREDICTION_COLUMNS[:10]],
+        lit(None).cast(DecimalType(18, 2)).alias("Y_PRED_LO"),
+        lit(None).cast(DecimalType(18, 2)).alias("Y_PRED_HI"),
+        current_timestamp().cast(TimestampType()).alias("CREATED_AT"),
+        *([col(training.SERIES_ID_COL)] if training.SERIES_ID_COL in df.columns else []),
+    )
+
+
+def _append_predictions(df, predictions_table):
+    """Pad runner output to the table layout and append."""
+    _table_layout(df).write.save_as_table(predictions_table, mode="append", column_order="name")
+
+
+def stage_predictions(session, pred_df, stage_table=STAGE_TABLE, predictions_table=PREDICTIONS_TABLE):
+    """Write predictions (pandas or Snowpark) to a temporary table in the predictions layout."""
+    if isinstance(pred_df, pd.DataFrame):
+        if len(pred_df) == 0:
+            session.sql(f"create or replace temporary table {stage_table} like {predictions_table}").collect()
+            return stage_table
+        pred_df = session.create_dataframe(pred_df[_runner_columns(pred_df)])
+    _table_layout(pred_df).write.save_as_table(stage_table, mode="overwrite", table_type="temporary")
+    return stage_table
+
+
+def rewrite_predictions(session, pred_df, model_run_ids=None, stage_table=STAGE_TABLE):
+    """
+    Replace the predictions of model_run_ids (default: the runs in pred_df) with pred_df
+    in one transaction. Returns the procedure result (rewrite_id, rows_replaced, rows_inserted).
+    """
+    stage_predictions(session, pred_df, stage_table)
+    ids = "null" if model_run_ids is None else \
+        "array_construct(" + ", ".join(f"'{m}'" for m in model_run_ids) + ")"
+    res = session.sql(f"call {REWRITE_PROC}('{stage_table}', {ids})").collect()[0][0]
+    res = json.loads(res) if isinstance(res, str) else res
+    if res.get("status") != "OK":
+        raise RuntimeError(f"SP_REWRITE_BACKTEST_PREDICTIONS failed: {res}")
+    return res
+
+
+# ───────────────────────────────────────────────────────────────────────────────
+# GLOBAL model: stored procedure
+# ───────────────────────────────────────────────────────────────────────────────
+
+def _backtest_global_handler(session: Session, run_id: str, candidate: str, model_run_id: str,
+                             eval_anchors: list, eps: float, dataset_table: str,
+                             predictions_table: str) -> int:
+    ds = _dataset(session, run_id, dataset_table).to_pandas()
+    num_cols, cat_cols = training.select_features(ds)
+    ds = training.prepare_features(ds, num_cols, cat_cols)
+
+    pred_df = training.backtest_predictions(
+        ds, candidate, model_run_id, eval_anchors, eps, num_cols, cat_cols
+    )
+    if len(pred_df) > 0:
+        _append_predictions(
+            session.create_dataframe(pred_df[_runner_columns(pred_df)]), predictions_table
+        )
+    return len(pred_df)
+
+
+def register_global_backtest(session):
+    """Register the GLOBAL backtest as a temporary sproc; call it many times (e.g. from threads)."""
+    return session.sproc.register(
+        _backtest_global_handler,
+        packages=PACKAGES,
+        imports=[PACKAGE_IMPORT],
+        replace=True,
+    )
+
+
+def run_global_backtest(session, run_id, candidate, model_run_id, eval_anchors, eps,
+                        dataset_table=DATASET_SNAP, predictions_table=PREDICTIONS_TABLE, sproc=None):
+    """Run the GLOBAL backtest in the warehouse (registers the sproc unless given). Returns row count."""
+    sp = sproc or register_global_backtest(session)
+    return sp(run_id, candidate, model_run_id, [int(a) for a in eval_anchors], float(eps),
+              dataset_table, predictions_table)
+
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Per-series models: vectorized UDTF partitioned by series
+# ───────────────────────────────────────────────────────────────────────────────
+
+def make_series_backtest_udtf(candidate, model_run_id, eval_anchors, eps, input_cols, num_cols, cat_cols):
+    """UDTF handler class with the run config baked in (one model per partition)."""
+    eval_anchors = [int(a) for a in eval_anchors]
+
+    class SeriesBacktest:
+        @vectorized(input=pd.DataFrame)
+        def end_partition(self, df):
+            # Snowflake passes arguments positionally; local testing passes named table columns
+            if set(input_cols).issubset(df.columns):
+                df = pd.DataFrame({c: df[c].to_numpy() for c in input_cols})
+            else:
+                df = pd.DataFrame(df.to_numpy(), columns=input_cols)
+            df = training.prepare_features(df, num_cols, cat_cols)
+            # one series per partition in Snowflake; grouping again keeps the
+            # handler correct wherever partitions are coarser (local testing)
+            out = training.backtest_per_series(
+                df, candidate, model_run_id, eval_anchors, eps, num_cols, cat_cols
+            )
+            return out[_runner_columns(out)]
+
+    return SeriesBacktest
+
+
+def run_series_backtest(session, run_id, candidate, model_run_id, eval_anchors, eps,
+                        dataset_table=DATASET_SNAP, predictions_table=PREDICTIONS_TABLE):
+    """Per-series backtest inside Snowflake; predictions are written in place. Returns row count."""
+    ds = _dataset(session, run_id, dataset_table)
+    num_cols, cat_cols = _feature_columns(ds)
+
+    types = {f.name: f.datatype for f in ds.schema.fields}
+    with_series_id = training.SERIES_ID_COL in types
+    partition_cols = [training.SERIES_ID_COL] if with_series_id else training.SERIES_COLS
+
+    input_cols = list(dict.fromkeys(
+        [c for c in training.ID_COLS if c != "RUN_ID"]
+        + ([training.SERIES_ID_COL] if with_series_id else [])
+        + [training.Y_COL] + num_cols + cat_cols
+    ))
+    input_types = [
+        StringType() if isinstance(types[c], StringType)
+        else FloatType() if c not in ("ANCHOR_MONTH_SEQ", "TARGET_MONTH_SEQ", "HORIZON",
+                                      "ANCHOR_FISCAL_YYYYMM", "TARGET_FISCAL_YYYYMM",
+                                      training.SERIES_ID_COL)
+        else IntegerType()
+        for c in input_cols
+    ]
+
+    udtf = session.udtf.register(
+        make_series_backtest_udtf(candidate, model_run_id, eval_anchors, eps,
+                                  input_cols, num_cols, cat_cols),
+        output_schema=_udtf_output(with_series_id),
+        input_types=[PandasDataFrameType(input_types)],
+        packages=PACKAGES,
+        imports=[PACKAGE_IMPORT],
+        replace=True,
+    )
+
+    out = ds.select(
+        udtf(*[col(c).cast(t) for c, t in zip(input_cols, input_types)])
+        .over(partition_by=partition_cols)
+    ).dropna(subset=["Y_TRUE"])  # runner rows always carry Y_TRUE; drops local-testing padding
+    out = out.cache_result()
+    n = out.count()
+    if n > 0:
+        _append_predictions(out, predictions_table)
+    return n
@@ -0,0 +1,218 @@
+"""
+Model factory + backtest runner for the PC x Reason dataset snapshot.
+
+This is the code the notebook runs locally (backtest_RIDGE_GBR) and the code
+revenue_forecast/snowpark_jobs.py ships into Snowflake, so both paths produce
+the same predictions for the same inputs.
+
+Backtest rules (unchanged from the notebook):
+- For eval anchor a, train on rows whose target month is known at a (target_month_seq <= a)
+- Predict every row with anchor_month_seq == a
+- Rows with a NULL target are dropped from both sides
+- Targets are fit in signed_log1p space and mapped back with signed_expm1
+"""
+
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from revenue_forecast.baselines import PREDICTION_COLUMNS
+
+Y_COL = "Y_REVENUE"
+
+ID_COLS = [
+    "ROLL_UP_SHOP",
+    "REASON_GROUP",
+    "ANCHOR_FISCAL_YYYYMM",
+    "ANCHOR_MONTH_SEQ",
+    "TARGET_FISCAL_YYYYMM",
+    "TARGET_MONTH_SEQ",
+    "HORIZON",
+    "RUN_ID",
+]
+
+# Bookkeeping columns never used as model inputs
+NON_FEATURE_COLS = ["BUILT_AT", "ROW_HASH", "SERIES_ID"]
+
+SERIES_COLS = ["ROLL_UP_SHOP", "REASON_GROUP"]
+
+# Integer surrogate for SERIES_COLS (FORECAST_SERIES_REGISTRY); optional on older snapshots
+SERIES_ID_COL = "SERIES_ID"
+
+# Optional guard for linear models in transformed space
+RIDGE_SLOG_CLIP_MARGIN = 0.25
+
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Target transforms
+# ───────────────────────────────────────────────────────────────────────────────
+
+def signed_log1p(x, eps: float):
+    """
+    Signed log transform:
+      y = sign(x) * log1p(|x| / eps)
+
+    eps > 0 controls how aggressive the compression is.
+    """
+    if eps is None or eps <= 0:
+        raise ValueError("eps must be > 0")
+
+    x = np.asarray(x, dtype=float)
+    return np.sign(x) * np.log1p(np.abs(x) / eps)
+
+
+def signed_expm1(y, eps: float):
+    """
+    Inverse of signed_log1p:
+      x = sign(y) * eps * (expm1(|y|))
+    """
+    if eps is None or eps <= 0:
+        raise ValueError("eps must be > 0")
+
+    y = np.asarray(y, dtype=float)
+    return np.sign(y) * eps * np.expm1(np.abs(y))
+
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Features + models
+# ───────────────────────────────────────────────────────────────────────────────
+
+def select_features(ds):
+    """
+    (num_cols, cat_cols) for a dataset snapshot frame, same rules as the notebook:
+    everything except IDs / target / bookkeeping, object columns are categorical,
+    series identifiers are categorical and HORIZON is numeric.
+    """
+    exclude = set(ID_COLS + [Y_COL] + NON_FEATURE_COLS)
+    feature_cols = [c for c in ds.columns if c not in exclude]
+
+    cat_cols = [c for c in feature_cols if ds[c].dtype == "object"]
+    num_cols = [c for c in feature_cols if c not in cat_cols]
+
+    for c in SERIES_COLS:
+        if c in ds.columns and c not in cat_cols:
+            cat_cols.append(c)
+            if c in num_cols:
+                num_cols.remove(c)
+
+    if "HORIZON" not in num_cols:
+        num_cols.append("HORIZON")
+
+    return num_cols, cat_cols
+
+
+def series_keys(ds):
+    """Columns that identify a series in ds: SERIES_ID when every row has one, else SERIES_COLS."""
+    if SERIES_ID_COL in ds.columns and ds[SERIES_ID_COL].notna().all():
+        return [SERIES_ID_COL]
+    return SERIES_COLS
+
+
+def prediction_columns(ds):
+    """PREDICTION_COLUMNS, plus SERIES_ID when the dataset carries it."""
+    return PREDICTION_COLUMNS + ([SERIES_ID_COL] if SERIES_ID_COL in ds.columns else [])
+
+
+def prepare_features(ds, num_cols, cat_cols):
+    """Defensive null fill (numeric -> 0, categorical -> 'UNKNOWN')."""
+    ds = ds.copy()
+    ds[num_cols] = ds[num_cols].astype(float).fillna(0)
+    ds[cat_cols] = ds[cat_cols].fillna("UNKNOWN").astype(str)
+    return ds
+
+
+def make_model(name, num_cols, cat_cols):
+    """sklearn pipeline for a candidate name (OHE on categoricals, numerics passed through)."""
+    from sklearn.compose import ColumnTransformer
+    from sklearn.ensemble import GradientBoostingRegressor
+    from sklearn.linear_model import Ridge
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+    key = name.upper()
+    if key.startswith("GBR"):
+        pre = ColumnTransformer([
+            ("cat", OneHotEncoder(handle_unknown="ignore"), cat_cols),
+            ("num", "passthrough", num_cols),
+        ])
+        return Pipeline([("pre", pre), ("model", GradientBoostingRegressor(random_state=42))])
+
+    if key.startswith("RIDGE"):
+        pre = ColumnTransformer([
+            ("cat", OneHotEncoder(handle_unknown="ignore"), cat_cols),
+            ("num", StandardScaler(), num_cols),
+        ])
+        return Pipeline([("pre", pre), ("model", Ridge(alpha=1.0))])
+
+    raise ValueError(f"No model factory for candidate '{name}'")
+
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Backtest runner
+# ───────────────────────────────────────────────────────────────────────────────
+
+def backtest_predictions(ds, candidate, model_run_id, eval_anchors, eps,
+                         num_cols, cat_cols, created_at=None):
+    """
+    Expanding-window backtest of one candidate on one frame (all series for a
+    GLOBAL model, or a single series for a per-series model).
+
+    Returns FORECAST_MODEL_BACKTEST_PREDICTIONS rows (with SERIES_ID if ds has it).
+    """
+    columns = prediction_columns(ds)
+    ds = ds[ds[Y_COL].notna()]
+    frames = []
+
+    for a in [int(x) for x in eval_anchors]:
+        train = ds[ds["TARGET_MONTH_SEQ"] <= a]
+        test = ds[ds["ANCHOR_MONTH_SEQ"] == a]
+        if train.empty or test.empty:
+            continue
+
+        pipe = make_model(candidate, num_cols, cat_cols)
+        y_train_t = signed_log1p(train[Y_COL].astype(float).to_numpy(), eps=eps)
+        pipe.fit(train[num_cols + cat_cols], y_train_t)
+        yhat_t = pipe.predict(test[num_cols + cat_cols])
+
+        if candidate.upper().startswith("RIDGE"):
+            yhat_t = np.clip(yhat_t,
+                             np.nanmin(y_train_t) - RIDGE_SLOG_CLIP_MARGIN,
+                             np.nanmax(y_train_t) + RIDGE_SLOG_CLIP_MARGIN)
+
+        frame = pd.DataFrame({
+            "MODEL_RUN_ID": model_run_id,
+            "ROLL_UP_SHOP": test["ROLL_UP_SHOP"].astype(str).to_numpy(),
+            "REASON_GROUP": test["REASON_GROUP"].astype(str).to_numpy(),
+            "ANCHOR_FISCAL_YYYYMM": test["ANCHOR_FISCAL_YYYYMM"].astype(int).to_numpy(),
+            "ANCHOR_MONTH_SEQ": test["ANCHOR_MONTH_SEQ"].astype(int).to_numpy(),
+            "HORIZON": test["HORIZON"].astype(int).to_numpy(),
+            "TARGET_FISCAL_YYYYMM": test["TARGET_FISCAL_YYYYMM"].astype(int).to_numpy(),
+            "TARGET_MONTH_SEQ": test["TARGET_MONTH_SEQ"].astype(int).to_numpy(),
+            "Y_TRUE": test[Y_COL].astype(float).to_numpy(),
+            "Y_PRED": signed_expm1(yhat_t, eps=eps),
+        })
+        if SERIES_ID_COL in columns:
+            frame[SERIES_ID_COL] = test[SERIES_ID_COL].astype("Int64").to_numpy()
+        frames.append(frame)
+
+    out = pd.concat(frames, ignore_index=True) if frames else \
+        pd.DataFrame(columns=[c for c in columns if c not in PREDICTION_COLUMNS[10:]])
+    out["Y_PRED_LO"] = None
+    out["Y_PRED_HI"] = None
+    out["CREATED_AT"] = created_at or datetime.now(timezone.utc).replace(tzinfo=None)
+    return out[columns]
+
+
+def backtest_per_series(ds, candidate, model_run_id, eval_anchors, eps,
+                        num_cols, cat_cols, created_at=None):
+    """One model per series (local twin of the partitioned UDTF)."""
+    created_at = created_at or datetime.now(timezone.utc).replace(tzinfo=None)
+    frames = [
+        backtest_predictions(g, candidate, model_run_id, eval_anchors, eps,
+                             num_cols, cat_cols, created_at)
+        for _, g in ds.groupby(series_keys(ds), sort=True)
+    ]
+    if not frames:
+        return pd.DataFrame(columns=prediction_columns(ds))
+    return pd.concat(frames, ignore_index=True)
@@ -5,6 +5,12 @@
 -- PURPOSE:
 --   Create timestamped snapshot of published forecasts for audit trail and compliance
 --
+-- NOTE:
+--   Superseded by SP_SNAPSHOT_FORECAST_OUTPUT / SP_RESTORE_FORECAST_OUTPUT_SNAPSHOT
+--   (19__proc__snapshot_forecast_output.sql): zero-copy clones of the published marts,
+--   registered in FORECAST_OUTPUT_SNAPSHOT_CATALOG and restored by swap. Kept for the
+--   one-off champion-predictions extract below.
+--
 -- USAGE:
 --   1. Compute UTC timestamp:
 --      # In PowerShell:
@@ -5,6 +5,11 @@
 -- PURPOSE:
 --   Safely delete backtest predictions by model_run_id with automatic timestamped backup
 --
+-- NOTE:
+--   For reruns use SP_REWRITE_BACKTEST_PREDICTIONS (20__proc__rewrite_backtest_predictions.sql):
+--   atomic per-run replace from a staging table, with a time-travel restore point instead
+--   of the CTAS backup below.
+--
 -- USAGE:
 --   1. Compute UTC timestamp:
 --      # In PowerShell:
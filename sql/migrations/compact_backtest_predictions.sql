@@ -0,0 +1,139 @@
+-- ═══════════════════════════════════════════════════════════════════════════════
+-- MIGRATION: COMPACT FORECAST_MODEL_BACKTEST_PREDICTIONS (DROP PER-ROW DETAILS)
+-- ═══════════════════════════════════════════════════════════════════════════════
+--
+-- PURPOSE:
+--   Every prediction row carried a DETAILS variant ({"eps", "candidate", "eval_anchor"}).
+--   eps/candidate are constant per model_run_id and eval_anchor = anchor_month_seq, so the
+--   variant only bloats storage and forces JSON parsing on every scan.
+--
+--   This migration:
+--     1. Moves run-level metadata from DETAILS into FORECAST_MODEL_RUNS.params
+--     2. Rebuilds the predictions table with narrow typed columns, clustered by
+--        (model_run_id, anchor_month_seq)
+--     3. Keeps the pre-migration table as FORECAST_MODEL_BACKTEST_PREDICTIONS_PRE_COMPACT
+--
+--   Queries that still need DETAILS read VW_FORECAST_MODEL_BACKTEST_PREDICTIONS
+--   (see 10__setup__model_tracking_tables.sql).
+--
+-- USAGE:
+--   Run once, top to bottom, with role SNFL_PRD_BI_POWERUSER_FR. Review STEP 3 before STEP 4.
+--
+-- ROLLBACK:
+--   ALTER TABLE DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS
+--     SWAP WITH DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS_PRE_COMPACT;
+-- ═══════════════════════════════════════════════════════════════════════════════
+
+-- ───────────────────────────────────────────────────────────────────────────────
+-- STEP 1: MOVE RUN-LEVEL METADATA INTO FORECAST_MODEL_RUNS.params
+-- ───────────────────────────────────────────────────────────────────────────────
+
+merge into DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_RUNS t
+using (
+  select
+    model_run_id,
+    any_value(details:"candidate")::string as candidate,
+    any_value(details:"eps")::float        as eps,
+    any_value(details:"baseline")::string  as baseline
+  from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS
+  where details is not null
+  group by 1
+) s
+on t.model_run_id = s.model_run_id
+when matched then update set
+  -- existing params win over values recovered from DETAILS (object_insert skips NULL values)
+  params = object_insert(
+             object_insert(
+               object_insert(
+                 coalesce(t.params, object_construct()),
+                 'candidate', coalesce(t.params:"candidate", to_variant(s.candidate)), true),
+               'eps', coalesce(t.params:"eps", to_variant(s.eps)), true),
+             'baseline', coalesce(t.params:"baseline", to_variant(s.baseline)), true);
+
+-- ───────────────────────────────────────────────────────────────────────────────
+-- STEP 2: BUILD COMPACT TABLE
+-- ───────────────────────────────────────────────────────────────────────────────
+
+create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS_COMPACT (
+  model_run_id         string,
+
+  roll_up_shop         string,
+  reason_group         string,
+
+  anchor_fiscal_yyyymm number(6,0),
+  anchor_month_seq     number(6,0),
+  horizon              number(3,0),
+
+  target_fiscal_yyyymm number(6,0),
+  target_month_seq     number(6,0),
+
+  y_true               number(18,2),
+  y_pred               number(18,2),
+
+  y_pred_lo            number(18,2),
+  y_pred_hi            number(18,2),
+
+  created_at           timestamp_ntz
+)
+cluster by (model_run_id, anchor_month_seq);
+
+insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS_COMPACT
+select
+  model_run_id,
+  roll_up_shop,
+  reason_group,
+  anchor_fiscal_yyyymm,
+  anchor_month_seq,
+  horizon,
+  target_fiscal_yyyymm,
+  target_month_seq,
+  y_true,
+  y_pred,
+  y_pred_lo,
+  y_pred_hi,
+  created_at
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS
+order by model_run_id, anchor_month_seq;
+
+-- ───────────────────────────────────────────────────────────────────────────────
+-- STEP 3: VERIFY ROW COUNTS (MANUAL REVIEW REQUIRED)
+-- ───────────────────────────────────────────────────────────────────────────────
+
+select
+  (select count(*) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS)         as old_count,
+  (select count(*) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS_COMPACT) as new_count,
+  iff(old_count = new_count, '✅ SAFE TO SWAP', '❌ COUNTS MISMATCH - DO NOT SWAP') as safety_check;
+
+-- ───────────────────────────────────────────────────────────────────────────────
+-- STEP 4: SWAP + KEEP OLD TABLE FOR ROLLBACK
+-- ───────────────────────────────────────────────────────────────────────────────
+
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS
+  swap with DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS_COMPACT;
+
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS_COMPACT
+  rename to DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS_PRE_COMPACT;
+
+-- Legacy-shape view (same definition as 10__setup__model_tracking_tables.sql)
+create or replace view DB_BI_P_SANDBOX.SANDBOX.VW_FORECAST_MODEL_BACKTEST_PREDICTIONS as
+select
+  p.model_run_id,
+  p.roll_up_shop,
+  p.reason_group,
+  p.anchor_fiscal_yyyymm,
+  p.anchor_month_seq,
+  p.horizon,
+  p.target_fiscal_yyyymm,
+  p.target_month_seq,
+  p.y_true,
+  p.y_pred,
+  p.y_pred_lo,
+  p.y_pred_hi,
+  p.created_at,
+  object_insert(coalesce(r.params, object_construct()), 'eval_anchor', p.anchor_month_seq, true) as details
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS p
+left join DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_RUNS r
+  on r.model_run_id = p.model_run_id;
+
+-- Drop FORECAST_MODEL_BACKTEST_PREDICTIONS_PRE_COMPACT once the new layout has been validated:
+-- DROP TABLE IF EXISTS DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS_PRE_COMPACT;
@@ -0,0 +1,126 @@
+-- ═══════════════════════════════════════════════════════════════════════════════
+-- MIGRATION: DELTA-ENCODE THE MODEL DATASET SNAPSHOT
+-- ═══════════════════════════════════════════════════════════════════════════════
+--
+-- PURPOSE:
+--   FORECAST_MODEL_DATASET_PC_REASON_H_SNAP becomes a view over versioned delta rows
+--   (FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_VERSIONS, 09__proc__build_model_dataset_pc_reason_h.sql),
+--   like the actuals / budget snapshots. Existing physical snapshots are replayed run by
+--   run, oldest first, so every historic run_id still returns the rows it had.
+--
+--   Legacy row_hash values include run_id and the as-of; STEP 1 rewrites them to the
+--   content-only hash the build now uses, otherwise no two runs would share a version.
+--
+-- USAGE:
+--   Run once, top to bottom, with role SNFL_PRD_BI_POWERUSER_FR:
+--     STEP 1 here, then 09__proc__build_model_dataset_pc_reason_h.sql (and 17 / 22),
+--     then STEP 2 - 3 here. Review STEP 3 before dropping the legacy table.
+--   Deploying 09 recreates FORECAST_MODEL_DATASET_PC_REASON_H with its new key (latest
+--   build per series x anchor x horizon); the next run fills it again.
+--
+-- ROLLBACK:
+--   DROP VIEW DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP;
+--   ALTER TABLE DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_LEGACY
+--     RENAME TO DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP;
+--   and redeploy 09 / 17 / 22 from before the change.
+-- ═══════════════════════════════════════════════════════════════════════════════
+
+-- ───────────────────────────────────────────────────────────────────────────────
+-- STEP 1: MOVE THE PHYSICAL SNAPSHOT ASIDE, CONTENT-ONLY ROW_HASH
+-- ───────────────────────────────────────────────────────────────────────────────
+
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP
+  rename to DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_LEGACY;
+
+-- Same expression as SP_BUILD_MODEL_DATASET_PC_REASON_H
+update DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_LEGACY
+set row_hash = md5(
+  coalesce(roll_up_shop,'') || '|' ||
+  coalesce(reason_group,'') || '|' ||
+  coalesce(anchor_fiscal_yyyymm::string,'') || '|' ||
+  coalesce(horizon::string,'') || '|' ||
+  coalesce(target_fiscal_yyyymm::string,'') || '|' ||
+  coalesce(y_revenue::string,'') || '|' ||
+  coalesce(budget_target::string,'') || '|' ||
+  coalesce(lag_1::string,'') || '|' ||
+  coalesce(lag_2::string,'') || '|' ||
+  coalesce(lag_3::string,'') || '|' ||
+  coalesce(lag_6::string,'') || '|' ||
+  coalesce(lag_12::string,'') || '|' ||
+  coalesce(roll_mean_3::string,'') || '|' ||
+  coalesce(roll_mean_6::string,'') || '|' ||
+  coalesce(roll_mean_12::string,'') || '|' ||
+  coalesce(roll_std_12::string,'') || '|' ||
+  coalesce(yoy_diff_12::string,'') || '|' ||
+  coalesce(yoy_pct_12::string,'') || '|' ||
+  coalesce(budget_anchor::string,'') || '|' ||
+  coalesce(budget_lag_12::string,'')
+);
+
+-- >>> now deploy 09__proc__build_model_dataset_pc_reason_h.sql, 17 and 22 <<<
+
+-- ───────────────────────────────────────────────────────────────────────────────
+-- STEP 2: REPLAY LEGACY RUNS IN BUILD ORDER
+-- ───────────────────────────────────────────────────────────────────────────────
+
+execute immediate $$
+declare
+  V_RES variant;
+  V_FAILED number default 0;
+begin
+  let runs resultset := (
+    select s.run_id, s.asof_fiscal_yyyymm,
+           min(s.anchor_month_seq) as seq_start, max(s.anchor_month_seq) as seq_end,
+           coalesce(max(fr.triggered_at), max(s.built_at)) as built_at
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_LEGACY s
+    left join DB_BI_P_SANDBOX.SANDBOX.FORECAST_RUNS fr
+      on fr.run_id = s.run_id
+    group by 1,2
+    order by built_at
+  );
+  let c cursor for runs;
+
+  for r in c do
+    let v_run_id string := r.run_id;
+
+    create or replace temporary table TMP_MIGRATE_DS_SNAP as
+    select *
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_LEGACY
+    where run_id = :v_run_id;
+
+    call DB_BI_P_SANDBOX.SANDBOX.SP_WRITE_MODEL_DATASET_SNAPSHOT(
+      :v_run_id, r.asof_fiscal_yyyymm, 'TMP_MIGRATE_DS_SNAP', r.seq_start, r.seq_end);
+    select $1 into :V_RES from table(result_scan(last_query_id()));
+    if (V_RES:"status"::string <> 'OK') then
+      V_FAILED := V_FAILED + 1;
+    end if;
+  end for;
+
+  return object_construct('status', iff(:V_FAILED = 0, 'OK', 'PARTIAL'), 'failed_runs', :V_FAILED);
+end;
+$$;
+
+-- ───────────────────────────────────────────────────────────────────────────────
+-- STEP 3: VERIFY (MANUAL REVIEW REQUIRED) — must return 0 rows
+-- ───────────────────────────────────────────────────────────────────────────────
+
+(select run_id, roll_up_shop, reason_group, anchor_fiscal_yyyymm, horizon, row_hash
+ from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_LEGACY
+ minus
+ select run_id, roll_up_shop, reason_group, anchor_fiscal_yyyymm, horizon, row_hash
+ from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP)
+union all
+(select run_id, roll_up_shop, reason_group, anchor_fiscal_yyyymm, horizon, row_hash
+ from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP
+ minus
+ select run_id, roll_up_shop, reason_group, anchor_fiscal_yyyymm, horizon, row_hash
+ from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_LEGACY);
+
+-- Storage: legacy rows vs. stored versions
+select
+  (select count(*) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_LEGACY) as legacy_rows,
+  (select count(*) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_VERSIONS) as version_rows,
+  1 - version_rows / nullif(legacy_rows, 0) as reduction;
+
+-- Drop the legacy table once validated:
+-- DROP TABLE IF EXISTS DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_LEGACY;
@@ -0,0 +1,136 @@
+-- ═══════════════════════════════════════════════════════════════════════════════
+-- MIGRATION: DELTA-ENCODE ACTUALS / BUDGET SNAPSHOTS
+-- ═══════════════════════════════════════════════════════════════════════════════
+--
+-- PURPOSE:
+--   FORECAST_ACTUALS_PC_REASON_MTH_SNAP and FORECAST_BUDGET_PC_REASON_MTH_SNAP become views
+--   over versioned delta tables (18__proc__write_pc_reason_mth_snapshot.sql). Existing
+--   physical snapshots are replayed run by run, oldest first, so every historic run_id
+--   still returns exactly the rows it had.
+--
+-- USAGE:
+--   Run once, top to bottom, with role SNFL_PRD_BI_POWERUSER_FR:
+--     STEP 1 here, then 18__proc__write_pc_reason_mth_snapshot.sql, then STEP 2 - 3 here.
+--   Review STEP 3 before dropping the legacy tables.
+--
+-- ROLLBACK:
+--   DROP VIEW DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP;
+--   ALTER TABLE DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP_LEGACY
+--     RENAME TO DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP;
+--   (same for BUDGET), and redeploy 06 / 08 / 14 from before the change.
+-- ═══════════════════════════════════════════════════════════════════════════════
+
+-- ───────────────────────────────────────────────────────────────────────────────
+-- STEP 1: MOVE THE PHYSICAL SNAPSHOTS ASIDE
+-- ───────────────────────────────────────────────────────────────────────────────
+
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP
+  rename to DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP_LEGACY;
+
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP
+  rename to DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP_LEGACY;
+
+-- >>> now deploy 18__proc__write_pc_reason_mth_snapshot.sql <<<
+
+-- ───────────────────────────────────────────────────────────────────────────────
+-- STEP 2: REPLAY LEGACY RUNS IN SNAPSHOT ORDER
+-- ───────────────────────────────────────────────────────────────────────────────
+
+execute immediate $$
+declare
+  V_RES variant;
+  V_FAILED number default 0;
+begin
+  let runs resultset := (
+    select run_id, asof_fiscal_yyyymm, min(month_seq) as seq_start, max(month_seq) as seq_end,
+           min(snapshotted_at) as snapshotted_at
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP_LEGACY
+    group by 1,2
+    order by snapshotted_at
+  );
+  let c cursor for runs;
+
+  for r in c do
+    let v_run_id string := r.run_id;
+
+    create or replace temporary table TMP_MIGRATE_ACT_SNAP as
+    select fiscal_yyyymm, fiscal_year, fiscal_month, month_seq, month_start_date, month_end_date,
+           roll_up_shop, reason_group, total_revenue as value, source_object, row_hash
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP_LEGACY
+    where run_id = :v_run_id;
+
+    call DB_BI_P_SANDBOX.SANDBOX.SP_WRITE_PC_REASON_MTH_SNAPSHOT(
+      'ACTUALS_PC_REASON_MTH', :v_run_id, r.asof_fiscal_yyyymm, 'TMP_MIGRATE_ACT_SNAP', r.seq_start, r.seq_end);
+    select $1 into :V_RES from table(result_scan(last_query_id()));
+    if (V_RES:"status"::string <> 'OK') then
+      V_FAILED := V_FAILED + 1;
+    end if;
+  end for;
+
+  let bruns resultset := (
+    select run_id, asof_fiscal_yyyymm, min(month_seq) as seq_start, max(month_seq) as seq_end,
+           min(snapshotted_at) as snapshotted_at
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP_LEGACY
+    group by 1,2
+    order by snapshotted_at
+  );
+  let bc cursor for bruns;
+
+  for r in bc do
+    let v_run_id string := r.run_id;
+
+    create or replace temporary table TMP_MIGRATE_BUD_SNAP as
+    select fiscal_yyyymm, fiscal_year, fiscal_month, month_seq, month_start_date, month_end_date,
+           roll_up_shop, reason_group, total_budget as value, source_object, row_hash
+    from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP_LEGACY
+    where run_id = :v_run_id;
+
+    call DB_BI_P_SANDBOX.SANDBOX.SP_WRITE_PC_REASON_MTH_SNAPSHOT(
+      'BUDGET_PC_REASON_MTH', :v_run_id, r.asof_fiscal_yyyymm, 'TMP_MIGRATE_BUD_SNAP', r.seq_start, r.seq_end);
+    select $1 into :V_RES from table(result_scan(last_query_id()));
+    if (V_RES:"status"::string <> 'OK') then
+      V_FAILED := V_FAILED + 1;
+    end if;
+  end for;
+
+  return object_construct('status', iff(:V_FAILED = 0, 'OK', 'PARTIAL'), 'failed_runs', :V_FAILED);
+end;
+$$;
+
+-- ───────────────────────────────────────────────────────────────────────────────
+-- STEP 3: VERIFY (MANUAL REVIEW REQUIRED) — both queries must return 0 rows
+-- ───────────────────────────────────────────────────────────────────────────────
+
+(select run_id, fiscal_yyyymm, roll_up_shop, reason_group, row_hash
+ from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP_LEGACY
+ minus
+ select run_id, fiscal_yyyymm, roll_up_shop, reason_group, row_hash
+ from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP)
+union all
+(select run_id, fiscal_yyyymm, roll_up_shop, reason_group, row_hash
+ from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP
+ minus
+ select run_id, fiscal_yyyymm, roll_up_shop, reason_group, row_hash
+ from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP_LEGACY);
+
+(select run_id, fiscal_yyyymm, roll_up_shop, reason_group, row_hash
+ from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP_LEGACY
+ minus
+ select run_id, fiscal_yyyymm, roll_up_shop, reason_group, row_hash
+ from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP)
+union all
+(select run_id, fiscal_yyyymm, roll_up_shop, reason_group, row_hash
+ from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP
+ minus
+ select run_id, fiscal_yyyymm, roll_up_shop, reason_group, row_hash
+ from DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP_LEGACY);
+
+-- Storage: legacy rows vs. stored versions
+select
+  (select count(*) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP_LEGACY) as legacy_rows,
+  (select count(*) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP_VERSIONS) as version_rows,
+  1 - version_rows / nullif(legacy_rows, 0) as reduction;
+
+-- Drop the legacy tables once validated:
+-- DROP TABLE IF EXISTS DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP_LEGACY;
+-- DROP TABLE IF EXISTS DB_BI_P_SANDBOX.SANDBOX.FORECAST_BUDGET_PC_REASON_MTH_SNAP_LEGACY;
@@ -0,0 +1,22 @@
+-- ═══════════════════════════════════════════════════════════════════════════════
+-- MIGRATION: FORECAST_MODEL_METRICS SLICE COLUMNS
+-- ═══════════════════════════════════════════════════════════════════════════════
+--
+-- PURPOSE:
+--   SP_COMPUTE_BACKTEST_METRICS (12__proc__compute_backtest_metrics.sql) writes
+--   BY_ANCHOR and PC_REASON scopes. Existing deployments of
+--   10__setup__model_tracking_tables.sql need the slice columns added in place
+--   (re-running the setup script would drop existing metrics).
+--
+-- USAGE:
+--   Run once with role SNFL_PRD_BI_POWERUSER_FR. Safe to re-run.
+-- ═══════════════════════════════════════════════════════════════════════════════
+
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_METRICS
+  add column if not exists anchor_month_seq number;
+
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_METRICS
+  add column if not exists roll_up_shop string;
+
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_METRICS
+  add column if not exists reason_group string;
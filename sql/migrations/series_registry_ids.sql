@@ -0,0 +1,154 @@
+-- ═══════════════════════════════════════════════════════════════════════════════
+-- MIGRATION: SERIES REGISTRY IDS ON EXISTING TABLES
+-- ═══════════════════════════════════════════════════════════════════════════════
+--
+-- PURPOSE:
+--   Adds series_id (and cust_grp_id on the customer mart) to the tables that already hold
+--   data, and backfills them from FORECAST_SERIES_REGISTRY / FORECAST_CUST_GRP_REGISTRY
+--   (21__setup__series_registry.sql). The string keys stay; the ids sit next to them.
+--
+--   FORECAST_ACTUALS_PC_REASON_MTH, the model dataset tables and the backtest predictions
+--   are written with explicit column lists, so the column is simply appended. The output
+--   marts are inserted positionally by SP_SCORE_AND_PUBLISH_MARTS and are rebuilt in the
+--   new column order.
+--
+-- USAGE:
+--   Run once, top to bottom, with role SNFL_PRD_BI_POWERUSER_FR:
+--     deploy 21__setup__series_registry.sql, then STEP 1 - 4 here, then redeploy the
+--     procedures of 03 / 06 / 09 / 11 / 20 (procedure blocks only: the table DDL in those
+--     files recreates the tables empty).
+--
+-- ROLLBACK:
+--   ALTER TABLE ... DROP COLUMN series_id on the tables in STEP 2; for the marts,
+--   ALTER TABLE ..._PRE_SERIES_ID SWAP WITH ... (kept until STEP 4 drops them); redeploy
+--   the procedures from before the change.
+-- ═══════════════════════════════════════════════════════════════════════════════
+
+-- ───────────────────────────────────────────────────────────────────────────────
+-- STEP 1: REGISTER EVERY SERIES IN THE AGGREGATE
+-- ───────────────────────────────────────────────────────────────────────────────
+
+call DB_BI_P_SANDBOX.SANDBOX.SP_REGISTER_SERIES('MIGRATION');
+
+-- Series present downstream but no longer in the aggregate still need an id
+insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY
+(series_id, roll_up_shop, reason_group, first_run_id, registered_at)
+select DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_ID_SEQ.nextval, n.roll_up_shop, n.reason_group,
+       'MIGRATION', current_timestamp()
+from (
+  select roll_up_shop, reason_group from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH
+  union
+  select roll_up_shop, reason_group from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP
+  union
+  select roll_up_shop, reason_group from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS
+) n
+where not exists (
+  select 1 from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY r
+  where r.roll_up_shop = n.roll_up_shop
+    and equal_null(r.reason_group, n.reason_group)
+)
+order by 1, 2;
+
+-- ───────────────────────────────────────────────────────────────────────────────
+-- STEP 2: APPEND + BACKFILL series_id
+-- ───────────────────────────────────────────────────────────────────────────────
+
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH add column series_id number;
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H add column series_id number;
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP add column series_id number;
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS add column series_id number;
+
+update DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH t
+set series_id = r.series_id
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY r
+where r.roll_up_shop = t.roll_up_shop
+  and equal_null(r.reason_group, t.reason_group);
+
+update DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H t
+set series_id = r.series_id
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY r
+where r.roll_up_shop = t.roll_up_shop
+  and equal_null(r.reason_group, t.reason_group);
+
+update DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP t
+set series_id = r.series_id
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY r
+where r.roll_up_shop = t.roll_up_shop
+  and equal_null(r.reason_group, t.reason_group);
+
+update DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS t
+set series_id = r.series_id
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY r
+where r.roll_up_shop = t.roll_up_shop
+  and equal_null(r.reason_group, t.reason_group);
+
+-- ───────────────────────────────────────────────────────────────────────────────
+-- STEP 3: REBUILD THE OUTPUT MARTS IN THE NEW COLUMN ORDER
+-- ───────────────────────────────────────────────────────────────────────────────
+
+create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH_NEW as
+select
+  o.forecast_run_id, o.asof_fiscal_yyyymm, o.forecast_created_at,
+  o.roll_up_shop, o.reason_group, r.series_id::number as series_id,
+  o.target_fiscal_yyyymm, o.target_fiscal_year, o.target_fiscal_month, o.target_month_seq,
+  o.target_month_start, o.target_month_end,
+  o.horizon,
+  o.revenue_forecast, o.revenue_forecast_lo, o.revenue_forecast_hi,
+  o.model_run_id, o.model_family, o.model_scope,
+  o.published_at
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH o
+left join DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY r
+  on r.roll_up_shop = o.roll_up_shop
+ and equal_null(r.reason_group, nullif(o.reason_group, 'TOTAL'));   -- scoring writes null reasons as 'TOTAL'
+
+create or replace table DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH_NEW as
+select
+  o.forecast_run_id, o.asof_fiscal_yyyymm, o.forecast_created_at,
+  o.roll_up_shop, o.reason_group, r.series_id::number as series_id,
+  o.cust_grp, cg.cust_grp_id::number as cust_grp_id,
+  o.target_fiscal_yyyymm, o.target_fiscal_year, o.target_fiscal_month, o.target_month_seq,
+  o.target_month_start, o.target_month_end,
+  o.horizon,
+  o.revenue_forecast, o.allocation_share, o.allocation_level,
+  o.published_at
+from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH o
+left join DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY r
+  on r.roll_up_shop = o.roll_up_shop
+ and equal_null(r.reason_group, nullif(o.reason_group, 'TOTAL'))
+left join DB_BI_P_SANDBOX.SANDBOX.FORECAST_CUST_GRP_REGISTRY cg
+  on cg.cust_grp = o.cust_grp;
+
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH_NEW
+  swap with DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH;
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH_NEW
+  rename to DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH_PRE_SERIES_ID;
+
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH_NEW
+  swap with DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH;
+alter table DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH_NEW
+  rename to DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH_PRE_SERIES_ID;
+
+-- ───────────────────────────────────────────────────────────────────────────────
+-- STEP 4: VERIFY (MANUAL REVIEW REQUIRED) — every count must be 0
+-- ───────────────────────────────────────────────────────────────────────────────
+
+select 'actuals' as tbl, count_if(series_id is null) as missing_ids from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH
+union all
+select 'dataset', count_if(series_id is null) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H
+union all
+select 'dataset_snap', count_if(series_id is null) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP
+union all
+select 'backtest', count_if(series_id is null) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_BACKTEST_PREDICTIONS
+union all
+select 'output_cust_grp', count_if(cust_grp_id is null) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH;
+
+-- Row counts unchanged by the rebuild
+select
+  (select count(*) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH)
+    - (select count(*) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH_PRE_SERIES_ID) as pc_diff,
+  (select count(*) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH)
+    - (select count(*) from DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH_PRE_SERIES_ID) as cust_diff;
+
+-- Drop the pre-migration marts once validated:
+-- DROP TABLE IF EXISTS DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_MTH_PRE_SERIES_ID;
+-- DROP TABLE IF EXISTS DB_BI_P_SANDBOX.SANDBOX.FORECAST_OUTPUT_PC_REASON_CUST_MTH_PRE_SERIES_ID;
@@ -0,0 +1,115 @@
+"""
+Tests for the vectorized baseline engine (revenue_forecast/baselines.py).
+
+Each baseline is checked against a plain per-series loop on a small synthetic
+portfolio, and the output frame is checked against the predictions table DDL.
+"""
+
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from revenue_forecast import baselines as bl
+
+
+def _actuals():
+    """Three series over 40 months: seasonal, trending with gaps, intermittent."""
+    rng = np.random.default_rng(7)
+    rows = []
+    for seq in range(1, 41):
+        yyyymm = 2021 * 100 + seq if seq <= 12 else (2021 + (seq - 1) // 12) * 100 + (seq - 1) % 12 + 1
+        rows.append(("100", "Routine", seq, yyyymm, 1000 + 200 * np.sin(seq / 12 * 2 * np.pi) + rng.normal(0, 10)))
+        if seq % 7 != 0:  # gaps: no actuals row
+            rows.append(("100", "Project", seq, yyyymm, 50.0 * seq))
+        rows.append(("200", "Routine", seq, yyyymm, 300.0 if seq % 4 == 0 else 0.0))
+    return pd.DataFrame(rows, columns=["ROLL_UP_SHOP", "REASON_GROUP", "MONTH_SEQ", "FISCAL_YYYYMM", "TOTAL_REVENUE"])
+
+
+def _series(df, shop, reason):
+    s = df[(df.ROLL_UP_SHOP == shop) & (df.REASON_GROUP == reason)]
+    return dict(zip(s.MONTH_SEQ, s.TOTAL_REVENUE))
+
+
+def test_matrix_keeps_missing_months_as_nan():
+    m = bl.build_series_matrix(_actuals())
+    assert list(m.month_seq) == list(range(1, 41))
+    row = m.keys.index[(m.keys.ROLL_UP_SHOP == "100") & (m.keys.REASON_GROUP == "Project")][0]
+    assert np.isnan(m.values[row, 6])          # month_seq 7
+    assert m.values[row, 7] == 400.0           # month_seq 8
+
+
+def test_baselines_match_per_series_loop():
+    df = _actuals()
+    m = bl.build_series_matrix(df)
+    anchors = [24, 30, 36]
+    preds = bl.compute_baselines(m, anchors, max_horizon=4)
+
+    for i, k in m.keys.iterrows():
+        y = _series(df, k.ROLL_UP_SHOP, k.REASON_GROUP)
+        hist = sorted(y)
+        for j, a in enumerate(anchors):
+            past = [s for s in hist if s <= a]
+            for h in range(1, 5):
+                expect = {
+                    "SEASONAL_NAIVE_LAG12": y.get(a + h - 12, np.nan),
+                    "NAIVE": y.get(a, np.nan),
+                    "DRIFT": y.get(a, np.nan) + h * (y.get(a, np.nan) - y[past[0]]) / (a - past[0]),
+                    "SEASONAL_MEAN": np.nanmean([y.get(a + h - 12 * (k_ + 1), np.nan) for k_ in range(3)]),
+                }
+                for name, value in expect.items():
+                    np.testing.assert_allclose(preds[name][i, j, h - 1], value, equal_nan=True, err_msg=name)
+
+            level = None
+            for s in past:
+                level = y[s] if level is None else 0.3 * y[s] + 0.7 * level
+            np.testing.assert_allclose(preds["SES"][i, j, :], level)
+
+
+def test_croston_on_intermittent_series():
+    m = bl.build_series_matrix(_actuals())
+    row = m.keys.index[m.keys.ROLL_UP_SHOP == "200"][0]
+    preds = bl.compute_baselines(m, [36], max_horizon=12, baselines=["CROSTON"])["CROSTON"]
+    # demand of 300 every 4th month -> rate 75 per month
+    np.testing.assert_allclose(preds[row, 0, :], 75.0)
+
+
+def test_croston_interval_starts_at_first_actual():
+    pattern = np.tile([0.0, 0.0, 0.0, 300.0], 5)
+    early = pattern[None, :]
+    late = np.concatenate([np.full(8, np.nan), pattern])[None, :]   # series starts 8 months later
+    horizons = np.arange(1, 2)
+    got = bl.croston(late, np.arange(8, 28), horizons)
+    expect = bl.croston(early, np.arange(0, 20), horizons)
+    np.testing.assert_allclose(got, expect)
+
+
+def test_prediction_rows_match_table_and_skip_missing_targets():
+    df = _actuals()
+    out = bl.run_baselines(df, anchors=[30, 36], model_run_ids={"NAIVE": "m1", "SEASONAL_NAIVE_LAG12": "m2"})
+
+    ddl = (Path(__file__).parent.parent / "10__setup__model_tracking_tables.sql").read_text(encoding="utf-8")
+    block = re.search(r"FORECAST_MODEL_BACKTEST_PREDICTIONS \((.*?)\n\)", ddl, re.S).group(1)
+    table_cols = [line.split()[0].upper() for line in block.splitlines() if line.strip() and not line.strip().startswith("--")]
+    # series_id is resolved from FORECAST_SERIES_REGISTRY when the rows are written
+    assert list(out.columns) == [c for c in table_cols if c != "SERIES_ID"]
+
+    # 3 series x 2 anchors x 12 horizons, minus targets past month 40, minus gap months
+    assert set(out.MODEL_RUN_ID) == {"m1", "m2"}
+    assert out.Y_TRUE.notna().all()
+    assert (out.TARGET_MONTH_SEQ == out.ANCHOR_MONTH_SEQ + out.HORIZON).all()
+    assert (out.TARGET_MONTH_SEQ <= 40).all()
+    project = out[(out.REASON_GROUP == "Project") & (out.MODEL_RUN_ID == "m1")]
+    assert not (project.TARGET_MONTH_SEQ % 7 == 0).any()
+
+    row = out[(out.MODEL_RUN_ID == "m2") & (out.ROLL_UP_SHOP == "200") & (out.ANCHOR_MONTH_SEQ == 30) & (out.HORIZON == 2)]
+    assert row.TARGET_FISCAL_YYYYMM.item() == df.loc[df.MONTH_SEQ == 32, "FISCAL_YYYYMM"].iloc[0]
+    assert row.Y_PRED.item() == 300.0   # month 20
+
+
+def test_unknown_baseline_rejected():
+    m = bl.build_series_matrix(_actuals())
+    with pytest.raises(ValueError, match="Unknown baselines"):
+        bl.compute_baselines(m, [24], baselines=["PROPHET"])
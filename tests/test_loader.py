@@ -0,0 +1,86 @@
+"""
+Tests for the streaming dataset loader (revenue_forecast/loader.py).
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from revenue_forecast.loader import load_dataset  # noqa: E402
+
+
+def _frames(n_batches=5, rows=1000):
+    for b in range(n_batches):
+        yield pd.DataFrame({
+            "ROLL_UP_SHOP": [str(100 + i % 7) for i in range(rows)],
+            "ANCHOR_MONTH_SEQ": np.full(rows, b + 13, dtype=np.int64),
+            "LAG_1": np.arange(rows, dtype=float) + b,
+        })
+
+
+def _expected():
+    return pd.concat(list(_frames()), ignore_index=True)
+
+
+def test_small_result_stays_in_memory():
+    with load_dataset(_frames(), memory_budget_mb=64) as data:
+        assert not data.spilled
+        assert data.num_rows == 5000
+        pd.testing.assert_frame_equal(data.to_pandas(), _expected())
+
+
+def test_over_budget_spills_and_memory_maps(tmp_path):
+    data = load_dataset(_frames(), memory_budget_mb=0.05, spill_dir=tmp_path)
+    assert data.spilled
+    assert os.path.dirname(data.path) == str(tmp_path)
+
+    pd.testing.assert_frame_equal(data.to_pandas(), _expected())
+
+    batches = list(data.iter_batches(columns=["LAG_1"]))
+    assert sum(len(b) for b in batches) == 5000
+    assert list(batches[0].columns) == ["LAG_1"]
+
+    path = data.path
+    data.close()
+    assert not os.path.exists(path)
+
+
+def test_empty_source():
+    with load_dataset(iter([]), memory_budget_mb=1) as data:
+        assert data.num_rows == 0
+        assert list(data.iter_batches()) == []
+
+
+@pytest.mark.parametrize("budget_mb", [64, 0])
+def test_all_null_first_batch_takes_type_from_later_batches(tmp_path, budget_mb):
+    frames = [
+        pd.DataFrame({"REASON_GROUP": [None, None], "LAG_1": [1.0, 2.0]}),
+        pd.DataFrame({"REASON_GROUP": [None], "LAG_1": [3.0]}),
+        pd.DataFrame({"REASON_GROUP": ["Routine"], "LAG_1": [4.0]}),
+    ]
+    with load_dataset(frames, memory_budget_mb=budget_mb, spill_dir=tmp_path) as data:
+        assert data.spilled == (budget_mb == 0)
+        assert data.schema.field("REASON_GROUP").type == "string"
+        out = data.to_pandas()
+    assert list(tmp_path.iterdir()) == []          # rewritten spill file removed on close
+    assert out["REASON_GROUP"].tolist() == [None, None, None, "Routine"]
+    assert out["LAG_1"].tolist() == [1.0, 2.0, 3.0, 4.0]
+
+
+@pytest.mark.parametrize("budget_mb", [64, 0])
+def test_integer_width_and_float_promotion_across_batches(tmp_path, budget_mb):
+    frames = [
+        pd.DataFrame({"SERIES_ID": np.array([1, 2], dtype=np.int8), "N": np.array([5, 6], dtype=np.int64)}),
+        pd.DataFrame({"SERIES_ID": np.array([300], dtype=np.int16), "N": [7.5]}),
+        pd.DataFrame({"SERIES_ID": np.array([3], dtype=np.int8), "N": np.array([8], dtype=np.int64)}),
+    ]
+    with load_dataset(frames, memory_budget_mb=budget_mb, spill_dir=tmp_path) as data:
+        assert data.schema.field("SERIES_ID").type == "int16"
+        assert data.schema.field("N").type == "double"
+        out = data.to_pandas()
+    assert out["SERIES_ID"].tolist() == [1, 2, 300, 3]
+    assert out["N"].tolist() == [5.0, 6.0, 7.5, 8.0]
@@ -0,0 +1,337 @@
+"""
+Tests for the local DuckDB backend (revenue_forecast/local_backend.py).
+
+The pipeline procedures run from the repo's .sql files against small Parquet
+fixtures written here; results are checked against pandas on the same data.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+
+from revenue_forecast.local_backend import LocalBackend, translate  # noqa: E402
+
+ASOF = 202406
+SHOPS = {"S100": 40000.0, "S200": 25000.0, "S300": 300.0}    # S300: below MIN_AVG_ABS_REV_PER_MONTH
+REASONS = ["R1", "R2", None]
+CUST_GRPS = ["CAPX", "EXT", None]
+
+
+def _months(start, end):
+    return [int(p.strftime("%Y%m")) for p in pd.period_range(start, end, freq="M")]
+
+
+def _agg():
+    rows = []
+    for m_idx, yyyymm in enumerate(_months("2020-01", "2024-06")):
+        month = yyyymm % 100
+        for s_idx, (shop, base) in enumerate(SHOPS.items()):
+            for r_idx, reason in enumerate(REASONS):
+                for c_idx, cust in enumerate(CUST_GRPS):
+                    rev = base * (1 + 0.2 * np.sin(2 * np.pi * month / 12)) * (1 + 0.01 * m_idx) \
+                        * (1 + r_idx) / (2 + c_idx)
+                    if (m_idx + s_idx + c_idx) % 7 == 0:
+                        rev = -rev / 10                      # credit notes
+                    rows.append({
+                        "FISCAL_YYYYMM": yyyymm, "ROLL_UP_SHOP": shop, "REASON_GROUP": reason,
+                        "CUST_GRP": cust, "TOTAL_REVENUE": round(rev, 2), "ABS_REVENUE": round(abs(rev), 2),
+                        "TOTAL_BUDGET": round(rev * 1.05, 2), "SOURCE_ROWS": 3,
+                        "LOADED_AT": pd.Timestamp("2024-07-02"),
+                    })
+    return pd.DataFrame(rows)
+
+
+def _write_fixtures(path):
+    days = pd.date_range("2019-01-01", "2025-12-31", freq="D")
+    pd.DataFrame({
+        "FISCAL_YEAR": days.year, "FISCAL_MONTH": days.month, "ACTUAL_DATE": days.date,
+        "DAYS_IN_FISCAL_MONTH": days.days_in_month,
+    }).to_parquet(path / "DIM_DATE_5.parquet")
+
+    agg = _agg()
+    agg.to_parquet(path / "FORECAST_REVENUE_AGG_MTH.parquet")
+    fp = agg.groupby("FISCAL_YYYYMM").agg(SOURCE_ROWS=("SOURCE_ROWS", "sum"),
+                                          FINGERPRINT=("TOTAL_REVENUE", lambda v: int(v.abs().sum() * 100)))
+    fp.reset_index().assign(REFRESHED_AT=pd.Timestamp("2024-07-02")) \
+        .to_parquet(path / "FORECAST_REVENUE_AGG_MTH_FINGERPRINT.parquet")
+
+    pd.DataFrame({
+        "CONFIG_KEY": ["LOOKBACK_MONTHS", "MIN_MONTHS_PRESENT", "MIN_NONZERO_MONTHS",
+                       "MIN_AVG_ABS_REV_PER_MONTH", "MIN_HISTORY_MONTHS_SINCE_FIRST_NONZERO"],
+        "VALUE_NUMBER": [12.0, 12.0, 3.0, 5000.0, 12.0],
+        "VALUE_STRING": pd.Series([None] * 5, dtype="string"),
+    }).to_parquet(path / "RNA_RCT_CONFIG_SHOP_ELIGIBILITY.parquet")
+
+    pd.DataFrame({
+        "ROLL_UP_SHOP": ["S999"], "EFFECTIVE_START": [pd.Timestamp("2020-01-01").date()],
+        "EFFECTIVE_END": pd.Series([None], dtype="datetime64[ns]").dt.date,
+        "UPDATED_AT": [pd.Timestamp("2024-01-01")],
+    }).to_parquet(path / "FORECAST_PC_MANUAL_EXCLUSIONS.parquet")
+
+    pd.DataFrame({
+        "MODEL_RUN_ID": ["MR_BASELINE"], "MODEL_FAMILY": ["baseline"], "MODEL_SCOPE": ["GLOBAL"],
+        "PARAMS": [json.dumps({"candidate": "SEASONAL_NAIVE"})],
+    }).to_parquet(path / "FORECAST_MODEL_RUNS.parquet")
+
+    pd.DataFrame({
+        "ASOF_FISCAL_YYYYMM": [ASOF], "CHAMPION_SCOPE": ["GLOBAL"],
+        "ROLL_UP_SHOP": pd.Series([None], dtype="string"), "REASON_GROUP": pd.Series([None], dtype="string"),
+        "MODEL_RUN_ID": ["MR_BASELINE"], "SELECTION_METRIC": ["WAPE_OVERALL"],
+    }).to_parquet(path / "FORECAST_MODEL_CHAMPIONS.parquet")
+
+    pd.DataFrame({
+        "MODEL_RUN_ID": ["MR_OTHER"], "SERIES_ID": [0], "ANCHOR_MONTH_SEQ": [60], "HORIZON": [1],
+        "Y_TRUE": [1.0], "Y_PRED": [1.0],
+    }).to_parquet(path / "FORECAST_MODEL_BACKTEST_PREDICTIONS.parquet")
+    return agg
+
+
+@pytest.fixture(scope="module")
+def run(tmp_path_factory):
+    path = tmp_path_factory.mktemp("fixtures")
+    agg = _write_fixtures(path)
+    backend = LocalBackend.from_fixtures(path)
+    result = backend.run_pipeline(asof_fiscal_yyyymm=ASOF)
+    return backend, result, agg
+
+
+def _actuals_expected(agg):
+    """{(fiscal_yyyymm, shop, reason or 'TOTAL'): revenue}, as scoring keys null reasons."""
+    keyed = agg.assign(REASON_GROUP=agg["REASON_GROUP"].fillna("TOTAL"))
+    return keyed.groupby(["FISCAL_YYYYMM", "ROLL_UP_SHOP", "REASON_GROUP"])["TOTAL_REVENUE"].sum().to_dict()
+
+
+def test_translate_dialect():
+    sql = translate("""
+      select iff(a > 0, 'x', null)::string as c, :V_X as v, s.value:"status"::string as st,
+             array_construct_compact(iff(a > 0, 'A', null)) as arr,
+             DB_BI_P_SANDBOX.SANDBOX.SEQ.nextval as n, seq4() as h, count_if(a > 0) over () as k,
+             array_to_string(array_append(:V_W, 'w'), '; ') as w
+      from table(generator(rowcount => 12))
+    """)
+    assert "DB_BI_P_SANDBOX" not in sql
+    assert "json_extract_string(s.value, '$.status')" in sql
+    assert "list_filter(list_value(" in sql
+    assert "nextval('SEQ')" in sql
+    assert "from range(12)" in sql
+    assert "count(*) filter (where a > 0) over ()" in sql
+    assert "list_append(cast(json(:V_W) as json[]), to_json('w'))" in sql
+    assert ":V_X" in sql                               # bind variables are left to the caller
+    assert "'x'" in sql
+
+
+def test_pipeline_runs_every_stage(run):
+    _, result, _ = run
+    assert result["status"] == "SUCCEEDED", result
+    assert list(result["stages"]) == [
+        "eligibility", "actuals_pc_reason_mth", "budget_pc_reason_mth",
+        "cust_mix_pc_reason", "model_dataset_pc_reason_h", "score_and_publish",
+    ]
+
+
+def test_eligibility_matches_rules(run):
+    backend, result, _ = run
+    elig = backend.table("FORECAST_PC_ELIGIBILITY").set_index("roll_up_shop")
+    assert bool(elig.loc["S100", "is_eligible"]) and bool(elig.loc["S200", "is_eligible"])
+    assert not bool(elig.loc["S300", "is_eligible"])
+    assert json.loads(elig.loc["S300", "exclusion_reasons"]) == ["LOW_AVG_ABS_REVENUE"]
+    rules = backend.table("FORECAST_PC_ELIGIBILITY_RULES")
+    assert len(rules) == 5 * len(SHOPS)
+
+
+def test_actuals_match_source_sums(run):
+    backend, _, agg = run
+    act = backend.table("FORECAST_ACTUALS_PC_REASON_MTH")
+    got = {(int(r.fiscal_yyyymm), r.roll_up_shop, r.reason_group or "TOTAL"): float(r.total_revenue)
+           for r in act.itertuples()}
+    exp = _actuals_expected(agg)
+    assert got.keys() == exp.keys()
+    for key, value in exp.items():
+        assert got[key] == pytest.approx(value, abs=0.005), key
+    assert act["series_id"].notna().all()
+
+    snap = backend.sql("select count(*) as n from DB_BI_P_SANDBOX.SANDBOX.FORECAST_ACTUALS_PC_REASON_MTH_SNAP")
+    assert snap["n"][0] == len(act)
+
+
+def test_cust_mix_shares_match_trailing_window(run):
+    backend, _, agg = run
+    mix = backend.table("FORECAST_CUST_MIX_PC_REASON")
+    assert set(mix["roll_up_shop"]) == {"S100", "S200"}
+    totals = mix.groupby(["roll_up_shop", "reason_group"])["share_abs_rev"].sum().astype(float)
+    np.testing.assert_allclose(totals.values, 1.0, atol=1e-6)
+
+    window = agg[(agg["FISCAL_YYYYMM"] > 202306) & (agg["ROLL_UP_SHOP"] == "S100")
+                 & (agg["REASON_GROUP"] == "R1")]
+    by_cust = window.groupby(window["CUST_GRP"].fillna("UNKNOWN"))["ABS_REVENUE"].sum()
+    row = mix[(mix["roll_up_shop"] == "S100") & (mix["reason_group"] == "R1")].set_index("cust_grp")
+    assert (row["allocation_level"] == "PC_REASON").all()
+    np.testing.assert_allclose(row.loc["CAPX", "share_abs_rev"], by_cust["CAPX"] / by_cust.sum(), rtol=1e-6)
+
+
+def test_dataset_features_match_history(run):
+    backend, result, agg = run
+    ds = backend.table("FORECAST_MODEL_DATASET_PC_REASON_H")
+    assert result["stages"]["model_dataset_pc_reason_h"]["result"]["mode"] == "FULL"
+    assert set(ds["roll_up_shop"]) == {"S100", "S200"}
+    assert ds.groupby("roll_up_shop")["reason_group"].nunique(dropna=False).eq(len(REASONS)).all()
+    assert ds["target_fiscal_yyyymm"].max() == ASOF
+
+    act = _actuals_expected(agg)
+    row = ds[(ds["roll_up_shop"] == "S100") & (ds["reason_group"] == "R2")
+             & (ds["anchor_fiscal_yyyymm"] == 202312) & (ds["horizon"] == 3)].iloc[0]
+    assert row["target_fiscal_yyyymm"] == 202403
+    np.testing.assert_allclose(float(row["lag_12"]), act[(202212, "S100", "R2")], rtol=1e-9)
+    np.testing.assert_allclose(float(row["y_revenue"]), act[(202403, "S100", "R2")], rtol=1e-9)
+    last3 = [act[(m, "S100", "R2")] for m in (202310, 202311, 202312)]
+    np.testing.assert_allclose(float(row["roll_mean_3"]), np.mean(last3), rtol=1e-9)
+
+
+def test_baseline_scoring_is_seasonal_naive(run):
+    backend, result, agg = run
+    out = backend.table("FORECAST_OUTPUT_PC_REASON_MTH")
+    assert len(out) == 2 * len(REASONS) * 12
+    assert result["stages"]["score_and_publish"]["result"]["rows_pc_reason_forecast"] == len(out)
+
+    act = _actuals_expected(agg)
+    for r in out.itertuples():
+        expected = act[(int(r.target_fiscal_yyyymm) - 100, r.roll_up_shop, r.reason_group)]
+        np.testing.assert_allclose(float(r.revenue_forecast), expected, atol=0.01)
+
+    # customer split adds back up to the PC x Reason forecast (named reasons: the
+    # mix keys null reasons as UNKNOWN, scoring as TOTAL)
+    cust = backend.table("FORECAST_OUTPUT_PC_REASON_CUST_MTH")
+    back = cust.groupby(["roll_up_shop", "reason_group", "target_fiscal_yyyymm"])["revenue_forecast"].sum()
+    pc = out[out["reason_group"] != "TOTAL"] \
+        .set_index(["roll_up_shop", "reason_group", "target_fiscal_yyyymm"])["revenue_forecast"]
+    np.testing.assert_allclose(back.loc[pc.index].astype(float), pc.astype(float), atol=0.05)
+
+
+def test_rerun_is_incremental_and_revision_shows_no_change(run):
+    backend, first, _ = run
+    # a registered series without actuals (dropped out of the window) is not scored
+    backend.sql("""
+      insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_SERIES_REGISTRY (series_id, roll_up_shop, reason_group)
+      values (9999, 'S100', 'R_OLD')
+    """)
+    second = backend.run_pipeline(asof_fiscal_yyyymm=ASOF)
+    assert second["status"] == "SUCCEEDED", second
+    assert second["stages"]["score_and_publish"]["result"]["rows_pc_reason_forecast"] == 2 * len(REASONS) * 12
+
+    ds = second["stages"]["model_dataset_pc_reason_h"]["result"]
+    assert ds["mode"] == "INCREMENTAL"
+    assert ds["rows_carried"] == ds["rows_out"]
+    assert ds["prev_run_id"] == first["run_id"]
+    assert (ds["rows_changed"], ds["rows_unchanged"], ds["rows_deleted"]) == (0, ds["rows_out"], 0)
+    current = backend.table("FORECAST_MODEL_DATASET_PC_REASON_H")
+    assert len(current) == ds["rows_out"] and set(current["run_id"]) == {first["run_id"]}
+
+    # the snapshot of the rerun references the first run's versions instead of copying them
+    snap = ds["snapshot"]
+    assert snap["rows_full"] == ds["rows_out"]
+    assert (snap["rows_inserted"], snap["rows_updated"], snap["rows_deleted"]) == (0, 0, 0)
+    versions = backend.sql("""
+      select count(*) as n
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP_VERSIONS
+    """)
+    assert versions["n"][0] == ds["rows_out"]
+    per_run = backend.sql("""
+      select run_id, count(*) as n, count(distinct row_hash) as hashes
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_DATASET_PC_REASON_H_SNAP
+      group by 1
+    """).set_index("run_id")
+    assert per_run.loc[first["run_id"], "n"] == per_run.loc[second["run_id"], "n"] == ds["rows_out"]
+
+    revision = second["stages"]["score_and_publish"]["result"]["revision"]
+    assert revision["status"] == "OK"
+    rev = backend.sql(f"""
+      select cause, count(*) as n
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_PC_REASON_MTH
+      where forecast_run_id = '{revision["forecast_run_id"]}'
+      group by 1
+    """)
+    assert rev.set_index("cause")["n"].to_dict() == {"NO_CHANGE": 2 * len(REASONS) * 12}
+
+
+def test_restated_input_is_an_input_change(run):
+    backend, _, agg = run
+    # restate one closed month that the seasonal-naive forecast of 202407 reads
+    backend.sql("""
+      update DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH
+      set total_revenue = total_revenue + 1000, abs_revenue = abs_revenue + 1000
+      where fiscal_yyyymm = 202307 and roll_up_shop = 'S100' and reason_group = 'R1' and cust_grp = 'CAPX'
+    """)
+    backend.sql("""
+      update DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVENUE_AGG_MTH_FINGERPRINT
+      set fingerprint = fingerprint + 1
+      where fiscal_yyyymm = 202307
+    """)
+    result = backend.run_pipeline(asof_fiscal_yyyymm=ASOF)
+    assert result["status"] == "SUCCEEDED", result
+
+    # 202307 feeds lag_12 .. lag_1 / rolling windows of later anchors and targets of earlier ones
+    ds = result["stages"]["model_dataset_pc_reason_h"]["result"]
+    assert 0 < ds["rows_changed"] < ds["rows_out"]
+    assert ds["rows_unchanged"] == ds["rows_out"] - ds["rows_changed"]
+    current = backend.table("FORECAST_MODEL_DATASET_PC_REASON_H")
+    assert (current["run_id"] == result["run_id"]).sum() == ds["rows_changed"]
+    assert ds["snapshot"]["rows_updated"] == ds["rows_changed"]
+
+    forecast_run_id = result["stages"]["score_and_publish"]["result"]["forecast_run_id"]
+    rev = backend.sql(f"""
+      select roll_up_shop, reason_group, target_fiscal_yyyymm, delta, cause, causes
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_PC_REASON_MTH
+      where forecast_run_id = '{forecast_run_id}'
+    """)
+    restated = rev[(rev["roll_up_shop"] == "S100") & (rev["reason_group"] == "R1")
+                   & (rev["target_fiscal_yyyymm"] == 202407)].iloc[0]
+    assert float(restated["delta"]) == pytest.approx(1000, abs=0.01)
+    assert restated["cause"] == "INPUT_CHANGE"
+    # the restated month is also in the trailing customer-mix window
+    assert json.loads(restated["causes"]) == ["INPUT_CHANGE", "MIX_CHANGE"]
+
+    others = rev[(rev["roll_up_shop"] != "S100") | (rev["reason_group"] != "R1")]
+    assert set(others["cause"]) == {"NO_CHANGE"}
+
+
+def test_asof_roll_is_horizon_roll_not_new_or_dropped_series(run):
+    backend, _, _ = run
+    backend.sql("""
+      insert into DB_BI_P_SANDBOX.SANDBOX.FORECAST_MODEL_CHAMPIONS
+        (asof_fiscal_yyyymm, champion_scope, roll_up_shop, reason_group, model_run_id, selection_metric)
+      values (202405, 'GLOBAL', null, null, 'MR_BASELINE', 'WAPE_OVERALL')
+    """)
+    assert backend.run_pipeline(asof_fiscal_yyyymm=202405)["status"] == "SUCCEEDED"
+    result = backend.run_pipeline(asof_fiscal_yyyymm=ASOF)
+    assert result["status"] == "SUCCEEDED", result
+
+    forecast_run_id = result["stages"]["score_and_publish"]["result"]["forecast_run_id"]
+    rev = backend.sql(f"""
+      select target_fiscal_yyyymm, cause
+      from DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_PC_REASON_MTH
+      where forecast_run_id = '{forecast_run_id}'
+    """)
+    n_series = 2 * len(REASONS)
+    assert rev.groupby("cause").size().to_dict() == {"HORIZON_ROLL": 2 * n_series, "NEW_ACTUAL": 11 * n_series}
+    rolled = rev[rev["cause"] == "HORIZON_ROLL"]
+    assert set(rolled["target_fiscal_yyyymm"]) == {ASOF, 202506}    # closed month out, horizon 12 in
+
+
+def test_failed_revision_mart_is_partial_not_failed(tmp_path):
+    _write_fixtures(tmp_path)
+    backend = LocalBackend.from_fixtures(tmp_path)
+    backend.sql("drop table DB_BI_P_SANDBOX.SANDBOX.FORECAST_REVISION_RUNS")
+    result = backend.run_pipeline(asof_fiscal_yyyymm=ASOF)
+    assert result["status"] == "SUCCEEDED", result
+
+    score = result["stages"]["score_and_publish"]["result"]
+    assert score["status"] == "PARTIAL"
+    assert score["revision"]["status"] == "ERROR"
+    assert score["tracking"]["status"] == "OK"
+    assert [w.split(":")[0] for w in score["warnings"]] == ["Revision mart failed"]
+    assert len(backend.table("FORECAST_OUTPUT_PC_REASON_MTH")) == score["rows_pc_reason_forecast"]
@@ -0,0 +1,113 @@
+"""
+revenue_forecast/metrics.py must agree with the SQL metric formulas used in the
+notebook's compute_metrics cell. The SQL is executed in SQLite on the same rows.
+"""
+
+import math
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from revenue_forecast import metrics
+
+MAPE_EPSILON = 100
+
+# Same expressions as the notebook's compute_metrics cell (iff -> case)
+SQL_METRICS = f"""
+    avg(abs_err) as MAE,
+    sqrt(avg(err*err)) as RMSE,
+    sum(abs_err) / nullif(sum(abs_y),0) as WAPE,
+    avg(case when abs_y >= {MAPE_EPSILON} then abs_err/abs_y end) as MAPE_EPS,
+    avg(abs_err) / nullif(avg(abs_naive_err),0) as MASE,
+    sum(err_signed) / nullif(sum(abs_y),0) as BIAS
+"""
+
+P3 = """
+  with p3 as (
+    select p.*,
+      (p.y_true - p.y_pred) as err,
+      (p.y_pred - p.y_true) as err_signed,
+      abs(p.y_true - p.y_pred) as abs_err,
+      abs(p.y_true) as abs_y
+    from p
+  )
+"""
+
+
+def _predictions():
+    rng = np.random.default_rng(3)
+    rows = []
+    for mrid in ["m1", "m2"]:
+        for shop in ["100", "200", "300"]:
+            for reason in ["Routine", "Project"]:
+                for a in [46, 47, 48]:
+                    for h in range(1, 5):
+                        y = float(rng.choice([0.0, 50.0, rng.normal(2000, 800)]))
+                        yp = y + float(rng.normal(0, 300))
+                        rows.append((mrid, shop, reason, a, h, y, yp, abs(float(rng.normal(0, 400)))))
+    df = pd.DataFrame(rows, columns=["MODEL_RUN_ID", "ROLL_UP_SHOP", "REASON_GROUP",
+                                     "ANCHOR_MONTH_SEQ", "HORIZON", "Y_TRUE", "Y_PRED", "ABS_NAIVE_ERR"])
+    df["CUST_GRP"] = np.where(df.ROLL_UP_SHOP == "300", "NATIONAL", "LOCAL")
+    # SQL edge cases: missing predictions, missing naive join, an all-zero series
+    df.loc[df.index % 17 == 0, "Y_PRED"] = np.nan
+    df.loc[df.index % 11 == 0, "ABS_NAIVE_ERR"] = np.nan
+    zero = (df.ROLL_UP_SHOP == "300") & (df.REASON_GROUP == "Project")
+    df.loc[zero, "Y_TRUE"] = 0.0
+    return df
+
+
+def _sql(df, sql):
+    con = sqlite3.connect(":memory:")
+    con.create_function("sqrt", 1, lambda x: None if x is None else math.sqrt(x))
+    df.astype(object).where(df.notna(), None).to_sql("p", con, index=False)
+    return pd.read_sql_query(sql, con)
+
+
+def _assert_frames_close(local, sql, keys):
+    local = local.sort_values(keys).reset_index(drop=True)
+    sql = sql.sort_values(keys).reset_index(drop=True)
+    assert len(local) == len(sql) > 0
+    for m in metrics.METRICS:
+        np.testing.assert_allclose(local[m].to_numpy(float), sql[m].to_numpy(float),
+                                   rtol=1e-9, equal_nan=True, err_msg=m)
+
+
+@pytest.mark.parametrize("group_by", [
+    ["MODEL_RUN_ID"],
+    ["MODEL_RUN_ID", "HORIZON"],
+    ["MODEL_RUN_ID", "ANCHOR_MONTH_SEQ"],
+    ["MODEL_RUN_ID", "ROLL_UP_SHOP", "REASON_GROUP"],
+    ["MODEL_RUN_ID", "REASON_GROUP", "CUST_GRP", "HORIZON"],
+])
+def test_micro_matches_sql(group_by):
+    df = _predictions()
+    cols = ", ".join(group_by)
+    sql = _sql(df, f"{P3} select {cols}, {SQL_METRICS} from p3 group by {cols}")
+    local = metrics.compute_metrics(df, group_by, mape_epsilon=MAPE_EPSILON)
+    _assert_frames_close(local, sql, group_by)
+
+
+def test_macro_matches_sql():
+    df = _predictions()
+    avg = ", ".join(f"avg({m}) as {m}" for m in metrics.METRICS)
+    sql = _sql(df, f"""{P3},
+      s as (select model_run_id, horizon, roll_up_shop, reason_group, {SQL_METRICS}
+            from p3 group by 1, 2, 3, 4)
+      select model_run_id as MODEL_RUN_ID, horizon as HORIZON, {avg} from s group by 1, 2
+    """)
+    local = metrics.compute_macro_metrics(df, ["MODEL_RUN_ID", "HORIZON"], mape_epsilon=MAPE_EPSILON)
+    _assert_frames_close(local, sql, ["MODEL_RUN_ID", "HORIZON"])
+
+
+def test_naive_errors_join_baseline_rows():
+    df = _predictions().drop(columns=["ABS_NAIVE_ERR"])
+    base = df[df.MODEL_RUN_ID == "m1"]
+    out = metrics.add_naive_errors(df[df.MODEL_RUN_ID == "m2"], base)
+    assert len(out) == len(base)
+    expect = (base.Y_TRUE - base.Y_PRED).abs().to_numpy()
+    np.testing.assert_allclose(out.ABS_NAIVE_ERR.to_numpy(), expect, equal_nan=True)
+
+    long = metrics.to_long(metrics.compute_metrics(out))
+    assert set(long.METRIC_NAME) == set(metrics.METRICS)
@@ -0,0 +1,135 @@
+"""
+In-warehouse backtests (revenue_forecast/snowpark_jobs.py) must reproduce the
+local runner (revenue_forecast/training.py). Runs against Snowpark's local
+testing session, so no Snowflake account is needed.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sklearn")
+snowpark = pytest.importorskip("snowflake.snowpark")
+
+from revenue_forecast import snowpark_jobs, training  # noqa: E402
+from revenue_forecast.baselines import PREDICTION_COLUMNS  # noqa: E402
+
+RUN_ID = "RUN_TEST"
+DATASET = "FORECAST_MODEL_DATASET_PC_REASON_H_SNAP"
+PREDICTIONS = "FORECAST_MODEL_BACKTEST_PREDICTIONS"
+EVAL_ANCHORS = [30, 31]
+EPS = 100.0
+
+
+def _dataset():
+    """Small dataset snapshot: 3 series, anchors 13..33, horizons 1..3."""
+    rng = np.random.default_rng(11)
+    rows = []
+    for shop, reason, level in [("100", "Routine", 5000.0), ("100", "Project", 800.0), ("200", "Routine", 2000.0)]:
+        y = level * (1 + 0.2 * np.sin(np.arange(40) / 12 * 2 * np.pi)) + rng.normal(0, level * 0.05, 40)
+        for a in range(13, 34):
+            for h in range(1, 4):
+                t = a + h
+                rows.append({
+                    "RUN_ID": RUN_ID,
+                    "ROLL_UP_SHOP": shop,
+                    "REASON_GROUP": reason,
+                    "ANCHOR_FISCAL_YYYYMM": 202000 + a,
+                    "ANCHOR_MONTH_SEQ": a,
+                    "HORIZON": h,
+                    "TARGET_FISCAL_YYYYMM": 202000 + t,
+                    "TARGET_MONTH_SEQ": t,
+                    "Y_REVENUE": round(float(y[t]), 2) if t < 34 else None,
+                    "LAG_1": round(float(y[a]), 2),
+                    "LAG_12": round(float(y[a - 12]), 2),
+                    "FISCAL_MONTH_SIN": float(np.sin(t / 12 * 2 * np.pi)),
+                })
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture()
+def session():
+    s = snowpark.Session.builder.config("local_testing", True).create()
+    s.create_dataframe(_dataset()).write.save_as_table(DATASET)
+    yield s
+    s.close()
+
+
+def _local(ds, runner, candidate, mrid):
+    num_cols, cat_cols = training.select_features(ds)
+    ds = training.prepare_features(ds, num_cols, cat_cols)
+    return runner(ds, candidate, mrid, EVAL_ANCHORS, EPS, num_cols, cat_cols)
+
+
+def _read(session, mrid):
+    out = session.table(PREDICTIONS).filter(snowpark.functions.col("MODEL_RUN_ID") == mrid).to_pandas()
+    assert list(out.columns) == PREDICTION_COLUMNS
+    return out
+
+
+def _assert_same(remote, local):
+    keys = ["ROLL_UP_SHOP", "REASON_GROUP", "ANCHOR_MONTH_SEQ", "HORIZON"]
+    remote = remote.sort_values(keys).reset_index(drop=True)
+    local = local.sort_values(keys).reset_index(drop=True)
+    assert len(remote) == len(local) > 0
+    for c in keys[:2]:
+        assert remote[c].astype(str).tolist() == local[c].astype(str).tolist()
+    for c in keys[2:]:
+        assert remote[c].astype(int).tolist() == local[c].astype(int).tolist()
+    np.testing.assert_allclose(remote["Y_TRUE"].astype(float), local["Y_TRUE"].astype(float))
+    np.testing.assert_allclose(remote["Y_PRED"].astype(float), local["Y_PRED"].astype(float), rtol=1e-9)
+
+
+def test_global_sproc_matches_local_runner(session):
+    n = snowpark_jobs.run_global_backtest(
+        session, RUN_ID, "GBR_OHE", "m_global", EVAL_ANCHORS, EPS,
+        dataset_table=DATASET, predictions_table=PREDICTIONS,
+    )
+    local = _local(_dataset(), training.backtest_predictions, "GBR_OHE", "m_global")
+    assert n == len(local)
+    _assert_same(_read(session, "m_global"), local)
+
+
+def test_partitioned_udtf_matches_local_runner(session):
+    n = snowpark_jobs.run_series_backtest(
+        session, RUN_ID, "GBR_OHE", "m_series", EVAL_ANCHORS, EPS,
+        dataset_table=DATASET, predictions_table=PREDICTIONS,
+    )
+    local = _local(_dataset(), training.backtest_per_series, "GBR_OHE", "m_series")
+    assert n == len(local)
+    _assert_same(_read(session, "m_series"), local)
+
+
+def test_stage_predictions_pads_to_table_layout(session):
+    local = _local(_dataset(), training.backtest_predictions, "GBR_OHE", "m_stage")
+    stage = snowpark_jobs.stage_predictions(session, local, stage_table="TMP_STAGE")
+    out = session.table(stage).to_pandas()
+    assert list(out.columns) == PREDICTION_COLUMNS
+    assert len(out) == len(local)
+    assert out["Y_PRED_LO"].isna().all() and out["CREATED_AT"].notna().all()
+
+
+def test_series_id_is_carried_not_a_feature():
+    ds = _dataset()
+    ds["SERIES_ID"] = ds.groupby(["ROLL_UP_SHOP", "REASON_GROUP"]).ngroup() + 1
+    num_cols, cat_cols = training.select_features(ds)
+    assert "SERIES_ID" not in num_cols + cat_cols
+
+    s = snowpark.Session.builder.config("local_testing", True).create()
+    try:
+        s.create_dataframe(ds).write.save_as_table(DATASET)
+        n = snowpark_jobs.run_series_backtest(
+            s, RUN_ID, "GBR_OHE", "m_series_id", EVAL_ANCHORS, EPS,
+            dataset_table=DATASET, predictions_table=PREDICTIONS,
+        )
+        local = _local(ds, training.backtest_per_series, "GBR_OHE", "m_series_id")
+        remote = s.table(PREDICTIONS).to_pandas()
+    finally:
+        s.close()
+
+    assert n == len(local)
+    assert list(remote.columns) == PREDICTION_COLUMNS + ["SERIES_ID"]
+    _assert_same(remote, local)
+    ids = ds.drop_duplicates("SERIES_ID").set_index(["ROLL_UP_SHOP", "REASON_GROUP"])["SERIES_ID"]
+    expected = remote.set_index(["ROLL_UP_SHOP", "REASON_GROUP"]).index.map(ids)
+    assert remote["SERIES_ID"].astype(int).tolist() == list(expected)
@@ -24,6 +24,9 @@ import streamlit as st
 from datetime import datetime
 from pathlib import Path
 
+# Run from the repo root (python -m streamlit run tools/streamlit_forecast/app.py)
+from revenue_forecast.metrics import compute_metrics  # same formulas as the SQL metrics
+
 # Conditional imports
 try:
     import plotly.graph_objects as go
@@ -89,7 +92,11 @@ def load_csv_data():
         # Budget backtest
         backtest_path = REPO_ROOT / "presentations" / "budget_backtest.csv"
         if backtest_path.exists():
-            data['backtest'] = pd.read_csv(backtest_path)
+            data['backtest'] = pd.read_csv(backtest_path).rename(columns={
+                'anchor_month': 'anchor',
+                'actual_dollars': 'y_true',
+                'forecast_dollars': 'y_pred',
+            })
         
         # PC715 tuned what-if
         whatif_path = REPO_ROOT / "experiments" / "pc715" / "pc715_tuned_preds.csv"
@@ -253,6 +260,36 @@ def load_forecast_from_db(model_run_id, year=None, period=None):
         return None
 
 
+@st.cache_data(ttl=3600)
+def load_backtest_from_db(model_run_id, n_anchors=12):
+    """Load the last n_anchors backtest anchors of a model run."""
+    conn = get_snowflake_connection()
+    if not conn:
+        return None
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT anchor_fiscal_yyyymm AS anchor, roll_up_shop AS pc, reason_group,
+                   horizon, target_fiscal_yyyymm, y_true, y_pred,
+                   ABS(y_true - y_pred) AS abs_err
+            FROM DB_BI_P_SANDBOX.SANDBOX.VW_FORECAST_MODEL_BACKTEST_PREDICTIONS
+            WHERE model_run_id = '{model_run_id}'
+            QUALIFY DENSE_RANK() OVER (ORDER BY anchor_month_seq DESC) <= {int(n_anchors)}
+            ORDER BY anchor, pc, reason_group, horizon
+            LIMIT {MAX_ROWS_DB}
+        """)
+        df = cur.fetch_pandas_all()
+        df.columns = [c.lower() for c in df.columns]
+        cur.close()
+        conn.close()
+        return df
+    except Exception as e:
+        if cur: cur.close()
+        try: conn.close()
+        except: pass
+        return None
+
+
 # ARTHUR PATCH - load_filter_values_from_db
 @st.cache_data(ttl=3600)
 def load_filter_values_from_db():
@@ -420,6 +457,10 @@ def main():
             if forecast_df is None or forecast_df.empty:
                 st.warning("Could not load forecast from DB. Check if vw_forecast_report_mart has data for this model.")
                 forecast_df = pd.DataFrame()
+
+            backtest_df = load_backtest_from_db(selected_model_id)
+            if backtest_df is None:
+                backtest_df = pd.DataFrame()
     
     # Load filter values from data
     if not CSV_MODE and not forecast_df.empty:
@@ -606,13 +647,13 @@ def main():
                 )
                 
                 # Compute metrics
-                if 'abs_err' in backtest_df.columns and 'y_true' in backtest_df.columns:
-                    wape = (backtest_df['abs_err'].sum() / backtest_df['y_true'].sum()) * 100
-                    mae = backtest_df['abs_err'].mean()
+                if 'y_pred' in backtest_df.columns and 'y_true' in backtest_df.columns:
+                    m = compute_metrics(backtest_df, group_by=(), y_true='y_true', y_pred='y_pred').iloc[0]
                     
-                    col1, col2 = st.columns(2)
-                    col1.metric("WAPE", f"{wape:.2f}%")
-                    col2.metric("MAE", format_currency(mae))
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric("WAPE", f"{m['WAPE'] * 100:.2f}%")
+                    col2.metric("MAE", format_currency(m['MAE']))
+                    col3.metric("Bias", f"{m['BIAS'] * 100:+.2f}%")
     
     # ───────────────────────────────────────────────────────────────
     # TAB 3: MODEL COMPARISON